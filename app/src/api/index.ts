@@ -1,6 +1,14 @@
 import axios from 'axios';
 import { z } from 'zod';
-import { User, UserCreateInput, UserUpdateInput, Task, TaskCreateInput, TaskUpdateInput } from '../types';
+import {
+  User,
+  UserCreateInput,
+  UserUpdateInput,
+  Task,
+  TaskCreateInput,
+  TaskEvent,
+  TaskUpdateInput,
+} from '../types';
 
 // Zod schemas for validation
 const UserSchema = z.object({
@@ -29,16 +37,28 @@ const TaskSchema = z.object({
   id: z.number(),
   title: z.string(),
   description: z.string().optional(),
-  status: z.enum(['pending', 'wip', 'done', 'failed']),
+  status: z.enum(['pending', 'wip', 'done', 'failed', 'dead_letter', 'cancelled']),
   user_id: z.number(),
   worker_id: z.string().nullable(),
   started_at: z.string().nullable(),
   completed_at: z.string().nullable(),
   error_message: z.string().nullable(),
+  attempts: z.number(),
+  max_attempts: z.number(),
+  next_attempt_at: z.string().nullable(),
   created_at: z.string(),
   updated_at: z.string(),
 });
 
+const TaskEventSchema = z.object({
+  id: z.number(),
+  task_id: z.number(),
+  user_id: z.number().nullable(),
+  status: TaskSchema.shape.status,
+  worker_id: z.string().nullable(),
+  created_at: z.string(),
+});
+
 const TaskCreateSchema = z.object({
   title: z.string().min(1, 'Title is required'),
   description: z.string().optional(),
@@ -136,3 +156,23 @@ export const updateTask = async (id: number, taskData: TaskUpdateInput): Promise
 export const deleteTask = async (id: number): Promise<void> => {
   await api.delete(`/tasks/${id}`);
 };
+
+// Task events (Server-Sent Events). EventSource reconnects by itself and resumes from the
+// last received event via the Last-Event-ID header. Returns a function that closes the stream.
+export const subscribeToTaskEvents = (
+  onEvent: (event: TaskEvent) => void,
+  filters: { userId?: number; taskIds?: number[] } = {}
+): (() => void) => {
+  if (typeof EventSource === 'undefined') return () => {};
+
+  const params = new URLSearchParams();
+  if (filters.userId !== undefined) params.set('user_id', String(filters.userId));
+  filters.taskIds?.forEach((taskId) => params.append('task_id', String(taskId)));
+  const query = params.toString();
+
+  const source = new EventSource(`/api/tasks/events${query ? `?${query}` : ''}`);
+  source.addEventListener('task', (message: MessageEvent<string>) => {
+    onEvent(validateResponse(TaskEventSchema, JSON.parse(message.data)));
+  });
+  return () => source.close();
+};
@@ -1,7 +1,7 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { useParams, useNavigate } from 'react-router-dom';
-import { getTask, updateTask, deleteTask } from '../api';
+import { getTask, updateTask, deleteTask, subscribeToTaskEvents } from '../api';
 import { TaskUpdateInput } from '../types';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
@@ -52,9 +52,19 @@ const TaskDetail = () => {
     queryKey: ['task', id],
     queryFn: () => getTask(Number(id)),
     enabled: !!id,
-    refetchInterval: 1000, // Poll every 1 second
   });
 
+  // Refetch when the API pushes a status change instead of polling
+  useEffect(() => {
+    if (!id) return;
+    return subscribeToTaskEvents(
+      () => {
+        void queryClient.invalidateQueries({ queryKey: ['task', id] });
+      },
+      { taskIds: [Number(id)] }
+    );
+  }, [id, queryClient]);
+
   const updateMutation = useMutation({
     mutationFn: ({ id, data }: { id: number; data: TaskUpdateInput }) => updateTask(id, data),
     onSuccess: () => {
@@ -115,6 +125,7 @@ const TaskDetail = () => {
       case 'wip':
         return <Clock className="w-4 h-4 mr-2" />;
       case 'failed':
+      case 'dead_letter':
         return <AlertCircle className="w-4 h-4 mr-2" />;
       default:
         return <Clock className="w-4 h-4 mr-2" />;
@@ -128,6 +139,7 @@ const TaskDetail = () => {
       case 'wip':
         return 'info';
       case 'failed':
+      case 'dead_letter':
         return 'destructive';
       default:
         return 'secondary';
@@ -142,6 +154,10 @@ const TaskDetail = () => {
         return 'In Progress';
       case 'failed':
         return 'Failed';
+      case 'dead_letter':
+        return 'Dead Letter';
+      case 'cancelled':
+        return 'Cancelled';
       default:
         return 'Pending';
     }
@@ -1,5 +1,7 @@
-import { useQuery } from '@tanstack/react-query';
-import { getTasks } from '../api';
+import { useEffect } from 'react';
+import { useQuery, useQueryClient } from '@tanstack/react-query';
+import { getTasks, subscribeToTaskEvents } from '../api';
+import { Task, TaskEvent } from '../types';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Badge } from '../components/ui/badge';
@@ -8,7 +10,23 @@ import { Alert, AlertDescription } from '../components/ui/alert';
 import { Link } from 'react-router-dom';
 import { Plus, CheckCircle, Circle, User, Clock, UserCheck, AlertCircle } from 'lucide-react';
 
+// Delay used to coalesce refetches triggered by events for tasks missing from the list
+const REFETCH_DELAY_MS = 1000;
+
+// Mirror the fields the API stamps on a status transition
+const applyTaskEvent = (task: Task, event: TaskEvent): Task => {
+  switch (event.status) {
+    case 'pending':
+      return { ...task, status: event.status, worker_id: null, started_at: null };
+    case 'wip':
+      return { ...task, status: event.status, worker_id: event.worker_id, started_at: event.created_at };
+    default:
+      return { ...task, status: event.status, completed_at: event.created_at };
+  }
+};
+
 const Tasks = () => {
+  const queryClient = useQueryClient();
   const {
     data: tasks = [],
     isLoading,
@@ -16,9 +34,37 @@ const Tasks = () => {
   } = useQuery({
     queryKey: ['tasks'],
     queryFn: getTasks,
-    refetchInterval: 1000, // Poll every 1 second
   });
 
+  // Apply task changes pushed by the API to the cached list instead of polling. Only events for tasks
+  // that are not in the list yet trigger a refetch, coalesced so a burst of new tasks costs one request.
+  useEffect(() => {
+    let refetchTimer: ReturnType<typeof setTimeout> | undefined;
+
+    const unsubscribe = subscribeToTaskEvents((event) => {
+      let cached = false;
+      queryClient.setQueryData<Task[]>(['tasks'], (current) =>
+        current?.map((task) => {
+          if (task.id !== event.task_id) return task;
+          cached = true;
+          return applyTaskEvent(task, event);
+        })
+      );
+
+      if (!cached && refetchTimer === undefined) {
+        refetchTimer = setTimeout(() => {
+          refetchTimer = undefined;
+          void queryClient.invalidateQueries({ queryKey: ['tasks'] });
+        }, REFETCH_DELAY_MS);
+      }
+    });
+
+    return () => {
+      unsubscribe();
+      clearTimeout(refetchTimer);
+    };
+  }, [queryClient]);
+
   if (isLoading)
     return (
       <div className="space-y-6">
@@ -54,6 +100,7 @@ const Tasks = () => {
       case 'wip':
         return <Clock className="w-3 h-3 mr-1" />;
       case 'failed':
+      case 'dead_letter':
         return <AlertCircle className="w-3 h-3 mr-1" />;
       default:
         return <Circle className="w-3 h-3 mr-1" />;
@@ -67,6 +114,7 @@ const Tasks = () => {
       case 'wip':
         return 'info';
       case 'failed':
+      case 'dead_letter':
         return 'destructive';
       default:
         return 'secondary';
@@ -81,6 +129,10 @@ const Tasks = () => {
         return 'In Progress';
       case 'failed':
         return 'Failed';
+      case 'dead_letter':
+        return 'Dead Letter';
+      case 'cancelled':
+        return 'Cancelled';
       default:
         return 'Pending';
     }
@@ -89,6 +89,7 @@ const UserDetail = () => {
       case 'wip':
         return 'info';
       case 'failed':
+      case 'dead_letter':
         return 'destructive';
       default:
         return 'secondary';
@@ -103,6 +104,10 @@ const UserDetail = () => {
         return 'In Progress';
       case 'failed':
         return 'Failed';
+      case 'dead_letter':
+        return 'Dead Letter';
+      case 'cancelled':
+        return 'Cancelled';
       default:
         return 'Pending';
     }
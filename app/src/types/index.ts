@@ -24,16 +24,28 @@ export interface Task {
   id: number;
   title: string;
   description?: string;
-  status: 'pending' | 'wip' | 'done' | 'failed';
+  status: 'pending' | 'wip' | 'done' | 'failed' | 'dead_letter' | 'cancelled';
   user_id: number;
   worker_id: string | null;
   started_at: string | null;
   completed_at: string | null;
   error_message: string | null;
+  attempts: number;
+  max_attempts: number;
+  next_attempt_at: string | null;
   created_at: string;
   updated_at: string;
 }
 
+export interface TaskEvent {
+  id: number;
+  task_id: number;
+  user_id: number | null;
+  status: Task['status'];
+  worker_id: string | null;
+  created_at: string;
+}
+
 export interface TaskCreateInput {
   title: string;
   description?: string;
@@ -1,7 +1,7 @@
 """Common package shared between services."""
 
-from common import database, models, schemas, utils
+from common import client, database, models, schemas, utils
 
 __version__ = "0.1.0"
 
-__all__ = ["database", "models", "schemas", "utils"]
+__all__ = ["client", "database", "models", "schemas", "utils"]
@@ -0,0 +1,380 @@
+"""HTTP client for the task API shared between services."""
+
+import asyncio
+from http import HTTPStatus
+import logging
+import random
+import time
+from typing import TypeVar
+
+import httpx
+from pydantic import BaseModel
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.schemas import (
+    Page,
+    Task,
+    TaskBulkItem,
+    TaskClaim,
+    TaskCreate,
+    TaskHeartbeat,
+    TaskHeartbeatResult,
+    TaskReapResult,
+    TaskStatusBatch,
+    TaskStatusBatchResult,
+    TaskStatusUpdate,
+    TaskUpdate,
+    User,
+    UserCreate,
+    UserUpdate,
+)
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+DEFAULT_API_BASE_URL = "http://localhost:8000/api"
+# (connect, read) timeouts in seconds; long-polling requests add their wait to the read timeout
+DEFAULT_TIMEOUT = (3.05, 10.0)
+# Items per page of list endpoints
+DEFAULT_PAGE_SIZE = 100
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Request header making creations safe to retry
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+# Connections kept alive per host
+DEFAULT_POOL_SIZE = 10
+# Retries of idempotent requests after connection errors or a temporarily unavailable API
+DEFAULT_RETRIES = 3
+# Base and cap, in seconds, of the jittered exponential backoff between retries
+DEFAULT_BACKOFF = 0.2
+MAX_BACKOFF = 5.0
+
+RETRYABLE_STATUS_CODES = frozenset({HTTPStatus.BAD_GATEWAY, HTTPStatus.SERVICE_UNAVAILABLE, HTTPStatus.GATEWAY_TIMEOUT})
+
+
+class APIError(requests.RequestException):
+    """The API answered with an error status."""
+
+    def __init__(self, status_code: int, detail: str, response: requests.Response | httpx.Response | None = None):
+        super().__init__(f"API returned {status_code}: {detail}", response=response)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def backoff_delay(attempt: int, base: float = DEFAULT_BACKOFF, cap: float = MAX_BACKOFF) -> float:
+    """Get the delay before retry number ``attempt`` (from 0), using full jitter."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class APIClient:
+    """Connection-pooled client for the task API.
+
+    A single instance can be shared between threads; requests reuse keep-alive connections
+    from the session's pool instead of opening a new connection per call.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_API_BASE_URL,
+        timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.resize_pool(pool_size)
+
+    def resize_pool(self, pool_size: int) -> None:
+        """Keep up to ``pool_size`` connections alive, e.g. one per concurrently running task."""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(  # noqa: PLR0913 - mirrors requests.request
+        self,
+        method: str,
+        path: str,
+        *,
+        params: dict | None = None,
+        json: dict | list | None = None,
+        headers: dict | None = None,
+        wait: float = 0,
+        idempotent: bool | None = None,
+    ) -> requests.Response:
+        """Send a request and return the successful response.
+
+        Idempotent requests (GET, PUT and DELETE unless told otherwise) are retried with jittered
+        exponential backoff on connection errors and 502/503/504 answers. Raises ``APIError`` for
+        error answers and ``requests.RequestException`` for transport errors.
+        """
+        if idempotent is None:
+            idempotent = method in {"GET", "PUT", "DELETE"}
+        retries = self.retries if idempotent else 0
+        connect_timeout, read_timeout = self.timeout
+
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    params=params,
+                    json=json,
+                    headers=headers,
+                    timeout=(connect_timeout, read_timeout + wait),
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"{method} {path} failed ({e}), retrying")
+            else:
+                if response.ok:
+                    return response
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == retries:
+                    raise APIError(response.status_code, _error_detail(response), response=response)
+                logger.warning(f"{method} {path} returned {response.status_code}, retrying")
+            time.sleep(backoff_delay(attempt, self.backoff))
+
+        raise AssertionError("unreachable")
+
+    def _get_model(self, model: type[ModelT], path: str, **kwargs) -> ModelT:
+        return model.model_validate(self.request("GET", path, **kwargs).json())
+
+    def _get_page(self, model: type[ModelT], path: str, params: dict, wait: float = 0) -> Page[ModelT]:
+        # Parameters that are None, like the cursor of the first page, are left out by requests
+        response = self.request("GET", path, params=params, wait=wait)
+        return Page[model](
+            items=[model.model_validate(item) for item in response.json()],
+            next_cursor=response.headers.get(NEXT_CURSOR_HEADER),
+        )
+
+    def _create(self, path: str, json: dict | list, idempotency_key: str | None) -> requests.Response:
+        # The API replays the original response to a retry with the same key, so it cannot create duplicates
+        if idempotency_key is None:
+            return self.request("POST", path, json=json)
+        return self.request("POST", path, json=json, headers={IDEMPOTENCY_KEY_HEADER: idempotency_key}, idempotent=True)
+
+    # Users
+    def list_users(self, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> Page[User]:
+        """Get a page of users; pass the page's ``next_cursor`` to get the next one."""
+        return self._get_page(User, "/users/", {"limit": limit, "cursor": cursor})
+
+    def get_user(self, user_id: int) -> User:
+        """Get a user by ID."""
+        return self._get_model(User, f"/users/{user_id}")
+
+    def create_user(self, user: UserCreate, idempotency_key: str | None = None) -> User:
+        """Create a user; with an ``idempotency_key`` the request is safely retried."""
+        response = self._create("/users/", user.model_dump(), idempotency_key)
+        return User.model_validate(response.json())
+
+    def update_user(self, user_id: int, user: UserUpdate) -> User:
+        """Update a user."""
+        response = self.request("PUT", f"/users/{user_id}", json=user.model_dump(exclude_unset=True))
+        return User.model_validate(response.json())
+
+    def delete_user(self, user_id: int) -> None:
+        """Delete a user."""
+        self.request("DELETE", f"/users/{user_id}")
+
+    # Tasks
+    def list_tasks(self, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> Page[Task]:
+        """Get a page of tasks; pass the page's ``next_cursor`` to get the next one."""
+        return self._get_page(Task, "/tasks/", {"limit": limit, "cursor": cursor})
+
+    def list_user_tasks(self, user_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None) -> Page[Task]:
+        """Get a page of the tasks of a user."""
+        return self._get_page(Task, f"/tasks/user/{user_id}", {"limit": limit, "cursor": cursor})
+
+    def get_task(self, task_id: int) -> Task:
+        """Get a task by ID."""
+        return self._get_model(Task, f"/tasks/{task_id}")
+
+    def create_task(self, task: TaskCreate, idempotency_key: str | None = None) -> Task:
+        """Create a task; with an ``idempotency_key`` the request is safely retried."""
+        response = self._create("/tasks/", task.model_dump(mode="json"), idempotency_key)
+        return Task.model_validate(response.json())
+
+    def create_tasks(self, tasks: list[TaskCreate], idempotency_key: str | None = None) -> list[TaskBulkItem]:
+        """Create many tasks in one request; returns each task's id or error, in order."""
+        response = self._create("/tasks/bulk", [task.model_dump(mode="json") for task in tasks], idempotency_key)
+        return [TaskBulkItem.model_validate(item) for item in response.json()]
+
+    def update_task(self, task_id: int, task: TaskUpdate) -> Task:
+        """Update a task."""
+        response = self.request("PUT", f"/tasks/{task_id}", json=task.model_dump(mode="json", exclude_unset=True))
+        return Task.model_validate(response.json())
+
+    def delete_task(self, task_id: int) -> None:
+        """Delete a task."""
+        self.request("DELETE", f"/tasks/{task_id}")
+
+    def cancel_task(self, task_id: int) -> Task:
+        """Cancel a task; a worker running it stops after its next heartbeat."""
+        return Task.model_validate(self.request("POST", f"/tasks/{task_id}/cancel", idempotent=True).json())
+
+    # Worker operations
+    def get_pending_tasks(
+        self, wait: float = 0, limit: int = DEFAULT_PAGE_SIZE, queues: list[str] | None = None
+    ) -> list[Task]:
+        """Get the first ``limit`` pending tasks of ``queues`` (by default any) in queue order.
+
+        Long-polls for up to ``wait`` seconds if there are none.
+        """
+        params = {"wait": wait, "limit": limit, "queue": queues}
+        return self._get_page(Task, "/tasks/worker/pending", params, wait=wait).items
+
+    def claim_tasks(self, claim: TaskClaim, wait: float = 0) -> list[Task]:
+        """Claim pending tasks, long-polling for up to ``wait`` seconds if there are none.
+
+        Not retried: a claim whose answer was lost is only released once its lease expires.
+        """
+        response = self.request(
+            "POST", "/tasks/worker/claim", params={"wait": wait}, json=claim.model_dump(), wait=wait
+        )
+        return [Task.model_validate(item) for item in response.json()]
+
+    def heartbeat(self, heartbeat: TaskHeartbeat) -> TaskHeartbeatResult:
+        """Extend the leases of in-flight tasks."""
+        response = self.request("POST", "/tasks/worker/heartbeat", json=heartbeat.model_dump(), idempotent=True)
+        return TaskHeartbeatResult.model_validate(response.json())
+
+    def update_task_status(self, task_id: int, status_update: TaskStatusUpdate) -> Task:
+        """Report a task status transition."""
+        response = self.request("PUT", f"/tasks/{task_id}/status", json=status_update.model_dump(mode="json"))
+        return Task.model_validate(response.json())
+
+    def update_task_statuses(self, batch: TaskStatusBatch) -> TaskStatusBatchResult:
+        """Report the status transitions of many tasks in one request."""
+        response = self.request("PUT", "/tasks/status:batch", json=batch.model_dump(mode="json"))
+        return TaskStatusBatchResult.model_validate(response.json())
+
+    def reap_expired_leases(self) -> TaskReapResult:
+        """Requeue tasks whose lease expired."""
+        return TaskReapResult.model_validate(self.request("POST", "/tasks/worker/reap", idempotent=True).json())
+
+
+class AsyncAPIClient:
+    """Connection-pooled asyncio client for the worker operations of the task API.
+
+    Follows the retry policy of ``APIClient``. Raises ``APIError`` for error answers and
+    ``httpx.HTTPError`` for transport errors. Use it as an async context manager, so its
+    connections are closed on the event loop that opened them.
+    """
+
+    def __init__(  # noqa: PLR0913 - mirrors APIClient, plus a transport for tests
+        self,
+        base_url: str = DEFAULT_API_BASE_URL,
+        timeout: tuple[float, float] = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        *,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=transport,
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def request(  # noqa: PLR0913 - mirrors APIClient.request
+        self,
+        method: str,
+        path: str,
+        *,
+        params: dict | None = None,
+        json: dict | list | None = None,
+        wait: float = 0,
+        idempotent: bool | None = None,
+    ) -> httpx.Response:
+        """Send a request and return the successful response, retrying like ``APIClient.request``."""
+        if idempotent is None:
+            idempotent = method in {"GET", "PUT", "DELETE"}
+        retries = self.retries if idempotent else 0
+        connect_timeout, read_timeout = self.timeout
+        # Unlike requests, httpx sends parameters that are None as empty values
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+
+        for attempt in range(retries + 1):
+            try:
+                response = await self.client.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    params=params,
+                    json=json,
+                    timeout=httpx.Timeout(read_timeout + wait, connect=connect_timeout),
+                )
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"{method} {path} failed ({e}), retrying")
+            else:
+                if response.is_success:
+                    return response
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == retries:
+                    raise APIError(response.status_code, _error_detail(response), response=response)
+                logger.warning(f"{method} {path} returned {response.status_code}, retrying")
+            await asyncio.sleep(backoff_delay(attempt, self.backoff))
+
+        raise AssertionError("unreachable")
+
+    async def get_pending_tasks(
+        self, wait: float = 0, limit: int = DEFAULT_PAGE_SIZE, queues: list[str] | None = None
+    ) -> list[Task]:
+        """Get the first ``limit`` pending tasks of ``queues`` (by default any) in queue order."""
+        params = {"wait": wait, "limit": limit, "queue": queues}
+        response = await self.request("GET", "/tasks/worker/pending", params=params, wait=wait)
+        return [Task.model_validate(item) for item in response.json()]
+
+    async def claim_tasks(self, claim: TaskClaim, wait: float = 0) -> list[Task]:
+        """Claim pending tasks, long-polling for up to ``wait`` seconds if there are none."""
+        response = await self.request(
+            "POST", "/tasks/worker/claim", params={"wait": wait}, json=claim.model_dump(), wait=wait
+        )
+        return [Task.model_validate(item) for item in response.json()]
+
+    async def heartbeat(self, heartbeat: TaskHeartbeat) -> TaskHeartbeatResult:
+        """Extend the leases of in-flight tasks."""
+        response = await self.request("POST", "/tasks/worker/heartbeat", json=heartbeat.model_dump(), idempotent=True)
+        return TaskHeartbeatResult.model_validate(response.json())
+
+    async def update_task_status(self, task_id: int, status_update: TaskStatusUpdate) -> Task:
+        """Report a task status transition."""
+        response = await self.request("PUT", f"/tasks/{task_id}/status", json=status_update.model_dump(mode="json"))
+        return Task.model_validate(response.json())
+
+
+def _error_detail(response: requests.Response | httpx.Response) -> str:
+    try:
+        return str(response.json()["detail"])
+    except (ValueError, TypeError, KeyError):
+        return response.text
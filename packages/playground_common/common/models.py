@@ -1,13 +1,21 @@
 """SQLAlchemy models shared between services."""
 
+from datetime import datetime
 import enum
 
-from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Enum, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# Attempts a task gets, counting the first, before it is dead-lettered
+DEFAULT_MAX_ATTEMPTS = 3
+# Queue of tasks created without naming one
+DEFAULT_QUEUE = "default"
+# Type of tasks created without naming one; workers pick the handler by type
+DEFAULT_TASK_TYPE = "default"
+
 
 class TaskStatus(str, enum.Enum):
     """Task status enum."""
@@ -16,6 +24,8 @@ class TaskStatus(str, enum.Enum):
     WIP = "wip"
     DONE = "done"
     FAILED = "failed"
+    DEAD_LETTER = "dead_letter"  # Failed on every allowed attempt
+    CANCELLED = "cancelled"  # Stopped on request, whether or not a worker had started it
 
 
 class User(Base):
@@ -28,6 +38,7 @@ class User(Base):
     email = Column(String(100), unique=True, index=True)
     hashed_password = Column(String(100))
     is_active = Column(Boolean, default=True)
+    max_concurrent_tasks = Column(Integer, nullable=True)  # WIP tasks the user may have at once; None is unlimited
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -49,8 +60,90 @@ class Task(Base):
     started_at = Column(DateTime, nullable=True)  # When work started
     completed_at = Column(DateTime, nullable=True)  # When work completed
     error_message = Column(Text, nullable=True)  # Error details if failed
+    lease_expires_at = Column(DateTime, nullable=True)  # When the worker's claim lapses unless renewed
+    attempts = Column(Integer, default=0)  # Number of times the task has been claimed
+    max_attempts = Column(Integer, default=DEFAULT_MAX_ATTEMPTS, nullable=False)  # Claims before dead-lettering
+    next_attempt_at = Column(DateTime, nullable=True)  # Failed tasks are not retried before this
+    pending_parents = Column(Integer, default=0, nullable=False)  # Dependencies not done yet; claimable at 0
+    # Not picked up before this; UTC like the claim's clock rather than the database's
+    run_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)  # Higher priorities are picked up first
+    queue = Column(String(100), default=DEFAULT_QUEUE, nullable=False)  # Workers subscribe to named queues
+    task_type = Column(String(100), default=DEFAULT_TASK_TYPE, nullable=False)  # Selects the worker's handler
+    timeout_seconds = Column(Integer, nullable=True)  # Workers stop the task after this long; None is their default
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_tasks_status_lease_expires_at", "status", "lease_expires_at"),
+        Index("ix_tasks_status_run_at", "status", "run_at"),
+        Index("ix_tasks_user_id_status", "user_id", "status"),
+        Index("ix_tasks_queue_status", "queue", "status"),
+        # Queue order of pending tasks, so claiming the next batch is an index scan
+        Index(
+            "ix_tasks_pending_priority",
+            priority.desc(),
+            created_at,
+            id,
+            postgresql_where=status == TaskStatus.PENDING,
+            sqlite_where=status == TaskStatus.PENDING,
+        ),
+        # Each user's pending tasks in queue order, so the fair pick reads only the head of every user's queue
+        Index(
+            "ix_tasks_pending_user",
+            user_id,
+            priority.desc(),
+            created_at,
+            id,
+            postgresql_where=status == TaskStatus.PENDING,
+            sqlite_where=status == TaskStatus.PENDING,
+        ),
+    )
+
     def __str__(self):
         return f"Task(id={self.id}, title='{self.title}', status='{self.status}')"
+
+
+class TaskDependency(Base):
+    """Edge of the task dependency graph: ``task_id`` only runs once ``depends_on_id`` is done."""
+
+    __tablename__ = "task_dependencies"
+
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    depends_on_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+    def __str__(self):
+        return f"TaskDependency(task_id={self.task_id}, depends_on_id={self.depends_on_id})"
+
+
+class IdempotencyKey(Base):
+    """Response of a creation request, replayed when the request is retried with the same key."""
+
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String(50), primary_key=True)  # Endpoint the key was used with
+    key = Column(String(255), primary_key=True)  # Client-chosen Idempotency-Key header
+    fingerprint = Column(String(64), nullable=False)  # Digest of the request, to refuse reuse for another request
+    response_status = Column(Integer, nullable=True)  # None while the original request is in flight
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)  # Range-scanned when pruning
+
+    def __str__(self):
+        return f"IdempotencyKey(scope='{self.scope}', key='{self.key}')"
+
+
+class TaskEvent(Base):
+    """Task status transition, kept as a replay log for change streams."""
+
+    __tablename__ = "task_events"
+
+    id = Column(Integer, primary_key=True, index=True)  # Monotonic resume cursor
+    task_id = Column(Integer, index=True)  # Not a foreign key, events outlive deleted tasks
+    user_id = Column(Integer, index=True)
+    status = Column(Enum(TaskStatus))
+    worker_id = Column(String(100), nullable=True)
+    created_at = Column(DateTime, default=func.now(), index=True)  # Range-scanned when pruning
+
+    def __str__(self):
+        return f"TaskEvent(id={self.id}, task_id={self.task_id}, status='{self.status}')"
@@ -1,10 +1,13 @@
 """Pydantic schemas shared between services."""
 
 from datetime import datetime
+from typing import Generic, TypeVar
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
-from common.models import TaskStatus
+from common.models import DEFAULT_MAX_ATTEMPTS, DEFAULT_QUEUE, DEFAULT_TASK_TYPE, TaskStatus
+
+ItemT = TypeVar("ItemT")
 
 
 class UserBase(BaseModel):
@@ -27,6 +30,7 @@ class UserUpdate(BaseModel):
     email: EmailStr | None = None
     password: str | None = None
     is_active: bool | None = None
+    max_concurrent_tasks: int | None = Field(default=None, ge=1)
 
 
 class User(UserBase):
@@ -34,6 +38,7 @@ class User(UserBase):
 
     id: int
     is_active: bool
+    max_concurrent_tasks: int | None = None
     created_at: datetime
     updated_at: datetime
 
@@ -54,6 +59,20 @@ class TaskCreate(TaskBase):
     """Task creation schema."""
 
     user_id: int
+    priority: int = 0
+    queue: str = Field(default=DEFAULT_QUEUE, min_length=1, max_length=100)
+    task_type: str = Field(default=DEFAULT_TASK_TYPE, min_length=1, max_length=100)
+    max_attempts: int = Field(default=DEFAULT_MAX_ATTEMPTS, ge=1, le=100)
+    timeout_seconds: int | None = Field(default=None, ge=1, le=86400)  # None uses the worker's default
+    run_at: datetime | None = None  # Delay the task until this time; naive times are UTC
+    depends_on: list[int] = Field(default_factory=list, max_length=100)  # Run only once these tasks are done
+
+
+class TaskBulkItem(BaseModel):
+    """Outcome of one task of a bulk creation, in request order."""
+
+    id: int | None = None  # None if the task was rejected
+    error: str | None = None
 
 
 class TaskUpdate(BaseModel):
@@ -64,6 +83,9 @@ class TaskUpdate(BaseModel):
     status: TaskStatus | None = None
     worker_id: str | None = None
     error_message: str | None = None
+    priority: int | None = None
+    max_attempts: int | None = Field(default=None, ge=1, le=100)
+    timeout_seconds: int | None = Field(default=None, ge=1, le=86400)
 
 
 class Task(TaskBase):
@@ -76,6 +98,16 @@ class Task(TaskBase):
     started_at: datetime | None = None
     completed_at: datetime | None = None
     error_message: str | None = None
+    lease_expires_at: datetime | None = None
+    attempts: int = 0
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    next_attempt_at: datetime | None = None
+    run_at: datetime | None = None
+    pending_parents: int = 0
+    priority: int = 0
+    queue: str = DEFAULT_QUEUE
+    task_type: str = DEFAULT_TASK_TYPE
+    timeout_seconds: int | None = None
     created_at: datetime
     updated_at: datetime
 
@@ -91,3 +123,72 @@ class TaskStatusUpdate(BaseModel):
     status: TaskStatus
     worker_id: str | None = None
     error_message: str | None = None
+
+
+class TaskStatusBatch(BaseModel):
+    """Status updates of many tasks, keyed by task id, applied in one transaction."""
+
+    updates: dict[int, TaskStatusUpdate] = Field(max_length=1000)
+
+
+class TaskStatusBatchResult(BaseModel):
+    """Batch status update result schema."""
+
+    updated: list[int] = []
+    conflicts: list[int] = []  # Tasks no longer owned by the reporting worker
+    not_found: list[int] = []
+
+
+class TaskClaim(BaseModel):
+    """Task claim schema for workers pulling a batch of pending tasks."""
+
+    worker_id: str
+    batch: int = Field(default=1, ge=1, le=100)
+    lease_seconds: int = Field(default=60, ge=1, le=3600)
+    queues: list[str] | None = Field(default=None, min_length=1, max_length=100)  # None claims from every queue
+
+
+class TaskHeartbeat(BaseModel):
+    """Heartbeat schema for workers extending the leases of their in-flight tasks."""
+
+    worker_id: str
+    task_ids: list[int] = Field(max_length=1000)
+    lease_seconds: int = Field(default=60, ge=1, le=3600)
+
+
+class TaskHeartbeatResult(BaseModel):
+    """Heartbeat result schema."""
+
+    extended: list[int]
+    lost: list[int]
+    cancelled: list[int] = []  # Lost because they were cancelled; workers should stop them
+
+
+class TaskReapResult(BaseModel):
+    """Result of returning tasks with expired leases to the queue."""
+
+    requeued: int
+    dead_lettered: int
+
+
+class TaskEvent(BaseModel):
+    """Task status transition schema for change streams."""
+
+    id: int
+    task_id: int
+    user_id: int | None = None
+    status: TaskStatus
+    worker_id: str | None = None
+    created_at: datetime
+
+    class Config:
+        """Pydantic config."""
+
+        from_attributes = True
+
+
+class Page(BaseModel, Generic[ItemT]):
+    """A page of a paginated list endpoint."""
+
+    items: list[ItemT]
+    next_cursor: str | None = None  # None on the last page
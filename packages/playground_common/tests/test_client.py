@@ -0,0 +1,226 @@
+"""Test the API client."""
+
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+import requests
+import responses
+
+from common.client import APIClient, APIError, AsyncAPIClient, backoff_delay
+from common.models import TaskStatus
+from common.schemas import TaskClaim, TaskCreate, TaskStatusUpdate
+
+BASE_URL = "http://api.test/api"
+RETRIES = 2
+
+TASK_DATA = {
+    "id": 1,
+    "title": "Test Task",
+    "status": "pending",
+    "user_id": 1,
+    "created_at": "2024-01-01T00:00:00",
+    "updated_at": "2024-01-01T00:00:00",
+}
+
+
+@pytest.fixture
+def client():
+    """Create a client that doesn't sleep between retries."""
+    with APIClient(BASE_URL, retries=RETRIES) as client, patch("common.client.time.sleep") as mock_sleep:
+        client.mock_sleep = mock_sleep
+        yield client
+
+
+class TestAPIClient:
+    """Test APIClient requests."""
+
+    @responses.activate
+    def test_get_task(self, client):
+        """Test responses are parsed into schema models."""
+        responses.add(responses.GET, f"{BASE_URL}/tasks/1", json=TASK_DATA)
+
+        task = client.get_task(1)
+        assert task.id == 1
+        assert task.status == TaskStatus.PENDING
+
+    @responses.activate
+    def test_create_task(self, client):
+        """Test request bodies are serialized from schema models."""
+        responses.add(
+            responses.POST,
+            f"{BASE_URL}/tasks/",
+            json=TASK_DATA,
+            status=201,
+            match=[
+                responses.matchers.json_params_matcher(
+                    {
+                        "title": "Test Task",
+                        "description": None,
+                        "user_id": 1,
+                        "priority": 0,
+                        "queue": "default",
+                        "task_type": "default",
+                        "max_attempts": 3,
+                        "timeout_seconds": None,
+                        "run_at": None,
+                        "depends_on": [],
+                    }
+                )
+            ],
+        )
+
+        assert client.create_task(TaskCreate(title="Test Task", user_id=1)).id == 1
+
+    @responses.activate
+    def test_claim_tasks_long_poll_timeout(self, client):
+        """Test long-polling requests extend the read timeout by the wait."""
+        responses.add(
+            responses.POST,
+            f"{BASE_URL}/tasks/worker/claim",
+            json=[TASK_DATA],
+            match=[responses.matchers.query_param_matcher({"wait": "5"})],
+        )
+
+        tasks = client.claim_tasks(TaskClaim(worker_id="worker-1"), wait=5)
+        assert [task.id for task in tasks] == [1]
+        assert responses.calls[0].request.req_kwargs["timeout"] == (client.timeout[0], client.timeout[1] + 5)
+
+    @responses.activate
+    def test_list_tasks_pages(self, client):
+        """Test list pages carry the cursor of the next page from the response header."""
+        responses.add(
+            responses.GET,
+            f"{BASE_URL}/tasks/",
+            json=[TASK_DATA],
+            headers={"X-Next-Cursor": "next"},
+            match=[responses.matchers.query_param_matcher({"limit": "1"})],
+        )
+        responses.add(
+            responses.GET,
+            f"{BASE_URL}/tasks/",
+            json=[],
+            match=[responses.matchers.query_param_matcher({"limit": "1", "cursor": "next"})],
+        )
+
+        page = client.list_tasks(limit=1)
+        assert [task.id for task in page.items] == [1]
+        assert page.next_cursor == "next"
+
+        page = client.list_tasks(limit=1, cursor=page.next_cursor)
+        assert page.items == []
+        assert page.next_cursor is None
+
+    @responses.activate
+    def test_error_status_raises(self, client):
+        """Test error answers raise APIError with the API's detail, without retrying."""
+        responses.add(responses.GET, f"{BASE_URL}/tasks/1", json={"detail": "Task not found"}, status=404)
+
+        with pytest.raises(APIError) as excinfo:
+            client.get_task(1)
+        assert excinfo.value.status_code == requests.codes.not_found
+        assert excinfo.value.detail == "Task not found"
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_idempotent_request_retried(self, client):
+        """Test idempotent requests are retried with backoff when the API is unavailable."""
+        responses.add(responses.PUT, f"{BASE_URL}/tasks/1/status", status=503)
+        responses.add(responses.PUT, f"{BASE_URL}/tasks/1/status", body=requests.ConnectionError("refused"))
+        responses.add(responses.PUT, f"{BASE_URL}/tasks/1/status", json=TASK_DATA)
+
+        client.update_task_status(1, TaskStatusUpdate(status=TaskStatus.DONE, worker_id="worker-1"))
+        assert len(responses.calls) == RETRIES + 1
+        assert client.mock_sleep.call_count == RETRIES
+
+    @responses.activate
+    def test_create_with_idempotency_key_retried(self, client):
+        """Test creations carrying an idempotency key are retried, since the API replays the original answer."""
+        idempotency_matcher = responses.matchers.header_matcher({"Idempotency-Key": "key-1"})
+        responses.add(responses.POST, f"{BASE_URL}/tasks/", status=503, match=[idempotency_matcher])
+        responses.add(responses.POST, f"{BASE_URL}/tasks/", json=TASK_DATA, status=201, match=[idempotency_matcher])
+
+        assert client.create_task(TaskCreate(title="Test Task", user_id=1), idempotency_key="key-1").id == 1
+        # Answered by the retry
+        assert [call.response.status_code for call in responses.calls] == [503, 201]
+
+    @responses.activate
+    def test_retries_exhausted(self, client):
+        """Test the last transport error is raised once retries are exhausted."""
+        responses.add(responses.GET, f"{BASE_URL}/tasks/1", body=requests.ConnectionError("refused"))
+
+        with pytest.raises(requests.ConnectionError):
+            client.get_task(1)
+        assert len(responses.calls) == RETRIES + 1
+
+    @responses.activate
+    def test_non_idempotent_request_not_retried(self, client):
+        """Test creating a task is not retried, since it could create duplicates."""
+        responses.add(responses.POST, f"{BASE_URL}/tasks/", status=503)
+
+        with pytest.raises(APIError):
+            client.create_task(TaskCreate(title="Test Task", user_id=1))
+        assert len(responses.calls) == 1
+
+
+class TestAsyncAPIClient:
+    """Test AsyncAPIClient requests."""
+
+    @staticmethod
+    def run(handler, call):
+        """Run ``call`` on a client whose requests are answered by ``handler``, without sleeping between retries."""
+
+        async def main():
+            transport = httpx.MockTransport(handler)
+            async with AsyncAPIClient(BASE_URL, retries=RETRIES, transport=transport) as client:
+                return await call(client)
+
+        with patch("common.client.asyncio.sleep") as mock_sleep:
+            return asyncio.run(main()), mock_sleep
+
+    def test_claim_tasks(self):
+        """Test claims send the schema model and parse the claimed tasks."""
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(200, json=[TASK_DATA])
+
+        tasks, _ = self.run(handler, lambda client: client.claim_tasks(TaskClaim(worker_id="worker-1"), wait=5))
+        assert [task.id for task in tasks] == [1]
+        assert requests_seen[0].url.path == "/api/tasks/worker/claim"
+        assert requests_seen[0].url.params["wait"] == "5"
+
+    def test_idempotent_request_retried(self):
+        """Test idempotent requests are retried with backoff when the API is unavailable."""
+        answers = iter([httpx.Response(503), httpx.ConnectError("refused"), httpx.Response(200, json=TASK_DATA)])
+
+        def handler(_request):
+            answer = next(answers)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        update = TaskStatusUpdate(status=TaskStatus.DONE, worker_id="worker-1")
+        task, mock_sleep = self.run(handler, lambda client: client.update_task_status(1, update))
+        assert task.id == 1
+        assert mock_sleep.call_count == RETRIES
+
+    def test_error_status_raises(self):
+        """Test error answers raise APIError with the API's detail."""
+
+        def handler(_request):
+            return httpx.Response(409, json={"detail": "Task is no longer owned by this worker"})
+
+        update = TaskStatusUpdate(status=TaskStatus.DONE, worker_id="worker-1")
+        with pytest.raises(APIError) as excinfo:
+            self.run(handler, lambda client: client.update_task_status(1, update))
+        assert excinfo.value.status_code == requests.codes.conflict
+        assert excinfo.value.detail == "Task is no longer owned by this worker"
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    """Test the backoff grows exponentially up to the cap, with full jitter."""
+    with patch("common.client.random.uniform", side_effect=lambda _low, high: high):
+        assert [backoff_delay(attempt, base=1, cap=5) for attempt in range(5)] == [1, 2, 4, 5, 5]
@@ -104,6 +104,9 @@ class TestTask:
         test_db.refresh(task)
 
         assert task.status == TaskStatus.PENDING
+        assert task.attempts == 0
+        assert task.priority == 0
+        assert task.lease_expires_at is None
         assert task.created_at is not None
         assert task.updated_at is not None
 
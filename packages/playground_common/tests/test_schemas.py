@@ -5,7 +5,7 @@ from datetime import datetime
 import pytest
 
 from common.models import TaskStatus
-from common.schemas import Task, TaskBase, TaskCreate, TaskUpdate, User, UserBase, UserCreate, UserUpdate
+from common.schemas import Task, TaskBase, TaskClaim, TaskCreate, TaskUpdate, User, UserBase, UserCreate, UserUpdate
 
 
 class TestUserSchemas:
@@ -107,6 +107,7 @@ class TestTaskSchemas:
         assert task.title == "Test Task"
         assert task.description == "This is a test task"
         assert task.user_id == 1
+        assert task.priority == 0
 
     def test_task_update_partial(self):
         """Test TaskUpdate with partial data."""
@@ -166,3 +167,17 @@ class TestTaskSchemas:
         assert task.description is None
         assert task.status == TaskStatus.PENDING
         assert task.user_id == 1
+
+    def test_task_claim_defaults(self):
+        """Test TaskClaim defaults to claiming a single task."""
+        claim = TaskClaim(worker_id="worker-1")
+
+        assert claim.worker_id == "worker-1"
+        assert claim.batch == 1
+
+    def test_task_claim_batch_bounds(self):
+        """Test TaskClaim rejects out-of-range batch sizes."""
+        with pytest.raises(ValueError):
+            TaskClaim(worker_id="worker-1", batch=0)
+        with pytest.raises(ValueError):
+            TaskClaim(worker_id="worker-1", batch=101)
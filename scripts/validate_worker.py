@@ -1,30 +1,37 @@
 #!/usr/bin/env python3
-"""Validation script for worker behavior."""
+"""Validation script for worker behavior.
+
+Uses the shared API client, so run it from an environment with the common package installed:
+    cd services/worker && uv run python ../../scripts/validate_worker.py
+"""
 
 import time
 import requests
 import json
 
+from common.client import APIClient, APIError
+from common.schemas import TaskCreate, UserCreate
+
 API_BASE_URL = "http://localhost:8000/api"
 
+api = APIClient(API_BASE_URL)
+
 
 def create_test_user():
     """Create a test user."""
-    user_data = {
-        "username": "testworker",
-        "email": "testworker@example.com",
-        "password": "testpass123"
-    }
+    user_data = UserCreate(
+        username="testworker",
+        email="testworker@example.com",
+        password="testpass123"
+    )
     
     try:
-        response = requests.post(f"{API_BASE_URL}/users/", json=user_data)
-        if response.status_code == 201:
-            user = response.json()
-            print(f"Created test user: {user['username']} (ID: {user['id']})")
-            return user
-        else:
-            print(f"Failed to create user: {response.status_code}")
-            return None
+        user = api.create_user(user_data)
+        print(f"Created test user: {user.username} (ID: {user.id})")
+        return user
+    except APIError as e:
+        print(f"Failed to create user: {e.status_code}")
+        return None
     except requests.RequestException as e:
         print(f"Error creating user: {e}")
         return None
@@ -32,21 +39,19 @@ def create_test_user():
 
 def create_test_task(user_id: int, title: str, description: str = None):
     """Create a test task."""
-    task_data = {
-        "title": title,
-        "description": description or f"Test task: {title}",
-        "user_id": user_id
-    }
+    task_data = TaskCreate(
+        title=title,
+        description=description or f"Test task: {title}",
+        user_id=user_id
+    )
     
     try:
-        response = requests.post(f"{API_BASE_URL}/tasks/", json=task_data)
-        if response.status_code == 201:
-            task = response.json()
-            print(f"Created test task: {task['title']} (ID: {task['id']}, Status: {task['status']})")
-            return task
-        else:
-            print(f"Failed to create task: {response.status_code}")
-            return None
+        task = api.create_task(task_data)
+        print(f"Created test task: {task.title} (ID: {task.id}, Status: {task.status.value})")
+        return task
+    except APIError as e:
+        print(f"Failed to create task: {e.status_code}")
+        return None
     except requests.RequestException as e:
         print(f"Error creating task: {e}")
         return None
@@ -55,20 +60,18 @@ def create_test_task(user_id: int, title: str, description: str = None):
 def check_task_status(task_id: int):
     """Check the current status of a task."""
     try:
-        response = requests.get(f"{API_BASE_URL}/tasks/{task_id}")
-        if response.status_code == 200:
-            task = response.json()
-            print(f"Task {task_id} status: {task['status']}")
-            if task.get('started_at'):
-                print(f"  Started at: {task['started_at']}")
-            if task.get('completed_at'):
-                print(f"  Completed at: {task['completed_at']}")
-            if task.get('worker_id'):
-                print(f"  Worker ID: {task['worker_id']}")
-            return task
-        else:
-            print(f"Failed to get task {task_id}: {response.status_code}")
-            return None
+        task = api.get_task(task_id)
+        print(f"Task {task_id} status: {task.status.value}")
+        if task.started_at:
+            print(f"  Started at: {task.started_at}")
+        if task.completed_at:
+            print(f"  Completed at: {task.completed_at}")
+        if task.worker_id:
+            print(f"  Worker ID: {task.worker_id}")
+        return task
+    except APIError as e:
+        print(f"Failed to get task {task_id}: {e.status_code}")
+        return None
     except requests.RequestException as e:
         print(f"Error getting task {task_id}: {e}")
         return None
@@ -77,21 +80,40 @@ def check_task_status(task_id: int):
 def get_pending_tasks():
     """Get all pending tasks."""
     try:
-        response = requests.get(f"{API_BASE_URL}/tasks/worker/pending")
-        if response.status_code == 200:
-            tasks = response.json()
-            print(f"Found {len(tasks)} pending tasks:")
-            for task in tasks:
-                print(f"  - Task {task['id']}: {task['title']} (Status: {task['status']})")
-            return tasks
-        else:
-            print(f"Failed to get pending tasks: {response.status_code}")
-            return []
+        tasks = api.get_pending_tasks()
+        print(f"Found {len(tasks)} pending tasks:")
+        for task in tasks:
+            print(f"  - Task {task.id}: {task.title} (Status: {task.status.value})")
+        return tasks
+    except APIError as e:
+        print(f"Failed to get pending tasks: {e.status_code}")
+        return []
     except requests.RequestException as e:
         print(f"Error getting pending tasks: {e}")
         return []
 
 
+def stream_task_events(task_ids: list, last_event_id: int = 0):
+    """Yield status events for the given tasks from the API's event stream, resuming after disconnects."""
+    while True:
+        try:
+            response = api.session.get(
+                f"{API_BASE_URL}/tasks/events",
+                params={"task_id": task_ids},
+                headers={"Last-Event-ID": str(last_event_id)},
+                stream=True,
+                timeout=60,
+            )
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("data: "):
+                    event = json.loads(line[len("data: "):])
+                    last_event_id = event["id"]
+                    yield event
+        except requests.RequestException as e:
+            print(f"Event stream interrupted ({e}), reconnecting...")
+            time.sleep(1)
+
+
 def main():
     """Main validation function."""
     print("=== Worker Behavior Validation ===")
@@ -99,11 +121,11 @@ def main():
     
     # Check if API is running
     try:
-        response = requests.get(f"{API_BASE_URL}/users/")
-        if response.status_code != 200:
-            print("❌ API is not responding. Make sure the API service is running.")
-            return
+        api.list_users(limit=1)
         print("✅ API is responding")
+    except APIError:
+        print("❌ API is not responding. Make sure the API service is running.")
+        return
     except requests.RequestException:
         print("❌ Cannot connect to API. Make sure the API service is running.")
         return
@@ -121,7 +143,7 @@ def main():
     # Create test tasks
     tasks = []
     for i in range(3):
-        task = create_test_task(user['id'], f"Test Task {i+1}")
+        task = create_test_task(user.id, f"Test Task {i+1}")
         if task:
             tasks.append(task)
     
@@ -133,7 +155,7 @@ def main():
     print(f"Created {len(tasks)} test tasks. Now start the worker in another terminal:")
     print("  cd services/worker && task run")
     print()
-    print("The worker will poll for pending tasks every 10 seconds and process them one by one.")
+    print("The worker will claim pending tasks and process them one by one.")
     print("Each task will take 10 seconds to complete (WIP -> DONE).")
     print()
     
@@ -143,20 +165,15 @@ def main():
     print()
     
     try:
-        while True:
-            print(f"\n--- Status Check at {time.strftime('%H:%M:%S')} ---")
-            
-            # Check pending tasks
-            pending = get_pending_tasks()
-            
-            # Check status of all created tasks
-            for task in tasks:
-                check_task_status(task['id'])
-                print()
-            
-            # Wait before next check
-            time.sleep(5)
-            
+        # Show the current state, then follow transitions as the API pushes them
+        for task in tasks:
+            check_task_status(task.id)
+            print()
+
+        for event in stream_task_events([task.id for task in tasks]):
+            print(f"[{time.strftime('%H:%M:%S')}] Task {event['task_id']} -> {event['status']}"
+                  + (f" (worker: {event['worker_id']})" if event.get('worker_id') else ""))
+
     except KeyboardInterrupt:
         print("\n\nMonitoring stopped.")
         print("Check the worker logs to see the processing details.")
@@ -0,0 +1,32 @@
+"""Add worker leases to tasks.
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-01-03 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add lease columns to tasks table."""
+    op.add_column('tasks', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    op.add_column('tasks', sa.Column('attempts', sa.Integer(), nullable=True, server_default='0'))
+
+    # Index used by the reaper to find WIP tasks with expired leases
+    op.create_index('ix_tasks_status_lease_expires_at', 'tasks', ['status', 'lease_expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove lease columns from tasks table."""
+    op.drop_index('ix_tasks_status_lease_expires_at', table_name='tasks')
+
+    op.drop_column('tasks', 'attempts')
+    op.drop_column('tasks', 'lease_expires_at')
@@ -0,0 +1,39 @@
+"""Add task events table for change streams.
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-01-04 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create task_events table."""
+    op.create_table('task_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(20), nullable=True),
+        sa.Column('worker_id', sa.String(100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_task_events_id'), 'task_events', ['id'], unique=False)
+    op.create_index(op.f('ix_task_events_task_id'), 'task_events', ['task_id'], unique=False)
+    op.create_index(op.f('ix_task_events_user_id'), 'task_events', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop task_events table."""
+    op.drop_index(op.f('ix_task_events_user_id'), table_name='task_events')
+    op.drop_index(op.f('ix_task_events_task_id'), table_name='task_events')
+    op.drop_index(op.f('ix_task_events_id'), table_name='task_events')
+    op.drop_table('task_events')
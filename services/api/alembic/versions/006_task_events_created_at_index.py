@@ -0,0 +1,24 @@
+"""Index task events by creation time for pruning.
+
+Revision ID: 006
+Revises: 005
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add created_at index to task_events table."""
+    op.create_index(op.f('ix_task_events_created_at'), 'task_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove created_at index from task_events table."""
+    op.drop_index(op.f('ix_task_events_created_at'), table_name='task_events')
@@ -0,0 +1,37 @@
+"""Add task priority.
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-01-06 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add priority column and the pending queue index to tasks table."""
+    op.add_column('tasks', sa.Column('priority', sa.Integer(), nullable=False, server_default='0'))
+
+    # Matches the claim order; partial so only pending tasks are indexed (statuses are stored by enum name)
+    op.create_index(
+        'ix_tasks_pending_priority',
+        'tasks',
+        [sa.text('priority DESC'), 'created_at', 'id'],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+        sqlite_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    """Remove priority column from tasks table."""
+    op.drop_index('ix_tasks_pending_priority', table_name='tasks')
+
+    op.drop_column('tasks', 'priority')
@@ -0,0 +1,29 @@
+"""Add retry scheduling to tasks.
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-01-07 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add max_attempts and next_attempt_at columns to tasks table."""
+    # The status column is a plain string, so the new DEAD_LETTER status needs no type change
+    op.add_column('tasks', sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3'))
+    op.add_column('tasks', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove retry columns from tasks table."""
+    op.execute("UPDATE tasks SET status = 'FAILED' WHERE status = 'DEAD_LETTER'")
+    op.drop_column('tasks', 'next_attempt_at')
+    op.drop_column('tasks', 'max_attempts')
@@ -0,0 +1,36 @@
+"""Add scheduled run times to tasks.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2024-01-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add run_at column and its due-time index to tasks table."""
+    op.add_column('tasks', sa.Column('run_at', sa.DateTime(), nullable=True))
+
+    # Existing tasks were due as soon as they were created
+    op.execute("UPDATE tasks SET run_at = COALESCE(created_at, CURRENT_TIMESTAMP)")
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.alter_column('run_at', existing_type=sa.DateTime(), nullable=False)
+
+    # Finding due pending tasks is a range scan over run_at
+    op.create_index('ix_tasks_status_run_at', 'tasks', ['status', 'run_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove run_at column from tasks table."""
+    op.drop_index('ix_tasks_status_run_at', table_name='tasks')
+
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('run_at')
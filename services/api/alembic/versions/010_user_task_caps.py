@@ -0,0 +1,30 @@
+"""Add per-user concurrency caps.
+
+Revision ID: 010
+Revises: 009
+Create Date: 2024-01-09 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add max_concurrent_tasks column to users table."""
+    op.add_column('users', sa.Column('max_concurrent_tasks', sa.Integer(), nullable=True))
+
+    # Fair claiming ranks each user's pending tasks and counts their WIP tasks
+    op.create_index('ix_tasks_user_id_status', 'tasks', ['user_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove max_concurrent_tasks column from users table."""
+    op.drop_index('ix_tasks_user_id_status', table_name='tasks')
+
+    op.drop_column('users', 'max_concurrent_tasks')
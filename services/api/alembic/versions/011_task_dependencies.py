@@ -0,0 +1,39 @@
+"""Add task dependencies.
+
+Revision ID: 011
+Revises: 010
+Create Date: 2024-01-10 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add the task_dependencies table and the pending_parents counter."""
+    op.create_table(
+        'task_dependencies',
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('depends_on_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['depends_on_id'], ['tasks.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('task_id', 'depends_on_id'),
+    )
+    # Finds the dependents of a task when it completes or fails
+    op.create_index(op.f('ix_task_dependencies_depends_on_id'), 'task_dependencies', ['depends_on_id'], unique=False)
+
+    op.add_column('tasks', sa.Column('pending_parents', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Remove task dependencies."""
+    op.drop_column('tasks', 'pending_parents')
+
+    op.drop_index(op.f('ix_task_dependencies_depends_on_id'), table_name='task_dependencies')
+    op.drop_table('task_dependencies')
@@ -0,0 +1,30 @@
+"""Add named task queues.
+
+Revision ID: 012
+Revises: 011
+Create Date: 2024-01-11 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add queue column to tasks table."""
+    op.add_column('tasks', sa.Column('queue', sa.String(100), nullable=False, server_default='default'))
+
+    # Workers claim the pending tasks of the queues they subscribe to
+    op.create_index('ix_tasks_queue_status', 'tasks', ['queue', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove queue column from tasks table."""
+    op.drop_index('ix_tasks_queue_status', table_name='tasks')
+
+    op.drop_column('tasks', 'queue')
@@ -0,0 +1,38 @@
+"""Add idempotency keys.
+
+Revision ID: 013
+Revises: 012
+Create Date: 2024-01-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add the idempotency_keys table."""
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('scope', sa.String(50), nullable=False),
+        sa.Column('key', sa.String(255), nullable=False),
+        sa.Column('fingerprint', sa.String(64), nullable=False),
+        sa.Column('response_status', sa.Integer(), nullable=True),
+        sa.Column('response_body', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        # Unique per endpoint, so concurrent retries of a request cannot both insert
+        sa.PrimaryKeyConstraint('scope', 'key'),
+    )
+    op.create_index(op.f('ix_idempotency_keys_expires_at'), 'idempotency_keys', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove the idempotency_keys table."""
+    op.drop_index(op.f('ix_idempotency_keys_expires_at'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
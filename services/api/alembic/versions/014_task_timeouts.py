@@ -0,0 +1,26 @@
+"""Add per-task execution timeouts.
+
+Revision ID: 014
+Revises: 013
+Create Date: 2024-01-13 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add timeout_seconds column to tasks table."""
+    # Null means the worker's default timeout
+    op.add_column('tasks', sa.Column('timeout_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove timeout_seconds column from tasks table."""
+    op.drop_column('tasks', 'timeout_seconds')
@@ -0,0 +1,26 @@
+"""Add task types.
+
+Revision ID: 015
+Revises: 014
+Create Date: 2024-01-14 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add task_type column to tasks table."""
+    # Workers look up the handler of a task by its type
+    op.add_column('tasks', sa.Column('task_type', sa.String(100), nullable=False, server_default='default'))
+
+
+def downgrade() -> None:
+    """Remove task_type column from tasks table."""
+    op.drop_column('tasks', 'task_type')
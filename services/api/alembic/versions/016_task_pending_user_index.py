@@ -0,0 +1,33 @@
+"""Add pending tasks by user index.
+
+Revision ID: 016
+Revises: 015
+Create Date: 2024-01-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add the index of pending tasks by user to tasks table."""
+    # The fair pick reads the head of each user's queue; partial so only pending tasks are indexed
+    op.create_index(
+        'ix_tasks_pending_user',
+        'tasks',
+        ['user_id', sa.text('priority DESC'), 'created_at', 'id'],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+        sqlite_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade() -> None:
+    """Remove the index of pending tasks by user from tasks table."""
+    op.drop_index('ix_tasks_pending_user', table_name='tasks')
@@ -0,0 +1,127 @@
+"""Task dependencies: a task only becomes claimable once every task it depends on is done.
+
+Each task keeps a ``pending_parents`` counter of dependencies that are not done yet. It is set when
+the task is created and decremented as its parents complete, so eligibility is a column check
+rather than a scan of the dependency graph.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime
+
+from common.models import Task, TaskDependency, TaskStatus
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.events import record_transitions
+from src.notifier import task_available
+
+# Statuses in which a task will never complete, failing the tasks that depend on it
+FAILED_STATUSES = frozenset({TaskStatus.FAILED, TaskStatus.DEAD_LETTER, TaskStatus.CANCELLED})
+
+_UNBLOCKED_KEY = "tasks_unblocked"
+
+
+def lock_parents(db: Session, parent_ids: Iterable[int]) -> dict[int, TaskStatus]:
+    """Get the status of the given tasks, keyed by id; unknown ids are left out.
+
+    The rows are share-locked until the transaction ends, so a parent cannot complete between
+    reading its status and committing the dependency on it.
+    """
+    parent_ids = set(parent_ids)
+    if not parent_ids:
+        return {}
+    query = (
+        db.query(Task.id, Task.status)
+        .filter(Task.id.in_(parent_ids))
+        .order_by(Task.id)
+        .with_for_update(read=True, of=Task)
+    )
+    return dict(query)
+
+
+def initial_state(depends_on: Iterable[int], parent_statuses: dict[int, TaskStatus]) -> dict:
+    """Get the column values of a new task that depends on ``depends_on``.
+
+    A task whose dependency already failed is created failed, since it could never run.
+    """
+    depends_on = set(depends_on)
+    failed = sorted(parent_id for parent_id in depends_on if parent_statuses[parent_id] in FAILED_STATUSES)
+    if failed:
+        return {
+            "status": TaskStatus.FAILED,
+            "error_message": f"Dependency {failed[0]} failed",
+            "completed_at": datetime.utcnow(),
+            "pending_parents": 0,
+        }
+    pending = sum(1 for parent_id in depends_on if parent_statuses[parent_id] != TaskStatus.DONE)
+    return {"status": TaskStatus.PENDING, "pending_parents": pending}
+
+
+def add_dependencies(db: Session, edges: Iterable[tuple[int, Iterable[int]]]) -> None:
+    """Record ``(task id, ids it depends on)`` edges of new tasks with one multi-row insert."""
+    rows = [
+        {"task_id": task_id, "depends_on_id": parent_id}
+        for task_id, depends_on in edges
+        for parent_id in set(depends_on)
+    ]
+    if rows:
+        db.bulk_insert_mappings(TaskDependency, rows)
+
+
+def status_changed(db: Session, task_id: int, previous: TaskStatus, status: TaskStatus) -> None:
+    """Propagate a task's status transition to the tasks that depend on it."""
+    if status == TaskStatus.DONE and previous != TaskStatus.DONE:
+        parent_done(db, task_id)
+    elif status in FAILED_STATUSES and previous not in FAILED_STATUSES:
+        parent_failed(db, task_id)
+
+
+def parent_done(db: Session, task_id: int) -> None:
+    """Count a completed task off the pending parents of its dependents."""
+    children = db.query(TaskDependency.task_id).filter(TaskDependency.depends_on_id == task_id)
+    unblocked = (
+        db.query(Task)
+        .filter(Task.id.in_(children.subquery()), Task.pending_parents > 0)
+        .update({Task.pending_parents: Task.pending_parents - 1}, synchronize_session=False)
+    )
+    if unblocked:
+        db.info[_UNBLOCKED_KEY] = True
+
+
+def parent_failed(db: Session, task_id: int) -> list[int]:
+    """Fail every pending task that transitively depends on a failed task; returns their ids."""
+    now = datetime.utcnow()
+    failed = []
+    frontier = [task_id]
+    while frontier:
+        children = db.query(TaskDependency.task_id).filter(TaskDependency.depends_on_id.in_(frontier))
+        waiting = (
+            db.query(Task.id, Task.user_id)
+            .filter(Task.id.in_(children.subquery()), Task.status == TaskStatus.PENDING)
+            .all()
+        )
+        if not waiting:
+            break
+        frontier = [child_id for child_id, _ in waiting]
+        db.query(Task).filter(Task.id.in_(frontier), Task.status == TaskStatus.PENDING).update(
+            {
+                Task.status: TaskStatus.FAILED,
+                Task.error_message: f"Dependency {task_id} failed",
+                Task.completed_at: now,
+            },
+            synchronize_session=False,
+        )
+        record_transitions(db, [(child_id, user_id, TaskStatus.FAILED) for child_id, user_id in waiting])
+        failed.extend(frontier)
+    return failed
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    if session.info.pop(_UNBLOCKED_KEY, False):
+        task_available.notify()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session: Session, _previous_transaction) -> None:
+    session.info.pop(_UNBLOCKED_KEY, None)
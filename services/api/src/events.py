@@ -0,0 +1,166 @@
+"""Task status events recorded for change streams."""
+
+import asyncio
+from collections import deque
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+
+from common.models import TaskEvent, TaskStatus
+from common.schemas import TaskEvent as TaskEventSchema
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.notifier import RECHECK_INTERVAL, Notifier
+
+# Maximum number of events read from the database per round trip
+EVENT_BATCH_SIZE = 100
+# Events older than this are pruned whenever the reaper runs
+EVENT_RETENTION = timedelta(days=1)
+# On PostgreSQL concurrent transactions can commit event ids out of order. Streams only serve ids that were
+# already allocated this many seconds ago, by which time their (short) transactions have committed, so a
+# lower id never becomes visible after the cursor moved past it.
+EVENT_SETTLE_SECONDS = 1.0
+# Idle streams send a comment this often so proxies don't drop the connection
+KEEPALIVE_INTERVAL = 15.0
+# Reconnection delay suggested to clients, in milliseconds
+RETRY_MILLISECONDS = 1000
+# Streams are closed after this many seconds; clients reconnect and resume from their last event id
+STREAM_MAX_SECONDS = 300
+
+_PENDING_EVENTS_KEY = "task_events_pending"
+
+# Notified after a transaction that recorded task events commits
+task_events = Notifier()
+
+
+def record_transition(
+    db: Session, task_id: int, user_id: int | None, status: TaskStatus, worker_id: str | None = None
+) -> None:
+    """Record a task status transition as part of the session's current transaction."""
+    db.add(TaskEvent(task_id=task_id, user_id=user_id, status=status, worker_id=worker_id))
+    db.info[_PENDING_EVENTS_KEY] = True
+
+
+def record_transitions(db: Session, transitions: list[tuple[int, int | None, TaskStatus]]) -> None:
+    """Record many ``(task_id, user_id, status)`` transitions with one multi-row insert."""
+    if not transitions:
+        return
+    db.bulk_insert_mappings(
+        TaskEvent,
+        [{"task_id": task_id, "user_id": user_id, "status": status} for task_id, user_id, status in transitions],
+    )
+    db.info[_PENDING_EVENTS_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    if session.info.pop(_PENDING_EVENTS_KEY, False):
+        task_events.notify()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session: Session, _previous_transaction) -> None:
+    session.info.pop(_PENDING_EVENTS_KEY, None)
+
+
+def latest_event_id(db: Session) -> int:
+    """Get the id of the most recent event, or 0 if there are none."""
+    return db.query(func.max(TaskEvent.id)).scalar() or 0
+
+
+def settle_seconds(bind: Engine) -> float:
+    """Get how long event ids must settle before streams serve them.
+
+    SQLite serializes writers, so ids always become visible in order there.
+    """
+    return EVENT_SETTLE_SECONDS if bind.dialect.name == "postgresql" else 0.0
+
+
+def events_after(
+    db: Session,
+    cursor: int,
+    user_id: int | None = None,
+    task_ids: list[int] | None = None,
+    until: int | None = None,
+) -> list[TaskEvent]:
+    """Get the next batch of events after ``cursor`` (and up to ``until``) matching the filters."""
+    query = db.query(TaskEvent).filter(TaskEvent.id > cursor)
+    if until is not None:
+        query = query.filter(TaskEvent.id <= until)
+    if user_id is not None:
+        query = query.filter(TaskEvent.user_id == user_id)
+    if task_ids:
+        query = query.filter(TaskEvent.task_id.in_(task_ids))
+    return query.order_by(TaskEvent.id).limit(EVENT_BATCH_SIZE).all()
+
+
+def prune_events(db: Session, retention: timedelta = EVENT_RETENTION) -> int:
+    """Delete events older than ``retention``. Returns the number of deleted events."""
+    deleted = (
+        db.query(TaskEvent)
+        .filter(TaskEvent.created_at < datetime.utcnow() - retention)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def format_event(task_event: TaskEvent) -> str:
+    """Format an event as a Server-Sent Events message."""
+    data = TaskEventSchema.model_validate(task_event).model_dump_json()
+    return f"id: {task_event.id}\nevent: task\ndata: {data}\n\n"
+
+
+async def stream_events(
+    bind: Engine, cursor: int, user_id: int | None, task_ids: list[int] | None, duration: float
+) -> AsyncIterator[str]:
+    """Stream events after ``cursor`` as Server-Sent Events for ``duration`` seconds.
+
+    Each read uses a short-lived session on ``bind`` so no connection is held while the stream is idle.
+    Where ids can commit out of order, events are held back until they settled (``EVENT_SETTLE_SECONDS``).
+    """
+    settle = settle_seconds(bind)
+    # (time, latest event id) samples used to find the ids that have settled
+    samples: deque[tuple[float, int]] = deque()
+
+    def fetch(after: int, until: int | None) -> tuple[list[TaskEvent], int]:
+        db = Session(bind=bind)
+        try:
+            latest = latest_event_id(db) if settle else 0
+            return events_after(db, after, user_id, task_ids, until), latest
+        finally:
+            db.close()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    last_sent = loop.time()
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+
+    while (remaining := deadline - loop.time()) > 0:
+        version = task_events.version
+        until = None
+        if settle:
+            settled_at = loop.time() - settle
+            while len(samples) > 1 and samples[1][0] <= settled_at:
+                samples.popleft()
+            until = samples[0][1] if samples and samples[0][0] <= settled_at else cursor
+        batch, latest = await run_in_threadpool(fetch, cursor, until)
+        if settle:
+            samples.append((loop.time(), latest))
+        for task_event in batch:
+            yield format_event(task_event)
+            cursor = task_event.id
+        if batch:
+            last_sent = loop.time()
+            if len(batch) == EVENT_BATCH_SIZE:
+                continue
+        elif loop.time() - last_sent >= KEEPALIVE_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_sent = loop.time()
+        timeout = min(remaining, RECHECK_INTERVAL)
+        if settle and latest > until:
+            # Newer events are waiting to settle
+            timeout = min(timeout, settle)
+        await task_events.wait(version, timeout)
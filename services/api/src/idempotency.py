@@ -0,0 +1,98 @@
+"""Idempotency keys: a creation request retried with the same ``Idempotency-Key`` gets the original response.
+
+The key is inserted in the same transaction as the rows the request creates, and its primary key is the
+only guard against duplicates. A retry racing the original blocks on the uncommitted key until the
+original commits, then fails to insert it and replays the stored response, or inserts it and runs the
+request afresh if the original rolled back.
+"""
+
+from datetime import datetime, timedelta
+import hashlib
+import json
+
+from common.models import IdempotencyKey
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# Retries are recognized for this long after the original request
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# Upper bound for the length of client-chosen keys
+MAX_KEY_LENGTH = 255
+# Header set on replayed responses
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def fingerprint(payload) -> str:
+    """Get a digest of a request payload, to tell retries from other requests reusing a key."""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def begin(db: Session, scope: str, key: str | None, payload) -> JSONResponse | None:
+    """Reserve ``key`` for a request, or get the response to replay if the request was already handled.
+
+    Must run before the request changes anything, since a conflict rolls the transaction back.
+    Without a key there is nothing to reserve and the request always runs.
+    """
+    if key is None:
+        return None
+    digest = fingerprint(payload)
+    now = datetime.utcnow()
+    # An expired key can be reused for a new request
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope, IdempotencyKey.key == key, IdempotencyKey.expires_at <= now
+    ).delete(synchronize_session=False)
+    db.add(IdempotencyKey(scope=scope, key=key, fingerprint=digest, expires_at=now + IDEMPOTENCY_KEY_TTL))
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        return replay(db, scope, key, digest)
+    return None
+
+
+def replay(db: Session, scope: str, key: str, digest: str) -> JSONResponse:
+    """Get the stored response of the request that reserved ``key``."""
+    stored = db.query(IdempotencyKey).filter(IdempotencyKey.scope == scope, IdempotencyKey.key == key).first()
+    if stored is None or stored.response_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress",
+        )
+    if stored.fingerprint != digest:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request",
+        )
+    return JSONResponse(
+        status_code=stored.response_status,
+        content=json.loads(stored.response_body),
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def complete(db: Session, scope: str, key: str | None, status_code: int, content) -> None:
+    """Store the response of the request that reserved ``key``; it is committed along with the request."""
+    if key is None:
+        return
+    db.query(IdempotencyKey).filter(IdempotencyKey.scope == scope, IdempotencyKey.key == key).update(
+        {
+            IdempotencyKey.response_status: status_code,
+            IdempotencyKey.response_body: json.dumps(jsonable_encoder(content)),
+        },
+        synchronize_session=False,
+    )
+
+
+def prune_idempotency_keys(db: Session) -> int:
+    """Delete expired keys. Returns the number of deleted keys."""
+    deleted = (
+        db.query(IdempotencyKey)
+        .filter(IdempotencyKey.expires_at <= datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
@@ -0,0 +1,85 @@
+"""In-process notifications used to wake long-polling requests."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import contextlib
+import threading
+from typing import TypeVar
+
+T = TypeVar("T")
+
+# Long-polling requests re-check the database at least this often, so work created by
+# another API process (which cannot notify this one) is still picked up promptly.
+RECHECK_INTERVAL = 2.0
+
+
+class Notifier:
+    """Wakes asyncio waiters from any thread.
+
+    A version counter is bumped on every notification; waiters pass the version they observed
+    before checking for work, so a notification that lands between the check and the wait is
+    never lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def version(self) -> int:
+        """Number of notifications sent so far."""
+        return self._version
+
+    def notify(self) -> None:
+        """Wake every current waiter. Safe to call from worker threads."""
+        with self._lock:
+            self._version += 1
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            # The waiter's event loop may already have been closed
+            with contextlib.suppress(RuntimeError):
+                loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, version: int, timeout: float) -> None:
+        """Wait until a notification newer than ``version`` is sent or ``timeout`` expires."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self._version != version:
+                return
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+# Notified whenever tasks may have become available to workers
+task_available = Notifier()
+
+
+async def long_poll(
+    notifier: Notifier,
+    fetch: Callable[[], Awaitable[list[T]]],
+    wait: float,
+    on_idle: Callable[[], Awaitable[None]] | None = None,
+) -> list[T]:
+    """Call ``fetch`` until it returns results or ``wait`` seconds have elapsed.
+
+    ``on_idle`` is awaited before each wait, e.g. to release the database connection held by
+    the request while it is parked.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        version = notifier.version
+        results = await fetch()
+        remaining = deadline - loop.time()
+        if results or remaining <= 0:
+            return results
+        if on_idle is not None:
+            await on_idle()
+        await notifier.wait(version, min(remaining, RECHECK_INTERVAL))
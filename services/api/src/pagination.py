@@ -0,0 +1,96 @@
+"""Keyset (cursor) pagination for list endpoints."""
+
+import base64
+import binascii
+from collections.abc import Sequence
+from datetime import datetime
+import json
+
+from fastapi import HTTPException, Query, Response, status
+from sqlalchemy import DateTime, and_, func, or_
+from sqlalchemy.orm import Query as SAQuery
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import ColumnElement, UnaryExpression
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Response header carrying the cursor of the next page; absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """Query parameters of paginated list endpoints."""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of items"),
+        cursor: str | None = Query(None, description=f"Cursor of the next page, from the {NEXT_CURSOR_HEADER} header"),
+        skip: int = Query(0, ge=0, deprecated=True, description="Offset paging, slow on deep pages; use cursor"),
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.skip = skip
+
+
+def paginate(query: SAQuery, keys: Sequence[ColumnElement], page: PageParams, response: Response) -> list:
+    """Get one page of ``query`` ordered by ``keys``, continuing after ``page.cursor``.
+
+    ``keys`` are columns, optionally ``.desc()``, that together are unique (end with the primary key).
+    The cursor of the next page is set in the ``X-Next-Cursor`` response header when the page is full.
+    """
+    columns = [_split_key(key) for key in keys]
+    if page.cursor is not None:
+        values = decode_cursor(page.cursor, [column for column, _ in columns])
+        query = query.filter(_after(query, columns, values))
+
+    rows = query.order_by(None).order_by(*keys).offset(page.skip or None).limit(page.limit).all()
+    if len(rows) == page.limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(rows[-1], column.key) for column, _ in columns])
+    return rows
+
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    data = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str, columns: list[ColumnElement]) -> list:
+    """Decode a cursor into the sort key values for ``columns``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match the sort key")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) and value is not None else value
+            for column, value in zip(columns, values, strict=True)
+        ]
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        ) from e
+
+
+def _split_key(key: ColumnElement) -> tuple[ColumnElement, bool]:
+    if isinstance(key, UnaryExpression) and key.modifier is operators.desc_op:
+        return key.element, True
+    return key, False
+
+
+def _after(query: SAQuery, columns: list[tuple[ColumnElement, bool]], values: list) -> ColumnElement:
+    """Build ``(k1, k2, ...) > (v1, v2, ...)`` in the sort order, which may mix directions."""
+    sqlite = query.session.bind.dialect.name == "sqlite"
+    compared = []
+    for (column, descending), value in zip(columns, values, strict=True):
+        if sqlite and isinstance(column.type, DateTime):
+            # SQLite stores timestamps as text whose format depends on how they were written
+            compared.append((func.julianday(column), func.julianday(value), descending))
+        else:
+            compared.append((column, value, descending))
+
+    clauses = []
+    for i, (column, value, descending) in enumerate(compared):
+        equal = [previous == previous_value for previous, previous_value, _ in compared[:i]]
+        clauses.append(and_(*equal, column < value if descending else column > value))
+    return or_(*clauses)
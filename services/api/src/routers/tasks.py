@@ -1,20 +1,51 @@
 """Task router."""
 
-from datetime import datetime
-
 from common.database import get_db
 from common.models import Task, TaskStatus, User
 from common.schemas import Task as TaskSchema
-from common.schemas import TaskCreate, TaskStatusUpdate, TaskUpdate
-from fastapi import APIRouter, Depends, HTTPException, status
+from common.schemas import (
+    TaskBulkItem,
+    TaskClaim,
+    TaskCreate,
+    TaskHeartbeat,
+    TaskHeartbeatResult,
+    TaskReapResult,
+    TaskStatusBatch,
+    TaskStatusBatchResult,
+    TaskStatusUpdate,
+    TaskUpdate,
+)
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
+from src import dependencies, events, idempotency, task_queue
+from src.notifier import long_poll, task_available
+from src.pagination import PageParams, paginate
+
+# Upper bound for the ``wait`` long-polling parameter of the worker endpoints
+MAX_WAIT_SECONDS = 30
+# Upper bound for the number of tasks created by one bulk request
+MAX_BULK_TASKS = 5000
+
 router = APIRouter()
 
 
 @router.post("/", response_model=TaskSchema, status_code=status.HTTP_201_CREATED)
-def create_task(task: TaskCreate, db: Session = Depends(get_db)):
-    """Create a new task."""
+def create_task(
+    task: TaskCreate,
+    idempotency_key: str | None = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: Session = Depends(get_db),
+):
+    """Create a new task.
+
+    A request retried with the same ``Idempotency-Key`` header returns the original task instead of creating another.
+    """
+    replayed = idempotency.begin(db, "tasks.create", idempotency_key, task)
+    if replayed is not None:
+        return replayed
+
     # Verify user exists
     user = db.query(User).filter(User.id == task.user_id).first()
     if not user:
@@ -23,57 +54,134 @@ def create_task(task: TaskCreate, db: Session = Depends(get_db)):
             detail=f"User with id {task.user_id} not found",
         )
 
+    parent_statuses = dependencies.lock_parents(db, task.depends_on)
+    missing = sorted(set(task.depends_on) - set(parent_statuses))
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Dependency task with id {missing[0]} not found",
+        )
+
     db_task = Task(
         title=task.title,
         description=task.description,
         user_id=task.user_id,
-        status=TaskStatus.PENDING,
+        priority=task.priority,
+        queue=task.queue,
+        task_type=task.task_type,
+        max_attempts=task.max_attempts,
+        timeout_seconds=task.timeout_seconds,
+        run_at=task_queue.run_at_utc(task.run_at),
+        **dependencies.initial_state(task.depends_on, parent_statuses),
     )
     db.add(db_task)
+    db.flush()
+    dependencies.add_dependencies(db, [(db_task.id, task.depends_on)])
+    events.record_transition(db, db_task.id, db_task.user_id, db_task.status)
+    idempotency.complete(
+        db, "tasks.create", idempotency_key, status.HTTP_201_CREATED, TaskSchema.model_validate(db_task)
+    )
     db.commit()
     db.refresh(db_task)
+    task_available.notify()
     return db_task
 
 
 @router.post("", response_model=TaskSchema, status_code=status.HTTP_201_CREATED)
-def create_task_no_slash(task: TaskCreate, db: Session = Depends(get_db)):
+def create_task_no_slash(
+    task: TaskCreate,
+    idempotency_key: str | None = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: Session = Depends(get_db),
+):
     """Create a new task (no trailing slash)."""
-    # Verify user exists
-    user = db.query(User).filter(User.id == task.user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"User with id {task.user_id} not found",
-        )
+    return create_task(task, idempotency_key, db)
 
-    db_task = Task(
-        title=task.title,
-        description=task.description,
-        user_id=task.user_id,
-        status=TaskStatus.PENDING,
-    )
-    db.add(db_task)
+
+@router.post("/bulk", response_model=list[TaskBulkItem], status_code=status.HTTP_201_CREATED)
+def create_tasks_bulk(
+    tasks: list[TaskCreate] = Body(..., max_length=MAX_BULK_TASKS),
+    idempotency_key: str | None = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: Session = Depends(get_db),
+):
+    """Create many tasks in one transaction.
+
+    Returns one item per task, in request order, with either the new task's id or why it was rejected.
+    A request retried with the same ``Idempotency-Key`` header gets the original items back.
+    """
+    replayed = idempotency.begin(db, "tasks.bulk", idempotency_key, tasks)
+    if replayed is not None:
+        return replayed
+
+    user_ids = {task.user_id for task in tasks}
+    existing = {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(user_ids))} if user_ids else set()
+    parent_statuses = dependencies.lock_parents(db, {parent_id for task in tasks for parent_id in task.depends_on})
+
+    def rejection(task: TaskCreate) -> str | None:
+        if task.user_id not in existing:
+            return f"User with id {task.user_id} not found"
+        missing = sorted(set(task.depends_on) - set(parent_statuses))
+        if missing:
+            return f"Dependency task with id {missing[0]} not found"
+        return None
+
+    errors = [rejection(task) for task in tasks]
+    valid = [task for task, error in zip(tasks, errors, strict=True) if error is None]
+    ids = iter(task_queue.insert_tasks(db, valid, parent_statuses))
+    items = [TaskBulkItem(error=error) if error else TaskBulkItem(id=next(ids)) for error in errors]
+    idempotency.complete(db, "tasks.bulk", idempotency_key, status.HTTP_201_CREATED, items)
     db.commit()
-    db.refresh(db_task)
-    return db_task
+    if valid:
+        task_available.notify()
+
+    return items
 
 
 @router.get("/", response_model=list[TaskSchema])
-def read_tasks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all tasks."""
-    return db.query(Task).offset(skip).limit(limit).all()
+def read_tasks(response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    """Get a page of tasks."""
+    return paginate(db.query(Task), [Task.id], page, response)
 
 
 @router.get("", response_model=list[TaskSchema])
-def read_tasks_no_slash(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all tasks (no trailing slash)."""
-    return db.query(Task).offset(skip).limit(limit).all()
+def read_tasks_no_slash(response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    """Get a page of tasks (no trailing slash)."""
+    return read_tasks(response, page, db)
 
 
 @router.get("/user/{user_id}", response_model=list[TaskSchema])
-def read_user_tasks(user_id: int, db: Session = Depends(get_db)):
-    """Get tasks for a specific user."""
-    return db.query(Task).filter(Task.user_id == user_id).all()
+def read_user_tasks(user_id: int, response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    """Get a page of tasks for a specific user."""
+    return paginate(db.query(Task).filter(Task.user_id == user_id), [Task.id], page, response)
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def stream_task_events(  # noqa: PLR0913, PLR0917 - query parameters
+    user_id: int | None = None,
+    task_id: list[int] | None = Query(None, description="Only stream events for these task ids"),
+    cursor: int | None = Query(None, description="Resume after this event id"),
+    last_event_id: int | None = Header(None),
+    timeout: float = Query(
+        events.STREAM_MAX_SECONDS, gt=0, le=events.STREAM_MAX_SECONDS, description="Seconds before the stream closes"
+    ),
+    db: Session = Depends(get_db),
+):
+    """Stream task status transitions as Server-Sent Events.
+
+    Clients resume from the ``Last-Event-ID`` header (sent automatically by ``EventSource`` on reconnect)
+    or the ``cursor`` parameter; without either only new events are streamed.
+    """
+    if cursor is None:
+        cursor = last_event_id
+    if cursor is None:
+        cursor = await run_in_threadpool(events.latest_event_id, db)
+    bind = db.bind
+    await run_in_threadpool(db.close)
+
+    return StreamingResponse(
+        events.stream_events(bind, cursor, user_id, task_id, timeout),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{task_id}", response_model=TaskSchema)
@@ -88,6 +196,31 @@ def read_task(task_id: int, db: Session = Depends(get_db)):
     return db_task
 
 
+# Declared before the ``/{task_id}`` routes, which would otherwise match the path
+@router.put("/status:batch", response_model=TaskStatusBatchResult)
+def update_task_statuses(batch: TaskStatusBatch, db: Session = Depends(get_db)):
+    """Apply the status updates of many tasks in one transaction (worker operation)."""
+    if not batch.updates:
+        return TaskStatusBatchResult()
+
+    # Lock in id order so concurrent batches touching the same tasks cannot deadlock
+    locked = db.query(Task).filter(Task.id.in_(list(batch.updates))).order_by(Task.id).with_for_update()
+    tasks = {task.id: task for task in locked}
+
+    result = TaskStatusBatchResult()
+    for task_id, status_update in batch.updates.items():
+        db_task = tasks.get(task_id)
+        if db_task is None:
+            result.not_found.append(task_id)
+        elif task_queue.is_stale_update(db_task, status_update.worker_id, status_update.status):
+            result.conflicts.append(task_id)
+        else:
+            task_queue.apply_status_update(db, db_task, status_update)
+            result.updated.append(task_id)
+    db.commit()
+    return result
+
+
 @router.put("/{task_id}", response_model=TaskSchema)
 def update_task(task_id: int, task: TaskUpdate, db: Session = Depends(get_db)):
     """Update a task."""
@@ -99,9 +232,14 @@ def update_task(task_id: int, task: TaskUpdate, db: Session = Depends(get_db)):
         )
 
     update_data = task.dict(exclude_unset=True)
+    previous_status = db_task.status
     for key, value in update_data.items():
         setattr(db_task, key, value)
 
+    if db_task.status != previous_status:
+        events.record_transition(db, db_task.id, db_task.user_id, db_task.status, db_task.worker_id)
+        dependencies.status_changed(db, db_task.id, previous_status, db_task.status)
+
     db.commit()
     db.refresh(db_task)
     return db_task
@@ -117,37 +255,114 @@ def delete_task(task_id: int, db: Session = Depends(get_db)):
             detail="Task not found",
         )
 
+    if db_task.status != TaskStatus.DONE:
+        # The task will never complete, so neither can the tasks waiting for it
+        dependencies.parent_failed(db, task_id)
     db.delete(db_task)
     db.commit()
 
 
 # Worker-specific endpoints
 @router.get("/worker/pending", response_model=list[TaskSchema])
-def get_pending_tasks(db: Session = Depends(get_db)):
-    """Get all pending tasks for workers."""
-    return db.query(Task).filter(Task.status == TaskStatus.PENDING).all()
+async def get_pending_tasks(
+    response: Response,
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS, description="Seconds to wait for work if none is pending"),
+    queue: list[str] | None = Query(None, description="Only return tasks of these queues"),
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+):
+    """Get a page of pending tasks in queue order, optionally long-polling until some are available."""
+
+    async def fetch():
+        return await run_in_threadpool(
+            paginate, task_queue.pending_tasks_query(db, queue), task_queue.QUEUE_ORDER, page, response
+        )
+
+    return await long_poll(task_available, fetch, wait, on_idle=lambda: run_in_threadpool(db.close))
+
+
+@router.post("/worker/claim", response_model=list[TaskSchema])
+async def claim_tasks(
+    claim: TaskClaim,
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS, description="Seconds to wait for work if none is pending"),
+    db: Session = Depends(get_db),
+):
+    """Atomically claim a batch of pending tasks for a worker, optionally long-polling until some are available."""
+
+    async def fetch():
+        return await run_in_threadpool(
+            task_queue.claim_tasks, db, claim.worker_id, claim.batch, claim.lease_seconds, claim.queues
+        )
+
+    return await long_poll(task_available, fetch, wait, on_idle=lambda: run_in_threadpool(db.close))
+
+
+@router.post("/worker/heartbeat", response_model=TaskHeartbeatResult)
+def heartbeat(heartbeat: TaskHeartbeat, db: Session = Depends(get_db)):
+    """Extend the leases of a worker's in-flight tasks, reporting those it should stop."""
+    extended, lost, cancelled = task_queue.extend_leases(
+        db, heartbeat.worker_id, heartbeat.task_ids, heartbeat.lease_seconds
+    )
+    return TaskHeartbeatResult(extended=extended, lost=lost, cancelled=cancelled)
+
+
+@router.post("/worker/reap", response_model=TaskReapResult)
+def reap_expired_leases(db: Session = Depends(get_db)):
+    """Requeue WIP tasks whose lease expired, dead-lettering those out of attempts."""
+    requeued, dead_lettered = task_queue.reap_expired_leases(db)
+    if requeued:
+        task_available.notify()
+    events.prune_events(db)
+    idempotency.prune_idempotency_keys(db)
+    return TaskReapResult(requeued=requeued, dead_lettered=dead_lettered)
+
+
+@router.post("/{task_id}/cancel", response_model=TaskSchema)
+def cancel_task(task_id: int, db: Session = Depends(get_db)):
+    """Cancel a task that has not finished.
+
+    A worker running the task is told to stop by the answer to its next heartbeat.
+    """
+    db_task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
+    if db_task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found",
+        )
+    if db_task.status in {TaskStatus.DONE, TaskStatus.FAILED, TaskStatus.DEAD_LETTER}:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Task already finished",
+        )
+    if not task_queue.cancel_task(db, db_task):
+        # Already cancelled
+        db.rollback()
+        return db_task
+
+    db.commit()
+    db.refresh(db_task)
+    return db_task
 
 
 @router.put("/{task_id}/status", response_model=TaskSchema)
 def update_task_status(task_id: int, status_update: TaskStatusUpdate, db: Session = Depends(get_db)):
     """Update task status (worker operation)."""
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    # Lock the row so a concurrent claim or reap cannot change the owner between the check and the update
+    db_task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if db_task is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Task not found",
         )
-
-    # Update status and related fields
-    db_task.status = status_update.status
-    db_task.worker_id = status_update.worker_id
-    db_task.error_message = status_update.error_message
-
-    # Update timestamps based on status
-    if status_update.status == TaskStatus.WIP:
-        db_task.started_at = datetime.utcnow()
-    elif status_update.status in {TaskStatus.DONE, TaskStatus.FAILED}:
-        db_task.completed_at = datetime.utcnow()
+    if task_queue.is_stale_update(db_task, status_update.worker_id, status_update.status):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Task is no longer owned by this worker",
+        )
+    if not task_queue.apply_status_update(db, db_task, status_update):
+        # Retried update that was already applied
+        db.rollback()
+        return db_task
 
     db.commit()
     db.refresh(db_task)
@@ -5,33 +5,42 @@ from common.models import User
 from common.schemas import User as UserSchema
 from common.schemas import UserCreate, UserUpdate
 from common.utils import get_password_hash
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from src import idempotency
+from src.pagination import PageParams, paginate
+
 router = APIRouter()
 
 
 @router.get("/", response_model=list[UserSchema])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all users."""
-    return db.query(User).offset(skip).limit(limit).all()
+def read_users(response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    """Get a page of users."""
+    return paginate(db.query(User), [User.id], page, response)
 
 
 @router.get("", response_model=list[UserSchema])
-def read_users_no_slash(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all users (no trailing slash)."""
-    return db.query(User).offset(skip).limit(limit).all()
+def read_users_no_slash(response: Response, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    """Get a page of users (no trailing slash)."""
+    return read_users(response, page, db)
 
 
 @router.post("/", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    """Create a new user."""
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
+def create_user(
+    user: UserCreate,
+    idempotency_key: str | None = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: Session = Depends(get_db),
+):
+    """Create a new user.
+
+    A request retried with the same ``Idempotency-Key`` header returns the original user instead of failing.
+    """
+    # The password is left out of the stored fingerprint
+    replayed = idempotency.begin(db, "users.create", idempotency_key, user.model_dump(exclude={"password"}))
+    if replayed is not None:
+        return replayed
 
     db_user = User(
         username=user.username,
@@ -39,32 +48,35 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=get_password_hash(user.password),
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
-
-
-@router.post("", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
-def create_user_no_slash(user: UserCreate, db: Session = Depends(get_db)):
-    """Create a new user (no trailing slash)."""
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    try:
+        # The unique indexes on email and username catch duplicates, including concurrent ones
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        email_taken = db.query(User.id).filter(User.email == user.email).first() is not None
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered",
-        )
+            detail="Email already registered" if email_taken else "Username already taken",
+        ) from None
 
-    db_user = User(
-        username=user.username,
-        email=user.email,
-        hashed_password=get_password_hash(user.password),
+    idempotency.complete(
+        db, "users.create", idempotency_key, status.HTTP_201_CREATED, UserSchema.model_validate(db_user)
     )
-    db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
 
+@router.post("", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
+def create_user_no_slash(
+    user: UserCreate,
+    idempotency_key: str | None = Header(None, max_length=idempotency.MAX_KEY_LENGTH),
+    db: Session = Depends(get_db),
+):
+    """Create a new user (no trailing slash)."""
+    return create_user(user, idempotency_key, db)
+
+
 @router.get("/{user_id}", response_model=UserSchema)
 def read_user(user_id: int, db: Session = Depends(get_db)):
     """Get a specific user by ID."""
@@ -0,0 +1,479 @@
+"""Task queue operations used by the worker endpoints."""
+
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+import random
+import time
+
+from common.models import Task, TaskStatus, User
+from common.schemas import TaskCreate, TaskStatusUpdate
+from sqlalchemy import case, func, or_, true
+from sqlalchemy.orm import Query, Session
+
+from src import dependencies
+from src.events import prune_events, record_transition, record_transitions
+from src.idempotency import prune_idempotency_keys
+
+# Claims that are not renewed by a heartbeat within this many seconds are considered abandoned
+DEFAULT_LEASE_SECONDS = 60
+# Base and cap, in seconds, of the exponential backoff before a failed task is retried
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 3600
+# Minimum number of seconds between opportunistic reaper runs triggered by claims
+REAP_INTERVAL = 15
+
+# Rows per INSERT statement of a bulk enqueue, well below PostgreSQL's limit of 65535 bound parameters
+INSERT_CHUNK_SIZE = 1000
+
+# Order in which pending tasks are picked up; matches the ``ix_tasks_pending_priority`` index
+QUEUE_ORDER = (Task.priority.desc(), Task.created_at, Task.id)
+
+# A claim on PostgreSQL considers this many candidates per task it asks for, and tries to lock them
+# this many times, passing over the candidates concurrent claims locked first
+CLAIM_OVERSELECT = 4
+CLAIM_LOCK_ROUNDS = 3
+
+_last_reap = 0.0
+
+
+def pending_tasks_query(db: Session, queues: list[str] | None = None) -> Query:
+    """Build the query for tasks that are eligible to be picked up by a worker, most urgent first.
+
+    Scheduled tasks are not eligible before their ``run_at``, found with a range scan of the
+    ``(status, run_at)`` index, tasks waiting out a retry backoff not before their ``next_attempt_at``,
+    and tasks with dependencies not before those are done. ``queues`` restricts the tasks to those
+    named queues; by default tasks of every queue are eligible.
+    """
+    now = datetime.utcnow()
+    query = db.query(Task).filter(
+        Task.status == TaskStatus.PENDING,
+        Task.run_at <= now,
+        Task.pending_parents == 0,
+        or_(Task.next_attempt_at.is_(None), Task.next_attempt_at <= now),
+    )
+    if queues is not None:
+        query = query.filter(Task.queue.in_(queues))
+    return query.order_by(*QUEUE_ORDER)
+
+
+def run_at_utc(run_at: datetime | None) -> datetime:
+    """Convert a requested run time to the naive UTC stored in the database; None means now."""
+    if run_at is None:
+        return datetime.utcnow()
+    if run_at.tzinfo is not None:
+        return run_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return run_at
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Get the backoff before retrying a task that failed its ``attempts``-th attempt.
+
+    Doubles with every attempt up to ``RETRY_MAX_SECONDS``; the upper half is jittered so tasks that
+    failed together during an outage are not all retried at the same moment.
+    """
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def insert_tasks(db: Session, tasks: list[TaskCreate], parent_statuses: dict[int, TaskStatus]) -> list[int]:
+    """Insert tasks, their dependencies and creation events without committing; returns the ids in order.
+
+    ``parent_statuses`` holds the locked status of every task the new tasks depend on, see
+    ``dependencies.lock_parents``.
+
+    On PostgreSQL each chunk is a single multi-row ``INSERT ... RETURNING id``. Other backends
+    (SQLite) have no ``RETURNING`` here, so the rows are inserted one statement at a time, which is
+    cheap for an in-process database.
+    """
+    rows = [
+        {
+            "title": task.title,
+            "description": task.description,
+            "user_id": task.user_id,
+            "priority": task.priority,
+            "queue": task.queue,
+            "task_type": task.task_type,
+            "timeout_seconds": task.timeout_seconds,
+            "attempts": 0,
+            "max_attempts": task.max_attempts,
+            "run_at": run_at_utc(task.run_at),
+            "error_message": None,
+            "completed_at": None,
+            **dependencies.initial_state(task.depends_on, parent_statuses),
+        }
+        for task in tasks
+    ]
+
+    if db.bind.dialect.name == "postgresql":
+        table = Task.__table__
+        ids = []
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            chunk = rows[start : start + INSERT_CHUNK_SIZE]
+            # Ids are allocated, and returned, in VALUES order
+            ids.extend(task_id for (task_id,) in db.execute(table.insert().values(chunk).returning(table.c.id)))
+    else:
+        db.bulk_insert_mappings(Task, rows, return_defaults=True)
+        ids = [row["id"] for row in rows]
+
+    dependencies.add_dependencies(db, [(task_id, task.depends_on) for task_id, task in zip(ids, tasks, strict=True)])
+    record_transitions(db, [(task_id, row["user_id"], row["status"]) for task_id, row in zip(ids, rows, strict=True)])
+    return ids
+
+
+def fair_candidates(
+    db: Session, limit: int, queues: list[str] | None = None, exclude: Iterable[int] = ()
+) -> list[tuple[int, int | None]]:
+    """Pick up to ``limit`` eligible tasks as ``(task id, user id)``, sharing the queue fairly between users.
+
+    Within a priority level users take turns: every user's oldest task comes before anyone's second
+    one, so a user who enqueued a large backlog cannot starve the others. Tasks that would take a user
+    past their ``max_concurrent_tasks`` WIP tasks are skipped. Caps count WIP tasks across all queues.
+    Tasks in ``exclude`` are passed over.
+
+    On PostgreSQL each user's first ``limit`` eligible tasks are read from the ``ix_tasks_pending_user``
+    index (a lateral join over users), so only those are ranked rather than the whole queue. Other
+    backends (SQLite) rank every eligible task, which is cheap for an in-process database.
+    """
+    eligible = pending_tasks_query(db, queues).order_by(None)
+    exclude = sorted(exclude)
+    if exclude:
+        eligible = eligible.filter(Task.id.notin_(exclude))
+    if db.bind.dialect.name == "postgresql":
+        heads = (
+            eligible.filter(Task.user_id == User.id)
+            .with_entities(Task.id, Task.user_id, Task.priority, Task.created_at)
+            .order_by(*QUEUE_ORDER)
+            .limit(limit)
+            .subquery()
+            .lateral()
+        )
+        rows = db.query(*heads.c).select_from(User).join(heads, true())
+        task_id, user_id, priority, created_at = heads.c.id, heads.c.user_id, heads.c.priority, heads.c.created_at
+    else:
+        rows = eligible.with_entities(Task.id, Task.user_id, Task.priority, Task.created_at)
+        task_id, user_id, priority, created_at = Task.id, Task.user_id, Task.priority, Task.created_at
+
+    ranked = rows.add_columns(
+        # The user's n-th task at this priority is served in the n-th round
+        func.row_number().over(partition_by=(user_id, priority), order_by=(created_at, task_id)).label("turn"),
+        # How many tasks of the user would be claimed up to and including this one
+        func.row_number()
+        .over(partition_by=user_id, order_by=(priority.desc(), created_at, task_id))
+        .label("user_rank"),
+    ).subquery()
+    wip = (
+        db.query(Task.user_id, func.count().label("count"))
+        .filter(Task.status == TaskStatus.WIP)
+        .group_by(Task.user_id)
+        .subquery()
+    )
+    return (
+        db.query(ranked.c.id, ranked.c.user_id)
+        .outerjoin(User, User.id == ranked.c.user_id)
+        .outerjoin(wip, wip.c.user_id == ranked.c.user_id)
+        .filter(
+            or_(
+                User.max_concurrent_tasks.is_(None),
+                ranked.c.user_rank + func.coalesce(wip.c.count, 0) <= User.max_concurrent_tasks,
+            )
+        )
+        .order_by(ranked.c.priority.desc(), ranked.c.turn, ranked.c.created_at, ranked.c.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def lock_fair_candidates(db: Session, batch: int, queues: list[str] | None = None) -> list[Task]:
+    """Lock up to ``batch`` eligible tasks in fair order with ``FOR UPDATE SKIP LOCKED`` (PostgreSQL only).
+
+    Concurrent claims pick the same candidates, so more are picked than needed and locked in fair
+    order up to ``batch``: a candidate another claim locked first is passed over for the next one
+    instead of leaving this claim empty-handed. If too many were taken, the next candidates are picked.
+    """
+    locked: list[Task] = []
+    passed_over: set[int] = set()
+    for _ in range(CLAIM_LOCK_ROUNDS):
+        needed = batch - len(locked)
+        limit = needed * CLAIM_OVERSELECT
+        candidates = fair_candidates(db, limit, queues, exclude=passed_over)
+        if not candidates:
+            break
+        candidate_ids = [task_id for task_id, _ in candidates]
+        position = case({task_id: index for index, task_id in enumerate(candidate_ids)}, value=Task.id)
+        # Rows are locked in order until the limit is reached, skipping those other claims hold
+        locked += (
+            db.query(Task)
+            .filter(Task.id.in_(candidate_ids), Task.status == TaskStatus.PENDING)
+            .order_by(position)
+            .limit(needed)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if len(locked) >= batch or len(candidates) < limit:
+            break
+        passed_over.update(candidate_ids)
+    return locked
+
+
+def within_user_caps(db: Session, candidates: list[tuple[int, int | None]]) -> list[tuple[int, int | None]]:
+    """Drop candidates that would take their user past ``max_concurrent_tasks`` WIP tasks.
+
+    Locks the capped users' rows first, so concurrent claims for the same user are counted one after
+    the other instead of both seeing the same number of WIP tasks.
+    """
+    user_ids = {user_id for _, user_id in candidates if user_id is not None}
+    if not user_ids:
+        return candidates
+    caps = dict(
+        db.query(User)
+        .filter(User.id.in_(user_ids), User.max_concurrent_tasks.isnot(None))
+        .order_by(User.id)
+        .with_for_update()
+        .with_entities(User.id, User.max_concurrent_tasks)
+    )
+    if not caps:
+        return candidates
+
+    running = dict(
+        db.query(Task.user_id, func.count())
+        .filter(Task.user_id.in_(caps), Task.status == TaskStatus.WIP)
+        .group_by(Task.user_id)
+    )
+    kept = []
+    for task_id, user_id in candidates:
+        if user_id in caps:
+            if running.get(user_id, 0) >= caps[user_id]:
+                continue
+            running[user_id] = running.get(user_id, 0) + 1
+        kept.append((task_id, user_id))
+    return kept
+
+
+def claim_tasks(
+    db: Session,
+    worker_id: str,
+    batch: int,
+    lease_seconds: int = DEFAULT_LEASE_SECONDS,
+    queues: list[str] | None = None,
+) -> list[Task]:
+    """Atomically move up to ``batch`` pending tasks of ``queues`` (by default any) to WIP for ``worker_id``.
+
+    Candidates are picked by ``fair_candidates``. On PostgreSQL they are locked with
+    ``FOR UPDATE SKIP LOCKED`` by ``lock_fair_candidates``, so concurrent claimers never block on, or
+    receive, the same task. Other backends (SQLite) fall back to a compare-and-swap
+    ``UPDATE ... WHERE status = 'pending'`` per candidate, keeping only the rows this call actually flipped.
+    """
+    maybe_reap_expired_leases(db)
+
+    now = datetime.utcnow()
+    lease_expires_at = now + timedelta(seconds=lease_seconds)
+
+    if db.bind.dialect.name == "postgresql":
+        locked = {task.id: task for task in lock_fair_candidates(db, batch, queues)}
+        candidates = within_user_caps(db, [(task.id, task.user_id) for task in locked.values()])
+        tasks = [locked[task_id] for task_id, _ in candidates]
+        for task in tasks:
+            task.status = TaskStatus.WIP
+            task.worker_id = worker_id
+            task.started_at = now
+            task.error_message = None
+            task.lease_expires_at = lease_expires_at
+            task.attempts = (task.attempts or 0) + 1
+            record_transition(db, task.id, task.user_id, TaskStatus.WIP, worker_id)
+        claimed_ids = [task.id for task in tasks]
+    else:
+        claimed_ids = []
+        for task_id, user_id in within_user_caps(db, fair_candidates(db, batch, queues)):
+            updated = (
+                db.query(Task)
+                .filter(Task.id == task_id, Task.status == TaskStatus.PENDING)
+                .update(
+                    {
+                        Task.status: TaskStatus.WIP,
+                        Task.worker_id: worker_id,
+                        Task.started_at: now,
+                        Task.error_message: None,
+                        Task.lease_expires_at: lease_expires_at,
+                        Task.attempts: Task.attempts + 1,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            if updated:
+                claimed_ids.append(task_id)
+                record_transition(db, task_id, user_id, TaskStatus.WIP, worker_id)
+    db.commit()
+
+    if not claimed_ids:
+        return []
+    # Reload in one query; the commit expired the locked instances on PostgreSQL
+    return db.query(Task).filter(Task.id.in_(claimed_ids)).order_by(*QUEUE_ORDER).all()
+
+
+def extend_leases(
+    db: Session, worker_id: str, task_ids: list[int], lease_seconds: int = DEFAULT_LEASE_SECONDS
+) -> tuple[list[int], list[int], list[int]]:
+    """Extend the leases of WIP tasks still owned by ``worker_id``.
+
+    Returns the ids whose lease was extended, the ids the worker no longer owns, and those of the
+    latter that were cancelled.
+    """
+    if not task_ids:
+        return [], [], []
+
+    # Locked so the reported ownership still holds when the leases are written
+    current = (
+        db.query(Task.id, Task.status, Task.worker_id)
+        .filter(Task.id.in_(task_ids))
+        .order_by(Task.id)
+        .with_for_update(of=Task)
+        .all()
+    )
+    extended = sorted(task_id for task_id, status, owner in current if status == TaskStatus.WIP and owner == worker_id)
+    cancelled = sorted(task_id for task_id, status, _ in current if status == TaskStatus.CANCELLED)
+    if extended:
+        # Guarded like the reaper, in case the task was requeued and claimed by another worker since it was read
+        db.query(Task).filter(Task.id.in_(extended), Task.status == TaskStatus.WIP, Task.worker_id == worker_id).update(
+            {Task.lease_expires_at: datetime.utcnow() + timedelta(seconds=lease_seconds)},
+            synchronize_session=False,
+        )
+    db.commit()
+
+    lost = sorted(set(task_ids) - set(extended))
+    return extended, lost, cancelled
+
+
+def cancel_task(db: Session, task: Task) -> bool:
+    """Cancel a locked task that has not finished, without committing.
+
+    The task keeps its worker, which learns of the cancellation from its next heartbeat and stops it;
+    the worker's later status updates are refused. Tasks depending on it fail.
+    Returns False if the task was already cancelled.
+    """
+    if task.status == TaskStatus.CANCELLED:
+        return False
+
+    previous = task.status
+    task.status = TaskStatus.CANCELLED
+    task.completed_at = datetime.utcnow()
+    task.lease_expires_at = None
+    task.next_attempt_at = None
+    record_transition(db, task.id, task.user_id, task.status, task.worker_id)
+    dependencies.status_changed(db, task.id, previous, task.status)
+    return True
+
+
+def is_stale_update(task: Task, worker_id: str | None, status: TaskStatus) -> bool:
+    """Check whether a worker's status update targets a task it no longer owns.
+
+    This happens when a lease expired and the task was requeued or claimed by another worker
+    before the original worker reported back, or when the task was cancelled. Tasks that were never
+    claimed (no attempts) may still be updated directly.
+    """
+    if task.worker_id == worker_id and task.status == status:
+        # A retried update that was already applied
+        return False
+    if task.status == TaskStatus.CANCELLED:
+        return True
+    if task.status == TaskStatus.WIP:
+        return task.worker_id != worker_id
+    if status == TaskStatus.WIP:
+        return task.status != TaskStatus.PENDING
+    return bool(task.attempts)
+
+
+def apply_status_update(db: Session, task: Task, status_update: TaskStatusUpdate) -> bool:
+    """Apply a worker's status update to a locked task, stamping its timestamps, without committing.
+
+    A failed attempt is retried: the task goes back to the queue after a ``retry_delay`` backoff, or
+    to ``DEAD_LETTER`` once it used up its ``max_attempts``. Tasks that were never claimed fail for good.
+    Returns False if the update repeats the task's current status and owner, keeping the original timestamps.
+    """
+    if task.status == status_update.status and task.worker_id == status_update.worker_id:
+        return False
+
+    previous = task.status
+    retrying = status_update.status == TaskStatus.FAILED and previous == TaskStatus.WIP
+    task.status = status_update.status
+    task.worker_id = status_update.worker_id
+    task.error_message = status_update.error_message
+
+    now = datetime.utcnow()
+    if status_update.status == TaskStatus.WIP:
+        # Starting a task directly is an attempt just like claiming it, or it could be retried forever
+        task.attempts = (task.attempts or 0) + 1
+        task.started_at = now
+        task.lease_expires_at = now + timedelta(seconds=DEFAULT_LEASE_SECONDS)
+    elif retrying and (task.attempts or 0) < task.max_attempts:
+        task.status = TaskStatus.PENDING
+        task.worker_id = None
+        task.started_at = None
+        task.lease_expires_at = None
+        task.next_attempt_at = now + retry_delay(task.attempts or 0)
+    elif status_update.status in {TaskStatus.DONE, TaskStatus.FAILED}:
+        if retrying:
+            task.status = TaskStatus.DEAD_LETTER
+        task.completed_at = now
+        task.lease_expires_at = None
+
+    record_transition(db, task.id, task.user_id, task.status, task.worker_id)
+    dependencies.status_changed(db, task.id, previous, task.status)
+    return True
+
+
+def reap_expired_leases(db: Session) -> tuple[int, int]:
+    """Return WIP tasks whose lease expired to the queue, dead-lettering those out of attempts.
+
+    The worker most likely died, so unlike a failed attempt the task is requeued without a backoff.
+    Returns the number of requeued and dead-lettered tasks.
+    """
+    now = datetime.utcnow()
+
+    def expired(query: Query) -> Query:
+        return query.filter(
+            Task.status == TaskStatus.WIP,
+            Task.lease_expires_at.isnot(None),
+            Task.lease_expires_at < now,
+        )
+
+    dead_letter_values = {
+        Task.status: TaskStatus.DEAD_LETTER,
+        Task.completed_at: now,
+        Task.lease_expires_at: None,
+        Task.error_message: "Lease expired on the last attempt",
+    }
+    requeued_values = {
+        Task.status: TaskStatus.PENDING,
+        Task.worker_id: None,
+        Task.started_at: None,
+        Task.lease_expires_at: None,
+    }
+
+    requeued = dead_lettered = 0
+    candidates = expired(db.query(Task.id, Task.user_id, Task.attempts, Task.max_attempts)).all()
+    for task_id, user_id, attempts, max_attempts in candidates:
+        out_of_attempts = (attempts or 0) >= max_attempts
+        values = dead_letter_values if out_of_attempts else requeued_values
+        # Guarded per row so a heartbeat that renewed the lease in the meantime wins
+        if not expired(db.query(Task).filter(Task.id == task_id)).update(values, synchronize_session=False):
+            continue
+        if out_of_attempts:
+            dead_lettered += 1
+            record_transition(db, task_id, user_id, TaskStatus.DEAD_LETTER)
+            dependencies.parent_failed(db, task_id)
+        else:
+            requeued += 1
+            record_transition(db, task_id, user_id, TaskStatus.PENDING)
+    db.commit()
+    return requeued, dead_lettered
+
+
+def maybe_reap_expired_leases(db: Session) -> None:
+    """Run the reaper and prune old events and keys, at most once per ``REAP_INTERVAL`` seconds in this process."""
+    global _last_reap  # noqa: PLW0603
+    if time.monotonic() - _last_reap < REAP_INTERVAL:
+        return
+    _last_reap = time.monotonic()
+    reap_expired_leases(db)
+    prune_events(db)
+    prune_idempotency_keys(db)
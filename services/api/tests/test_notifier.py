@@ -0,0 +1,52 @@
+"""Unit tests for the long-polling notifier."""
+
+import asyncio
+import threading
+import time
+
+from src.notifier import Notifier, long_poll
+
+
+def test_notify_from_thread_wakes_long_poll():
+    """Test that a notification sent from another thread ends the wait early."""
+    notifier = Notifier()
+    available = []
+
+    async def fetch():
+        return list(available)
+
+    def produce():
+        time.sleep(0.1)
+        available.append("task")
+        notifier.notify()
+
+    threading.Thread(target=produce).start()
+    started = time.monotonic()
+    result = asyncio.run(long_poll(notifier, fetch, wait=5))
+
+    assert result == ["task"]
+    assert time.monotonic() - started < 1
+
+
+def test_long_poll_times_out():
+    """Test that long-polling gives up after the wait expires."""
+    notifier = Notifier()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return []
+
+    assert asyncio.run(long_poll(notifier, fetch, wait=0.1)) == []
+    assert len(calls) >= 2
+
+
+def test_wait_returns_immediately_after_missed_notification():
+    """Test that a notification sent before waiting is not lost."""
+    notifier = Notifier()
+    version = notifier.version
+    notifier.notify()
+
+    started = time.monotonic()
+    asyncio.run(notifier.wait(version, timeout=5))
+    assert time.monotonic() - started < 1
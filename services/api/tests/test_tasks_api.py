@@ -1,10 +1,13 @@
 """Unit tests for the tasks API endpoints."""
 
+from datetime import datetime, timedelta, timezone
+import json
 import os
 import tempfile
+import time
 
 from common.database import get_db
-from common.models import Base, User
+from common.models import Base, Task, TaskEvent, User
 from common.utils import get_password_hash
 from fastapi.testclient import TestClient
 import pytest
@@ -12,7 +15,9 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from src import events, idempotency, task_queue
 from src.main import app
+from src.routers import tasks as tasks_router
 
 
 @pytest.fixture
@@ -102,6 +107,66 @@ def test_create_task_user_not_found(client):
     assert "User with id 999 not found" in response.json()["detail"]
 
 
+def test_create_tasks_bulk(test_db, client):
+    """Test creating tasks in bulk, with per-item errors for unknown users."""
+    response = client.post(
+        "/api/tasks/bulk",
+        json=[
+            {"title": "Bulk 1", "user_id": test_db},
+            {"title": "Bulk 2", "user_id": 999},
+            {"title": "Bulk 3", "user_id": test_db, "priority": 5},
+        ],
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data[1] == {"id": None, "error": "User with id 999 not found"}
+    assert data[0]["error"] is None and data[2]["error"] is None
+
+    created = [client.get(f"/api/tasks/{data[i]['id']}").json() for i in (0, 2)]
+    assert [(task["title"], task["status"], task["priority"]) for task in created] == [
+        ("Bulk 1", "pending", 0),
+        ("Bulk 3", "pending", 5),
+    ]
+
+    db = next(app.dependency_overrides[get_db]())
+    assert db.query(TaskEvent).filter(TaskEvent.task_id.in_([task["id"] for task in created])).count() == 2
+    db.close()
+
+
+def test_create_tasks_bulk_too_many(test_db, client):
+    """Test bulk requests are capped."""
+    tasks = [{"title": "Bulk", "user_id": test_db}] * (tasks_router.MAX_BULK_TASKS + 1)
+    assert client.post("/api/tasks/bulk", json=tasks).status_code == 422
+
+
+def test_create_task_idempotent_retry(test_db, client):
+    """Test a creation retried with the same Idempotency-Key returns the original task without a duplicate."""
+    task = {"title": "Once", "user_id": test_db}
+    first = client.post("/api/tasks/", json=task, headers={"Idempotency-Key": "once"})
+    retry = client.post("/api/tasks/", json=task, headers={"Idempotency-Key": "once"})
+
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert [task["title"] for task in client.get("/api/tasks/").json()] == ["Once"]
+
+    reused = client.post(
+        "/api/tasks/", json={"title": "Other", "user_id": test_db}, headers={"Idempotency-Key": "once"}
+    )
+    assert reused.status_code == 422
+
+
+def test_create_task_idempotency_key_expires(test_db, client, monkeypatch):
+    """Test an expired Idempotency-Key creates a new task."""
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_KEY_TTL", timedelta(0))
+    task = {"title": "Again", "user_id": test_db}
+    first = client.post("/api/tasks/", json=task, headers={"Idempotency-Key": "again"})
+    second = client.post("/api/tasks/", json=task, headers={"Idempotency-Key": "again"})
+
+    assert second.status_code == 201
+    assert second.json()["id"] != first.json()["id"]
+
+
 def test_create_task_no_slash(test_db, client):
     """Test creating a task without trailing slash."""
     response = client.post(
@@ -303,3 +368,525 @@ def test_update_task_status_not_found(client):
     )
     assert response.status_code == 404
     assert response.json()["detail"] == "Task not found"
+
+
+def test_claim_tasks(test_db, client):
+    """Test claiming a batch of pending tasks for a worker."""
+    task_ids = [
+        client.post("/api/tasks/", json={"title": f"Claim Task {i}", "user_id": test_db}).json()["id"] for i in range(3)
+    ]
+
+    response = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "batch": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert [task["id"] for task in data] == task_ids[:2]
+    for task in data:
+        assert task["status"] == "wip"
+        assert task["worker_id"] == "worker-1"
+        assert task["started_at"] is not None
+
+    # Claimed tasks are no longer pending, so a second worker only gets the remainder
+    response = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2", "batch": 2})
+    assert [task["id"] for task in response.json()] == task_ids[2:]
+
+    response = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-3", "batch": 2})
+    assert response.json() == []
+
+
+def test_claim_tasks_by_priority(test_db, client):
+    """Test that higher priority tasks are claimed first, oldest first within a priority."""
+    low = client.post("/api/tasks/", json={"title": "Low", "user_id": test_db, "priority": -1}).json()["id"]
+    normal = client.post("/api/tasks/", json={"title": "Normal", "user_id": test_db}).json()["id"]
+    urgent = client.post("/api/tasks/", json={"title": "Urgent", "user_id": test_db, "priority": 10}).json()["id"]
+    also_urgent = client.post("/api/tasks/", json={"title": "Urgent 2", "user_id": test_db, "priority": 10}).json()[
+        "id"
+    ]
+
+    pending = client.get("/api/tasks/worker/pending").json()
+    assert [task["id"] for task in pending] == [urgent, also_urgent, normal, low]
+
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "batch": 3}).json()
+    assert [task["id"] for task in claimed] == [urgent, also_urgent, normal]
+    assert claimed[0]["priority"] == 10
+
+
+def test_read_tasks_paginated(test_db, client):
+    """Test paging through tasks with the next-page cursor."""
+    task_ids = [
+        client.post("/api/tasks/", json={"title": f"Task {i}", "user_id": test_db}).json()["id"] for i in range(5)
+    ]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        response = client.get("/api/tasks/", params=params)
+        seen.extend(task["id"] for task in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == task_ids
+
+    user_tasks = client.get(f"/api/tasks/user/{test_db}", params={"limit": 3})
+    assert [task["id"] for task in user_tasks.json()] == task_ids[:3]
+
+
+def test_read_tasks_page_limits(test_db, client):
+    """Test the page size is bounded and malformed cursors are rejected."""
+    assert client.get("/api/tasks/", params={"limit": 10_000}).status_code == 422
+    assert client.get("/api/tasks/", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_get_pending_tasks_paginated(test_db, client):
+    """Test paging through pending tasks keeps the queue order across pages."""
+    priorities = [0, 5, 0, 5, 0]
+    task_ids = [
+        client.post("/api/tasks/", json={"title": f"Task {i}", "user_id": test_db, "priority": priority}).json()["id"]
+        for i, priority in enumerate(priorities)
+    ]
+
+    first = client.get("/api/tasks/worker/pending", params={"limit": 3})
+    second = client.get("/api/tasks/worker/pending", params={"limit": 3, "cursor": first.headers["X-Next-Cursor"]})
+    seen = [task["id"] for task in first.json() + second.json()]
+    assert seen == [task_ids[1], task_ids[3], task_ids[0], task_ids[2], task_ids[4]]
+
+
+def test_claim_tasks_invalid_batch(test_db, client):
+    """Test claiming with an out-of-range batch size."""
+    response = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "batch": 0})
+    assert response.status_code == 422
+
+
+def expire_lease(task_id):
+    """Move a task's lease into the past using the test database session."""
+    db = next(app.dependency_overrides[get_db]())
+    db.query(Task).filter(Task.id == task_id).update({Task.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    db.close()
+
+
+def test_claim_tasks_sets_lease(test_db, client):
+    """Test that claiming a task grants a lease and counts the attempt."""
+    client.post("/api/tasks/", json={"title": "Leased Task", "user_id": test_db})
+
+    data = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "lease_seconds": 30}).json()
+    assert data[0]["lease_expires_at"] is not None
+    assert data[0]["attempts"] == 1
+
+
+def test_heartbeat(test_db, client):
+    """Test extending leases only for tasks the worker still owns."""
+    task_id = client.post("/api/tasks/", json={"title": "Heartbeat Task", "user_id": test_db}).json()["id"]
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "lease_seconds": 5}).json()[0]
+
+    response = client.post(
+        "/api/tasks/worker/heartbeat",
+        json={"worker_id": "worker-1", "task_ids": [task_id, 999], "lease_seconds": 120},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"extended": [task_id], "lost": [999], "cancelled": []}
+    assert client.get(f"/api/tasks/{task_id}").json()["lease_expires_at"] > claimed["lease_expires_at"]
+
+    response = client.post("/api/tasks/worker/heartbeat", json={"worker_id": "worker-2", "task_ids": [task_id]})
+    assert response.json() == {"extended": [], "lost": [task_id], "cancelled": []}
+
+
+def test_cancel_task(test_db, client):
+    """Test cancelling a running task stops its worker, refuses its late update and fails its dependents."""
+    task_id = client.post("/api/tasks/", json={"title": "Runaway", "user_id": test_db}).json()["id"]
+    child = client.post("/api/tasks/", json={"title": "Child", "user_id": test_db, "depends_on": [task_id]}).json()
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1"})
+
+    response = client.post(f"/api/tasks/{task_id}/cancel")
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert client.post(f"/api/tasks/{task_id}/cancel").json()["status"] == "cancelled"
+    assert client.get(f"/api/tasks/{child['id']}").json()["status"] == "failed"
+
+    response = client.post("/api/tasks/worker/heartbeat", json={"worker_id": "worker-1", "task_ids": [task_id]})
+    assert response.json() == {"extended": [], "lost": [task_id], "cancelled": [task_id]}
+
+    response = client.put(f"/api/tasks/{task_id}/status", json={"status": "done", "worker_id": "worker-1"})
+    assert response.status_code == 409
+
+
+def test_cancel_finished_task(test_db, client):
+    """Test that finished tasks cannot be cancelled."""
+    task_id = client.post("/api/tasks/", json={"title": "Finished", "user_id": test_db}).json()["id"]
+    client.put(f"/api/tasks/{task_id}/status", json={"status": "done"})
+
+    response = client.post(f"/api/tasks/{task_id}/cancel")
+    assert response.status_code == 409
+    assert client.post("/api/tasks/999/cancel").status_code == 404
+
+
+def test_reap_expired_leases(test_db, client):
+    """Test that expired WIP tasks are requeued and then dead-lettered once out of attempts."""
+    task_id = client.post("/api/tasks/", json={"title": "Abandoned Task", "user_id": test_db}).json()["id"]
+
+    for attempt in range(1, 4):
+        claimed = client.post("/api/tasks/worker/claim", json={"worker_id": f"worker-{attempt}"}).json()
+        assert [task["id"] for task in claimed] == [task_id]
+        expire_lease(task_id)
+
+        response = client.post("/api/tasks/worker/reap")
+        assert response.status_code == 200
+        if attempt < 3:
+            assert response.json() == {"requeued": 1, "dead_lettered": 0}
+            task = client.get(f"/api/tasks/{task_id}").json()
+            assert task["status"] == "pending"
+            assert task["worker_id"] is None
+        else:
+            assert response.json() == {"requeued": 0, "dead_lettered": 1}
+
+    task = client.get(f"/api/tasks/{task_id}").json()
+    assert task["status"] == "dead_letter"
+    assert "Lease expired" in task["error_message"]
+
+
+def test_failed_attempts_are_retried_with_backoff(test_db, client):
+    """Test that failed attempts are requeued after a backoff, then dead-lettered once out of attempts."""
+    task_id = client.post("/api/tasks/", json={"title": "Flaky Task", "user_id": test_db, "max_attempts": 2}).json()[
+        "id"
+    ]
+
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1"})
+    response = client.put(
+        f"/api/tasks/{task_id}/status", json={"status": "failed", "worker_id": "worker-1", "error_message": "Timeout"}
+    )
+    assert response.status_code == 200
+    task = response.json()
+    assert task["status"] == "pending"
+    assert task["worker_id"] is None
+    assert task["next_attempt_at"] > datetime.utcnow().isoformat()
+
+    # Not picked up again before the backoff elapsed
+    assert client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"}).json() == []
+    assert client.get("/api/tasks/worker/pending").json() == []
+
+    db = next(app.dependency_overrides[get_db]())
+    db.query(Task).filter(Task.id == task_id).update({Task.next_attempt_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    db.close()
+
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"}).json()
+    assert [(task["id"], task["attempts"]) for task in claimed] == [(task_id, 2)]
+    response = client.put(
+        f"/api/tasks/{task_id}/status", json={"status": "failed", "worker_id": "worker-2", "error_message": "Timeout"}
+    )
+    assert response.json()["status"] == "dead_letter"
+    assert response.json()["completed_at"] is not None
+
+
+def test_direct_wip_updates_count_attempts(test_db, client):
+    """Test that starting a task through the status endpoint uses up an attempt, so it is dead-lettered in the end."""
+    task_id = client.post("/api/tasks/", json={"title": "Flaky Task", "user_id": test_db, "max_attempts": 2}).json()[
+        "id"
+    ]
+
+    statuses = []
+    for _ in range(2):
+        task = client.put(f"/api/tasks/{task_id}/status", json={"status": "wip", "worker_id": "worker-1"}).json()
+        statuses.append((task["status"], task["attempts"]))
+        task = client.put(
+            f"/api/tasks/{task_id}/status",
+            json={"status": "failed", "worker_id": "worker-1", "error_message": "Timeout"},
+        ).json()
+        statuses.append((task["status"], task["attempts"]))
+
+    assert statuses == [("wip", 1), ("pending", 1), ("wip", 2), ("dead_letter", 2)]
+
+
+def test_claim_tasks_shares_queue_between_users(test_db, client):
+    """Test that users take turns, so a large backlog doesn't starve a user who enqueued later."""
+    other_id = client.post(
+        "/api/users/", json={"username": "other", "email": "other@example.com", "password": "password123"}
+    ).json()["id"]
+    backlog = [
+        client.post("/api/tasks/", json={"title": f"Bulk {i}", "user_id": test_db}).json()["id"] for i in range(3)
+    ]
+    other_task = client.post("/api/tasks/", json={"title": "Small", "user_id": other_id}).json()["id"]
+
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "batch": 2}).json()
+    assert sorted(task["id"] for task in claimed) == sorted([backlog[0], other_task])
+
+
+def test_claim_tasks_respects_user_caps(test_db, client):
+    """Test that a user's concurrency cap limits how many of their tasks are WIP at once."""
+    client.put(f"/api/users/{test_db}", json={"max_concurrent_tasks": 1})
+    task_ids = [
+        client.post("/api/tasks/", json={"title": f"Capped {i}", "user_id": test_db}).json()["id"] for i in range(2)
+    ]
+
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "batch": 2}).json()
+    assert [task["id"] for task in claimed] == [task_ids[0]]
+    assert client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"}).json() == []
+
+    client.put(f"/api/tasks/{task_ids[0]}/status", json={"status": "done", "worker_id": "worker-1"})
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"}).json()
+    assert [task["id"] for task in claimed] == [task_ids[1]]
+
+
+def test_claim_tasks_from_subscribed_queues(test_db, client):
+    """Test that workers only see and claim tasks of the queues they ask for."""
+    default_task = client.post("/api/tasks/", json={"title": "Default", "user_id": test_db}).json()
+    email_task = client.post("/api/tasks/", json={"title": "Email", "user_id": test_db, "queue": "emails"}).json()
+    assert default_task["queue"] == "default"
+    assert email_task["queue"] == "emails"
+
+    pending = client.get("/api/tasks/worker/pending", params={"queue": ["emails", "reports"]}).json()
+    assert [task["id"] for task in pending] == [email_task["id"]]
+
+    claim = {"worker_id": "worker-1", "batch": 2, "queues": ["emails"]}
+    claimed = client.post("/api/tasks/worker/claim", json=claim).json()
+    assert [task["id"] for task in claimed] == [email_task["id"]]
+    assert client.post("/api/tasks/worker/claim", json=claim).json() == []
+
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2", "batch": 2}).json()
+    assert [task["id"] for task in claimed] == [default_task["id"]]
+
+
+def test_dependent_tasks_wait_for_parents(test_db, client):
+    """Test that a task becomes claimable only once all the tasks it depends on are done."""
+    parents = [
+        client.post("/api/tasks/", json={"title": f"Parent {i}", "user_id": test_db}).json()["id"] for i in range(2)
+    ]
+    child = client.post("/api/tasks/", json={"title": "Child", "user_id": test_db, "depends_on": parents}).json()
+    assert child["pending_parents"] == 2
+
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "batch": 3}).json()
+    assert sorted(task["id"] for task in claimed) == parents
+
+    client.put(f"/api/tasks/{parents[0]}/status", json={"status": "done", "worker_id": "worker-1"})
+    assert client.get(f"/api/tasks/{child['id']}").json()["pending_parents"] == 1
+    assert client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"}).json() == []
+
+    # A retried update is not counted twice
+    client.put(f"/api/tasks/{parents[0]}/status", json={"status": "done", "worker_id": "worker-1"})
+    assert client.get(f"/api/tasks/{child['id']}").json()["pending_parents"] == 1
+
+    client.put(
+        "/api/tasks/status:batch", json={"updates": {str(parents[1]): {"status": "done", "worker_id": "worker-1"}}}
+    )
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"}).json()
+    assert [task["id"] for task in claimed] == [child["id"]]
+
+    # Depending on tasks that are already done doesn't block
+    ready = client.post("/api/tasks/", json={"title": "Ready", "user_id": test_db, "depends_on": parents}).json()
+    assert ready["pending_parents"] == 0
+
+
+def test_dependent_tasks_fail_with_parent(test_db, client):
+    """Test that the tasks depending, directly or not, on a failed task are failed too."""
+    parent = client.post("/api/tasks/", json={"title": "Parent", "user_id": test_db, "max_attempts": 1}).json()["id"]
+    child = client.post("/api/tasks/", json={"title": "Child", "user_id": test_db, "depends_on": [parent]}).json()["id"]
+    grandchild = client.post(
+        "/api/tasks/", json={"title": "Grandchild", "user_id": test_db, "depends_on": [child]}
+    ).json()["id"]
+
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1"})
+    response = client.put(f"/api/tasks/{parent}/status", json={"status": "failed", "worker_id": "worker-1"})
+    assert response.json()["status"] == "dead_letter"
+
+    for task_id in (child, grandchild):
+        task = client.get(f"/api/tasks/{task_id}").json()
+        assert (task["status"], task["error_message"]) == ("failed", f"Dependency {parent} failed")
+
+    late = client.post("/api/tasks/", json={"title": "Late", "user_id": test_db, "depends_on": [parent]}).json()
+    assert late["status"] == "failed"
+
+
+def test_dependencies_must_exist(test_db, client):
+    """Test that unknown dependencies are rejected."""
+    response = client.post("/api/tasks/", json={"title": "Orphan", "user_id": test_db, "depends_on": [999]})
+    assert response.status_code == 404
+    assert "Dependency task with id 999 not found" in response.json()["detail"]
+
+    parent = client.post("/api/tasks/", json={"title": "Parent", "user_id": test_db}).json()["id"]
+    response = client.post(
+        "/api/tasks/bulk",
+        json=[
+            {"title": "Child", "user_id": test_db, "depends_on": [parent]},
+            {"title": "Orphan", "user_id": test_db, "depends_on": [999]},
+        ],
+    )
+    data = response.json()
+    assert data[1] == {"id": None, "error": "Dependency task with id 999 not found"}
+    assert client.get(f"/api/tasks/{data[0]['id']}").json()["pending_parents"] == 1
+
+
+def test_scheduled_tasks_wait_until_due(test_db, client):
+    """Test that tasks with a future run_at are only picked up once due."""
+    run_at = datetime.now(timezone(timedelta(hours=2))) + timedelta(hours=1)
+    task = client.post(
+        "/api/tasks/", json={"title": "Scheduled Task", "user_id": test_db, "run_at": run_at.isoformat()}
+    ).json()
+    # Stored as naive UTC
+    assert datetime.fromisoformat(task["run_at"]) == run_at.astimezone(timezone.utc).replace(tzinfo=None)
+    immediate_id = client.post("/api/tasks/", json={"title": "Immediate Task", "user_id": test_db}).json()["id"]
+
+    assert [task["id"] for task in client.get("/api/tasks/worker/pending").json()] == [immediate_id]
+    assert [
+        task["id"] for task in client.post("/api/tasks/worker/claim", json={"worker_id": "w", "batch": 2}).json()
+    ] == [immediate_id]
+
+    db = next(app.dependency_overrides[get_db]())
+    db.query(Task).filter(Task.id == task["id"]).update({Task.run_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    db.close()
+
+    claimed = client.post("/api/tasks/worker/claim", json={"worker_id": "w"}).json()
+    assert [task["id"] for task in claimed] == [task["id"]]
+
+
+def test_retry_delay_backs_off_exponentially(monkeypatch):
+    """Test the retry backoff doubles per attempt up to the cap."""
+    monkeypatch.setattr(task_queue.random, "uniform", lambda _low, high: high)
+    delays = [task_queue.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3)]
+    assert delays == [task_queue.RETRY_BASE_SECONDS * factor for factor in (1, 2, 4)]
+    assert task_queue.retry_delay(100).total_seconds() == task_queue.RETRY_MAX_SECONDS
+
+
+def test_update_task_status_rejects_stale_worker(test_db, client):
+    """Test that a worker whose lease was lost cannot overwrite the new owner's status."""
+    task_id = client.post("/api/tasks/", json={"title": "Stolen Task", "user_id": test_db}).json()["id"]
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1"})
+    expire_lease(task_id)
+    client.post("/api/tasks/worker/reap")
+
+    # Requeued but not yet claimed again
+    response = client.put(f"/api/tasks/{task_id}/status", json={"status": "done", "worker_id": "worker-1"})
+    assert response.status_code == 409
+
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"})
+    response = client.put(f"/api/tasks/{task_id}/status", json={"status": "done", "worker_id": "worker-1"})
+    assert response.status_code == 409
+    assert client.get(f"/api/tasks/{task_id}").json()["status"] == "wip"
+
+    response = client.put(f"/api/tasks/{task_id}/status", json={"status": "done", "worker_id": "worker-2"})
+    assert response.status_code == 200
+    completed_at = response.json()["completed_at"]
+
+    # A retried update is acknowledged without being applied twice
+    response = client.put(f"/api/tasks/{task_id}/status", json={"status": "done", "worker_id": "worker-2"})
+    assert response.status_code == 200
+    assert response.json()["completed_at"] == completed_at
+
+
+def test_update_task_statuses_batch(test_db, client):
+    """Test applying the status updates of several tasks in one request."""
+    done_id, failed_id, stolen_id = (
+        client.post("/api/tasks/", json={"title": f"Batch {i}", "user_id": test_db}).json()["id"] for i in range(3)
+    )
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1", "batch": 2})
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-2"})
+
+    response = client.put(
+        "/api/tasks/status:batch",
+        json={
+            "updates": {
+                str(done_id): {"status": "done", "worker_id": "worker-1"},
+                str(failed_id): {"status": "failed", "worker_id": "worker-1", "error_message": "Boom"},
+                str(stolen_id): {"status": "done", "worker_id": "worker-1"},
+                "999": {"status": "done", "worker_id": "worker-1"},
+            }
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {"updated": [done_id, failed_id], "conflicts": [stolen_id], "not_found": [999]}
+
+    done = client.get(f"/api/tasks/{done_id}").json()
+    assert done["status"] == "done"
+    assert done["completed_at"] is not None
+    failed = client.get(f"/api/tasks/{failed_id}").json()
+    # The failed attempt is retried after a backoff
+    assert (failed["status"], failed["error_message"]) == ("pending", "Boom")
+    assert failed["next_attempt_at"] is not None
+    assert client.get(f"/api/tasks/{stolen_id}").json()["status"] == "wip"
+
+
+def test_claim_tasks_long_poll_times_out(test_db, client):
+    """Test that a long-polling claim returns an empty batch once the wait expires."""
+    started = time.monotonic()
+    response = client.post("/api/tasks/worker/claim?wait=0.2", json={"worker_id": "worker-1"})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert time.monotonic() - started >= 0.2
+
+
+def test_get_pending_tasks_long_poll_returns_available_work(test_db, client):
+    """Test that long-polling returns immediately when work is already pending."""
+    client.post("/api/tasks/", json={"title": "Ready Task", "user_id": test_db})
+
+    started = time.monotonic()
+    response = client.get("/api/tasks/worker/pending?wait=5")
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert time.monotonic() - started < 5
+
+
+def test_long_poll_wait_out_of_range(test_db, client):
+    """Test that the wait parameter is bounded."""
+    response = client.get("/api/tasks/worker/pending?wait=3600")
+    assert response.status_code == 422
+
+
+def read_events(response):
+    """Parse the data of each event in a Server-Sent Events response."""
+    return [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+
+
+def test_stream_task_events(test_db, client):
+    """Test streaming status transitions made through the API."""
+    task_id = client.post("/api/tasks/", json={"title": "Streamed Task", "user_id": test_db}).json()["id"]
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1"})
+    client.put(f"/api/tasks/{task_id}/status", json={"status": "done", "worker_id": "worker-1"})
+
+    response = client.get("/api/tasks/events", params={"cursor": 0, "task_id": task_id, "timeout": 0.2})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    data = read_events(response)
+    assert [event["status"] for event in data] == ["pending", "wip", "done"]
+    assert all(event["task_id"] == task_id for event in data)
+    assert data[1]["worker_id"] == "worker-1"
+
+
+def test_stream_task_events_resume(test_db, client):
+    """Test resuming a stream from the last event id and filtering by user."""
+    task_id = client.post("/api/tasks/", json={"title": "Resumed Task", "user_id": test_db}).json()["id"]
+    first = read_events(client.get("/api/tasks/events", params={"cursor": 0, "timeout": 0.1}))[-1]
+
+    client.put(f"/api/tasks/{task_id}", json={"status": "wip"})
+
+    response = client.get("/api/tasks/events", params={"timeout": 0.1}, headers={"Last-Event-ID": str(first["id"])})
+    assert [event["status"] for event in read_events(response)] == ["wip"]
+
+    response = client.get("/api/tasks/events", params={"cursor": 0, "user_id": test_db + 1, "timeout": 0.1})
+    assert read_events(response) == []
+
+
+def test_stream_task_events_waits_for_settle(test_db, client, monkeypatch):
+    """Test that events are held back until they settled where ids can commit out of order."""
+    monkeypatch.setattr(events, "settle_seconds", lambda _bind: 0.2)
+    task_id = client.post("/api/tasks/", json={"title": "Settled Task", "user_id": test_db}).json()["id"]
+
+    response = client.get("/api/tasks/events", params={"cursor": 0, "timeout": 0.1})
+    assert read_events(response) == []
+
+    response = client.get("/api/tasks/events", params={"cursor": 0, "timeout": 1})
+    assert [(event["task_id"], event["status"]) for event in read_events(response)] == [(task_id, "pending")]
+
+
+def test_claim_prunes_old_events(test_db, client, monkeypatch):
+    """Test that the reaper run triggered by claims prunes events past their retention."""
+    task_id = client.post("/api/tasks/", json={"title": "Pruned Task", "user_id": test_db}).json()["id"]
+    db = next(app.dependency_overrides[get_db]())
+    db.query(TaskEvent).update({TaskEvent.created_at: datetime.utcnow() - events.EVENT_RETENTION - timedelta(hours=1)})
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(task_queue, "_last_reap", 0.0)
+    client.post("/api/tasks/worker/claim", json={"worker_id": "worker-1"})
+
+    data = read_events(client.get("/api/tasks/events", params={"cursor": 0, "task_id": task_id, "timeout": 0.1}))
+    assert [event["status"] for event in data] == ["wip"]
@@ -102,6 +102,28 @@ def test_create_user_duplicate_email(test_db, client):
     assert response.json()["detail"] == "Email already registered"
 
 
+def test_create_user_duplicate_username(test_db, client):
+    """Test creating a user with a username that already exists."""
+    response = client.post(
+        "/api/users/",
+        json={"username": "testuser", "email": "other@example.com", "password": "password123"},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already taken"
+
+
+def test_create_user_idempotent_retry(test_db, client):
+    """Test a creation retried with the same Idempotency-Key returns the original user."""
+    user = {"username": "newuser", "email": "new@example.com", "password": "password123"}
+    headers = {"Idempotency-Key": "create-newuser"}
+    first = client.post("/api/users/", json=user, headers=headers)
+    retry = client.post("/api/users/", json=user, headers=headers)
+
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
 def test_read_users(test_db, client):
     """Test getting all users."""
     response = client.get("/api/users/")
@@ -112,6 +134,19 @@ def test_read_users(test_db, client):
     assert data[0]["email"] == "test@example.com"
 
 
+def test_read_users_paginated(test_db, client):
+    """Test paging through users with the next-page cursor."""
+    for i in range(2):
+        client.post("/api/users/", json={"username": f"user{i}", "email": f"user{i}@example.com", "password": "pw"})
+
+    first = client.get("/api/users/", params={"limit": 2})
+    assert [user["username"] for user in first.json()] == ["testuser", "user0"]
+
+    second = client.get("/api/users/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [user["username"] for user in second.json()] == ["user1"]
+    assert "X-Next-Cursor" not in second.headers
+
+
 def test_read_user(test_db, client):
     """Test getting a specific user."""
     # First get all users to find the ID
@@ -1,12 +1,41 @@
 """Main worker application."""
 
 import argparse
+import asyncio
+import bisect
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import contextlib
+from dataclasses import dataclass, field
+import fcntl
+import hashlib
+import inspect
+import json
 import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
+from pathlib import Path
+import random
+import resource
+import signal
+import threading
 import time
 import uuid
 
-from common.models import TaskStatus
-from common.schemas import Task, TaskStatusUpdate
+from common.client import APIClient, APIError, AsyncAPIClient, backoff_delay
+from common.models import DEFAULT_TASK_TYPE, TaskStatus
+from common.schemas import (
+    Task,
+    TaskClaim,
+    TaskHeartbeat,
+    TaskHeartbeatResult,
+    TaskStatusBatch,
+    TaskStatusBatchResult,
+    TaskStatusUpdate,
+)
+import httpx
 import requests
 
 # Configure logging
@@ -19,8 +48,33 @@ logger = logging.getLogger(__name__)
 # Worker configuration
 API_BASE_URL = "http://localhost:8000/api"
 WORKER_ID = f"worker-{uuid.uuid4().hex[:8]}"
-POLL_INTERVAL = 10  # seconds
+POLL_INTERVAL = 10  # seconds; also how long the API holds an idle claim request open
+POLL_JITTER = 0.5  # fraction of POLL_INTERVAL each long-poll wait is randomly shortened by, at most
+IDLE_BACKOFF_BASE = 1  # seconds; upper bound of the jittered delay after a failed claim, doubling after each one
+IDLE_BACKOFF_CAP = 60  # seconds; upper bound of the jittered delay between failed claims
+REQUEST_TIMEOUT = 10  # seconds, on top of any server-side long-poll wait
+CLAIM_BATCH_SIZE = 1  # tasks claimed per round trip
+MAX_CLAIM_BATCH = 100  # tasks the API hands out per claim at most
+LEASE_SECONDS = 60  # lease requested for claimed tasks
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 3  # seconds between lease renewals
 AUTO_SHUTDOWN_DELAY = 5  # seconds to wait before auto-shutdown
+STATUS_BATCH_WINDOW = 0.05  # seconds status updates are held to be sent together with others
+STATUS_BATCH_SIZE = 100  # status updates sent per request at most
+JOURNAL_REPLAY_INTERVAL = 5  # seconds between attempts to deliver journaled status updates
+CIRCUIT_FAILURE_THRESHOLD = 5  # consecutive failed or slow API calls that open the circuit breaker
+CIRCUIT_SLOW_CALL_SECONDS = 5  # seconds an API call may take (beyond any long-poll wait) before it counts as failed
+CIRCUIT_OPEN_SECONDS = 5  # seconds the circuit first stays open before a probe, doubling while probes fail
+CIRCUIT_MAX_OPEN_SECONDS = 120  # seconds the circuit stays open at most before a probe
+DEFAULT_TASK_TIMEOUT = 600  # seconds a task may run unless it sets its own timeout_seconds
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 300, 900, 3600)  # upper bounds, in seconds, of the task duration histogram
+STOP_POLL_INTERVAL = 0.1  # seconds between checks whether a handler in a child process or on its own loop must stop
+MAX_TASKS_PER_CHILD = 1000  # tasks a handler process runs before it is replaced
+MAX_CHILD_RSS_MB = 1024  # peak memory of a handler process, in MB, past which it is replaced
+CHILD_SHUTDOWN_TIMEOUT = 5  # seconds idle handler processes get to exit before they are killed
+DIGEST_ITERATIONS = 2_000_000  # key stretching rounds of the example CPU-bound handler
+
+# Shared connection-pooled API client
+api = APIClient(API_BASE_URL, timeout=(REQUEST_TIMEOUT, REQUEST_TIMEOUT))
 
 
 def parse_arguments():
@@ -31,73 +85,1148 @@ def parse_arguments():
         action="store_true",
         help="Auto-shutdown after completing at least one task and waiting 5 seconds with no pending tasks",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Maximum number of tasks processed at the same time (default: 1)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        help="Claimed tasks kept waiting for a free slot, so slots don't wait on a claim round trip (default: 0)",
+    )
+    parser.add_argument(
+        "--executor",
+        "--mode",
+        choices=["thread", "asyncio", "process"],
+        default="thread",
+        help="Run tasks on a thread pool, on an asyncio event loop, or in a pool of processes (default: thread)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count(),
+        help="Handler processes in process mode, which also bounds the tasks running at once (default: one per core)",
+    )
+    parser.add_argument(
+        "--max-tasks-per-child",
+        type=int,
+        default=MAX_TASKS_PER_CHILD,
+        help=f"Tasks a handler process runs before it is replaced (default: {MAX_TASKS_PER_CHILD})",
+    )
+    parser.add_argument(
+        "--max-child-rss",
+        type=float,
+        default=MAX_CHILD_RSS_MB,
+        help=f"Peak memory in MB past which a handler process is replaced (default: {MAX_CHILD_RSS_MB})",
+    )
+    parser.add_argument(
+        "--task-timeout",
+        type=float,
+        default=DEFAULT_TASK_TIMEOUT,
+        help=f"Seconds a task may run unless it sets its own timeout (default: {DEFAULT_TASK_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--status-journal",
+        metavar="PATH",
+        default=None,
+        help="File keeping status updates the API could not be reached for until they are delivered (default: none)",
+    )
+    parser.add_argument(
+        "--queues",
+        type=lambda value: [name.strip() for name in value.split(",") if name.strip()],
+        default=None,
+        help="Comma-separated queues to take tasks from (default: every queue)",
+    )
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.prefetch < 0:
+        parser.error("--prefetch must not be negative")
+    if args.processes < 1 or args.max_tasks_per_child < 1:
+        parser.error("--processes and --max-tasks-per-child must be at least 1")
+    if args.task_timeout <= 0:
+        parser.error("--task-timeout must be positive")
+    if args.queues == []:
+        parser.error("--queues must name at least one queue")
+    return args
+
+
+def is_unavailable(error: Exception) -> bool:
+    """Check whether a request failed because the API could not be reached or was unavailable, not rejected."""
+    return not isinstance(error, APIError) or error.status_code >= 500
 
 
 def update_task_status(task_id: int, status: TaskStatus, error_message: str = None) -> bool:
-    """Update task status via API."""
+    """Update task status via API.
+
+    If the API can't be reached, the update is journaled for later delivery (if there is a journal).
+    """
+    # Use the shared Pydantic schema for status updates
+    status_update = TaskStatusUpdate(status=status, worker_id=WORKER_ID, error_message=error_message)
     try:
-        url = f"{API_BASE_URL}/tasks/{task_id}/status"
+        with breaker.guard():
+            api.update_task_status(task_id, status_update)
+        logger.info(f"Updated task {task_id} status to {status}")
+        return True
+    except APIError as e:
+        if e.status_code == 409:
+            logger.warning(f"Task {task_id} is no longer owned by this worker, dropping status {status}")
+        else:
+            logger.error(f"Failed to update task {task_id} status: {e.status_code}")
+        return is_unavailable(e) and status_journal.record({task_id: status_update})
+    except requests.RequestException as e:
+        logger.error(f"Error updating task {task_id} status: {e}")
+        return status_journal.record({task_id: status_update})
 
-        # Use the shared Pydantic schema for status updates
-        status_update = TaskStatusUpdate(status=status, worker_id=WORKER_ID, error_message=error_message)
 
-        response = requests.put(url, json=status_update.model_dump())
-        if response.status_code == 200:
-            logger.info(f"Updated task {task_id} status to {status}")
-            return True
-        logger.error(f"Failed to update task {task_id} status: {response.status_code}")
-        return False
-    except requests.RequestException as e:
+async def update_task_status_async(
+    client: AsyncAPIClient, task_id: int, status: TaskStatus, error_message: str = None
+) -> bool:
+    """Update task status via API, on the event loop, journaling it like ``update_task_status``."""
+    status_update = TaskStatusUpdate(status=status, worker_id=WORKER_ID, error_message=error_message)
+    try:
+        with breaker.guard():
+            await client.update_task_status(task_id, status_update)
+        logger.info(f"Updated task {task_id} status to {status}")
+        return True
+    except APIError as e:
+        if e.status_code == 409:
+            logger.warning(f"Task {task_id} is no longer owned by this worker, dropping status {status}")
+        else:
+            logger.error(f"Failed to update task {task_id} status: {e.status_code}")
+        return is_unavailable(e) and await asyncio.to_thread(status_journal.record, {task_id: status_update})
+    except (httpx.HTTPError, CircuitOpenError) as e:
         logger.error(f"Error updating task {task_id} status: {e}")
-        return False
+        return await asyncio.to_thread(status_journal.record, {task_id: status_update})
+
+
+def update_task_statuses(updates: dict[int, TaskStatusUpdate]) -> TaskStatusBatchResult | None:
+    """Update the status of many tasks in one request via API.
+
+    If the API can't be reached, the updates are journaled for later delivery (if there is a journal)
+    and reported as updated.
+    """
+    try:
+        with breaker.guard():
+            result = api.update_task_statuses(TaskStatusBatch(updates=updates))
+        for task_id in result.updated:
+            logger.info(f"Updated task {task_id} status to {updates[task_id].status}")
+        for task_id in result.conflicts:
+            logger.warning(
+                f"Task {task_id} is no longer owned by this worker, dropping status {updates[task_id].status}"
+            )
+        for task_id in result.not_found:
+            logger.error(f"Failed to update task {task_id} status: not found")
+        return result
+    except APIError as e:
+        logger.error(f"Failed to update task statuses: {e.status_code}")
+        error = e
+    except requests.RequestException as e:
+        logger.error(f"Error updating task statuses: {e}")
+        error = e
+    if is_unavailable(error) and status_journal.record(updates):
+        return TaskStatusBatchResult(updated=list(updates))
+    return None
+
 
+class StatusJournal:
+    """Durable write-ahead journal of the status updates the API could not be reached for.
+
+    Updates are appended to a file as JSON lines, with one fsync per batch, and a background thread
+    delivers them in journal order once the API answers again, stopping at the first that still can't
+    be sent. Updates are kept once per task and status. Deliveries are appended as acknowledgements,
+    and the file is emptied once everything in it was delivered. The file is locked while open, so
+    workers can't share it. Without a path nothing is journaled.
+    """
+
+    def __init__(self, path: str | None = None, interval: float = JOURNAL_REPLAY_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._pending: dict[tuple[int, TaskStatus], TaskStatusUpdate] = {}  # In journal order
+        self._file = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def record(self, updates: dict[int, TaskStatusUpdate]) -> bool:
+        """Journal status updates for later delivery. Returns whether they were journaled."""
+        with self._lock:
+            if self._file is None:
+                return False
+            entries = []
+            for task_id, status_update in updates.items():
+                key = (task_id, status_update.status)
+                if key not in self._pending:
+                    self._pending[key] = status_update
+                    entries.append({"task_id": task_id, **status_update.model_dump(mode="json")})
+            self._append(entries)
+        logger.warning(f"Journaled the status of tasks {sorted(updates)} until the API can be reached")
+        return True
+
+    def pending(self) -> list[tuple[int, TaskStatusUpdate]]:
+        """Get the journaled updates that were not delivered yet, in journal order."""
+        with self._lock:
+            return [(task_id, status_update) for (task_id, _), status_update in self._pending.items()]
+
+    def replay(self) -> int:
+        """Deliver journaled updates in order until one can't be sent. Returns the number left undelivered."""
+        for task_id, status_update in self.pending():
+            try:
+                with breaker.guard():
+                    api.update_task_status(task_id, status_update)
+                logger.info(f"Delivered journaled status {status_update.status} of task {task_id}")
+            except requests.RequestException as e:
+                if is_unavailable(e):
+                    break
+                # Typically the lease expired during the outage and the task went to another worker
+                logger.warning(f"Dropping journaled status {status_update.status} of task {task_id}: {e}")
+            with self._lock:
+                del self._pending[task_id, status_update.status]
+                self._append([{"task_id": task_id, "status": status_update.status, "delivered": True}])
+                if not self._pending:
+                    self._file.truncate(0)
+        with self._lock:
+            return len(self._pending)
+
+    def start(self) -> None:
+        """Open and lock the journal, load the updates it holds and start delivering them."""
+        if self.path is None:
+            return
+        self._file = Path(self.path).open("a+", encoding="utf-8")  # noqa: SIM115 - kept open until stop()
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            raise RuntimeError(f"Status journal {self.path} is used by another worker") from None
+        self._load()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="status-journal", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the delivery thread after a last attempt, keeping what is still undelivered for the next start."""
+        self._stop.set()
+        if self._thread is None:
+            return
+        self._thread.join()
+        self._thread = None
+        undelivered = self.replay()
+        if undelivered:
+            logger.warning(f"{undelivered} status updates remain in {self.path} until the next start")
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def _load(self) -> None:
+        self._file.seek(0)
+        content = self._file.read()
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The tail of a write cut short by a crash; it was never acknowledged to anyone
+                logger.warning(f"Skipping a torn entry in status journal {self.path}")
+                continue
+            key = (entry["task_id"], TaskStatus(entry["status"]))
+            if entry.get("delivered"):
+                self._pending.pop(key, None)
+            else:
+                self._pending.setdefault(key, TaskStatusUpdate.model_validate(entry))
+        if content and not content.endswith("\n"):
+            # Start the next entry on a line of its own
+            self._append_raw("\n")
+        if self._pending:
+            logger.info(f"Loaded {len(self._pending)} undelivered status updates from {self.path}")
+
+    def _append(self, entries: list[dict]) -> None:
+        if entries:
+            self._append_raw("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    def _append_raw(self, data: str) -> None:
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self.pending():
+                self.replay()
+
+
+status_journal = StatusJournal()
+
+
+class StatusBatcher:
+    """Background thread that coalesces the status updates of tasks finishing close together.
+
+    Updates are held for up to ``window`` seconds so they can be sent in a single batch request;
+    a lone update goes through the single-task endpoint instead.
+    """
+
+    def __init__(self, window: float = STATUS_BATCH_WINDOW, max_batch: int = STATUS_BATCH_SIZE):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[int, tuple[TaskStatusUpdate, Future]] = {}
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def update(self, task_id: int, status: TaskStatus, error_message: str = None) -> bool:
+        """Update a task status, blocking until the batch it is sent in was answered.
+
+        Falls back to an immediate single update when the batcher is not running.
+        """
+        with self._condition:
+            if self._thread is None:
+                future = None
+            else:
+                status_update = TaskStatusUpdate(status=status, worker_id=WORKER_ID, error_message=error_message)
+                future = Future()
+                self._pending[task_id] = (status_update, future)
+                self._condition.notify()
+        if future is None:
+            return update_task_status(task_id, status, error_message)
+        return future.result()
+
+    def start(self) -> None:
+        """Start the flushing thread."""
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="status-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Send the pending updates and stop the flushing thread."""
+        with self._condition:
+            # Later updates are sent directly; the thread drains what is already pending before exiting
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending:
+                    return
+                # Give tasks finishing at about the same time a chance to join the batch
+                self._condition.wait_for(
+                    lambda: len(self._pending) >= self.max_batch or self._stopping, timeout=self.window
+                )
+                batch = dict(list(self._pending.items())[: self.max_batch])
+                for task_id in batch:
+                    del self._pending[task_id]
+            self._flush(batch)
+
+    def _flush(self, batch: dict[int, tuple[TaskStatusUpdate, Future]]) -> None:
+        if len(batch) == 1:
+            [(task_id, (status_update, future))] = batch.items()
+            future.set_result(update_task_status(task_id, status_update.status, status_update.error_message))
+            return
+
+        result = update_task_statuses({task_id: status_update for task_id, (status_update, _) in batch.items()})
+        updated = set(result.updated) if result is not None else set()
+        for task_id, (_, future) in batch.items():
+            future.set_result(task_id in updated)
+
+
+status_batcher = StatusBatcher()
+
+
+def send_heartbeat(task_ids: list[int]) -> TaskHeartbeatResult | None:
+    """Extend the leases of in-flight tasks via API."""
+    try:
+        heartbeat = TaskHeartbeat(worker_id=WORKER_ID, task_ids=task_ids, lease_seconds=LEASE_SECONDS)
+        with breaker.guard():
+            result = api.heartbeat(heartbeat)
+        return log_heartbeat_result(result)
+    except APIError as e:
+        logger.error(f"Failed to send heartbeat: {e.status_code}")
+        return None
+    except requests.RequestException as e:
+        logger.error(f"Error sending heartbeat: {e}")
+        return None
+
+
+async def send_heartbeat_async(client: AsyncAPIClient, task_ids: list[int]) -> TaskHeartbeatResult | None:
+    """Extend the leases of in-flight tasks via API, on the event loop."""
+    try:
+        heartbeat = TaskHeartbeat(worker_id=WORKER_ID, task_ids=task_ids, lease_seconds=LEASE_SECONDS)
+        with breaker.guard():
+            result = await client.heartbeat(heartbeat)
+        return log_heartbeat_result(result)
+    except APIError as e:
+        logger.error(f"Failed to send heartbeat: {e.status_code}")
+        return None
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        logger.error(f"Error sending heartbeat: {e}")
+        return None
+
+
+def log_heartbeat_result(result: TaskHeartbeatResult) -> TaskHeartbeatResult:
+    """Log the tasks a heartbeat reported as cancelled or lost."""
+    if result.cancelled:
+        logger.warning(f"Tasks {result.cancelled} were cancelled")
+    lost = sorted(set(result.lost) - set(result.cancelled))
+    if lost:
+        logger.warning(f"Lost leases for tasks {lost}")
+    return result
+
+
+class LeaseKeeper:
+    """Background thread that keeps the leases of in-flight tasks alive.
+
+    The heartbeat answers also tell which tasks were cancelled, so they are stopped within one interval.
+    """
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self._lost: dict[int, threading.Event] = {}
+        self._cancelled: set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, task_id: int) -> threading.Event:
+        """Start renewing the lease of a task.
+
+        Returns an event that is set if the API reports the lease as lost to another worker
+        or the task as cancelled.
+        """
+        with self._lock:
+            return self._lost.setdefault(task_id, threading.Event())
+
+    def discard(self, task_id: int) -> None:
+        """Stop renewing the lease of a task."""
+        with self._lock:
+            self._lost.pop(task_id, None)
+            self._cancelled.discard(task_id)
+
+    def is_cancelled(self, task_id: int) -> bool:
+        """Check whether the lease of a task was lost because it was cancelled."""
+        with self._lock:
+            return task_id in self._cancelled
+
+    def start(self) -> None:
+        """Start the heartbeat thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the heartbeat thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                task_ids = sorted(self._lost)
+            if not task_ids:
+                continue
+            result = send_heartbeat(task_ids)
+            if result is None:
+                continue
+            with self._lock:
+                for task_id in result.lost:
+                    if task_id in self._lost:
+                        if task_id in result.cancelled:
+                            self._cancelled.add(task_id)
+                        self._lost[task_id].set()
+
+
+lease_keeper = LeaseKeeper()
+
+
+class AsyncLeaseKeeper:
+    """Keeps the leases of in-flight tasks alive from a task on the event loop, like ``LeaseKeeper``."""
+
+    def __init__(self, client: AsyncAPIClient, interval: float = HEARTBEAT_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self._lost: dict[int, asyncio.Event] = {}
+        self._cancelled: set[int] = set()
+
+    def add(self, task_id: int) -> asyncio.Event:
+        """Start renewing the lease of a task.
+
+        Returns an event that is set if the API reports the lease as lost to another worker
+        or the task as cancelled.
+        """
+        return self._lost.setdefault(task_id, asyncio.Event())
+
+    def discard(self, task_id: int) -> None:
+        """Stop renewing the lease of a task."""
+        self._lost.pop(task_id, None)
+        self._cancelled.discard(task_id)
+
+    def is_cancelled(self, task_id: int) -> bool:
+        """Check whether the lease of a task was lost because it was cancelled."""
+        return task_id in self._cancelled
+
+    async def run(self) -> None:
+        """Send heartbeats until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._lost:
+                continue
+            result = await send_heartbeat_async(self.client, sorted(self._lost))
+            if result is None:
+                continue
+            for task_id in result.lost:
+                if task_id in self._lost:
+                    if task_id in result.cancelled:
+                        self._cancelled.add(task_id)
+                    self._lost[task_id].set()
+
+
+class WorkerMetrics:
+    """Thread-safe counters of task outcomes and a histogram of task durations, logged on shutdown.
+
+    Deadline violations are counted under ``deadline_exceeded``; together with the durations of the
+    tasks that finished in time they show how far timeouts are from the actual run times.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counts: Counter[str] = Counter()
+        self._gauges: dict[str, object] = {}
+        self._durations = [0] * (len(buckets) + 1)  # The last bucket counts durations past every bound
+        self._lock = threading.Lock()
+
+    def increment(self, name: str) -> None:
+        """Count one occurrence of an outcome."""
+        with self._lock:
+            self._counts[name] += 1
+
+    def set_gauge(self, name: str, value) -> None:
+        """Record the current value of a state, e.g. of the circuit breaker."""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe_duration(self, seconds: float) -> None:
+        """Record how long a task ran."""
+        with self._lock:
+            self._durations[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def snapshot(self) -> dict:
+        """Get the current counts and the duration histogram, keyed by bucket upper bound."""
+        with self._lock:
+            bounds = [f"le_{bound}" for bound in self.buckets] + ["inf"]
+            return {
+                **self._counts,
+                **self._gauges,
+                "durations": dict(zip(bounds, self._durations, strict=True)),
+            }
+
+
+metrics = WorkerMetrics()
+
+
+class CircuitOpenError(requests.RequestException):
+    """An API call was not made because the circuit breaker is open."""
+
+    def __init__(self):
+        super().__init__("API circuit breaker is open")
+
+
+class CircuitBreaker:
+    """Stops calling the API while it is failing, so a recovering API isn't buried under the fleet's retries.
+
+    The circuit opens after ``failure_threshold`` consecutive calls failed (the API could not be reached or
+    answered 5xx) or took longer than ``slow_call_seconds``. While open, calls fail fast with
+    CircuitOpenError. After a jittered cool-down, which doubles up to ``max_open_seconds`` while probes
+    keep failing, one call is let through as a probe (half-open): if it succeeds the circuit closes,
+    otherwise it opens again. Transitions are counted in the worker metrics, along with the state.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+        open_seconds: float = CIRCUIT_OPEN_SECONDS,
+        max_open_seconds: float = CIRCUIT_MAX_OPEN_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = self.CLOSED
+        self._failures = 0  # Consecutive failed calls while closed
+        self._openings = 0  # Consecutive openings without a successful probe
+        self._probe_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        metrics.set_gauge("circuit_state", self.state)
+
+    def retry_in(self) -> float:
+        """Get how long until the circuit lets a call through again, 0 if it does now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0
+            return max(self._probe_at - time.monotonic(), 0)
+
+    @contextlib.contextmanager
+    def guard(self, wait: float = 0):
+        """Guard an API call, raising CircuitOpenError instead of making it while the circuit is open.
+
+        ``wait`` is how long the API may hold the call open by design, e.g. a long-poll claim.
+        """
+        probe = self._admit()
+        started = time.monotonic()
+        succeeded = None  # Calls interrupted before an answer don't tell anything about the API
+        try:
+            yield
+        except (requests.RequestException, httpx.HTTPError) as e:
+            succeeded = not is_unavailable(e)
+            raise
+        else:
+            succeeded = time.monotonic() - started - wait <= self.slow_call_seconds
+        finally:
+            self._record(probe, succeeded)
+
+    def _admit(self) -> bool:
+        """Let a call through or raise CircuitOpenError. Returns whether the call is the half-open probe."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN and time.monotonic() >= self._probe_at:
+                logger.info("API circuit breaker is half-open, probing the API")
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+        metrics.increment("circuit_rejected")
+        raise CircuitOpenError
+
+    def _record(self, probe: bool, succeeded: bool | None) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+            if succeeded is None:
+                return
+            if succeeded:
+                self._failures = 0
+                if probe:
+                    logger.info("API probe succeeded, closing the circuit breaker")
+                    self._openings = 0
+                    self._transition(self.CLOSED)
+                return
+            self._failures += 1
+            if probe or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._open()
+
+    def _open(self) -> None:
+        # Jittered so that a fleet of workers doesn't probe the API all at once
+        cool_down = min(self.max_open_seconds, self.open_seconds * 2 ** min(self._openings, 32))
+        cool_down *= random.uniform(0.5, 1)
+        self._openings += 1
+        self._probe_at = time.monotonic() + cool_down
+        logger.warning(f"API calls are failing, opening the circuit breaker for {cool_down:.1f} seconds")
+        metrics.increment("circuit_opened")
+        self._transition(self.OPEN)
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        metrics.set_gauge("circuit_state", state)
+
+
+breaker = CircuitBreaker()
+
+
+@dataclass
+class TaskHandler:
+    """How the tasks of one type are run.
+
+    I/O-bound handlers are called with the task and an event that is set when they must stop, and run on
+    the worker's own threads. Coroutine handlers are called with the task only and are cancelled when they
+    must stop; the asyncio runtime runs them on its event loop, the others on a loop of their own.
+    CPU-bound handlers are called with the task only and run in a process pool, so they must be
+    module-level functions; when told to stop, the worker stops waiting for them.
+    """
+
+    func: Callable
+    cpu_bound: bool = False
+    concurrency: int | None = None  # Tasks of this type running at once; None is only bounded by --concurrency
+    slots: contextlib.AbstractContextManager = field(init=False, repr=False)
+    async_slots: contextlib.AbstractAsyncContextManager = field(init=False, repr=False)  # Same, on the event loop
+
+    def __post_init__(self):
+        if self.concurrency is None:
+            self.slots = contextlib.nullcontext()
+            self.async_slots = contextlib.nullcontext()
+        else:
+            self.slots = threading.BoundedSemaphore(self.concurrency)
+            self.async_slots = asyncio.BoundedSemaphore(self.concurrency)
+
+    @property
+    def is_coroutine(self) -> bool:
+        """Whether the handler is a coroutine function."""
+        return inspect.iscoroutinefunction(self.func)
+
+
+# Handlers by task type
+handlers: dict[str, TaskHandler] = {}
+
+
+def register_handler(
+    task_type: str, *, cpu_bound: bool = False, concurrency: int | None = None
+) -> Callable[[Callable], Callable]:
+    """Register the decorated function as the handler of ``task_type`` tasks."""
+
+    def decorator(func: Callable) -> Callable:
+        handlers[task_type] = TaskHandler(func, cpu_bound, concurrency)
+        return func
+
+    return decorator
+
+
+@register_handler(DEFAULT_TASK_TYPE)
+def simulate_work(_task: Task, stop: threading.Event) -> None:
+    """Simulate I/O-bound work (await 10 seconds), returning early once told to stop."""
+    stop.wait(10)
+
+
+@register_handler("digest", cpu_bound=True, concurrency=os.cpu_count())
+def digest(task: Task) -> str:
+    """Simulate CPU-bound work by stretching a digest of the task's title and description."""
+    salt = (task.description or "").encode()
+    return hashlib.pbkdf2_hmac("sha256", task.title.encode(), salt, DIGEST_ITERATIONS).hex()
+
+
+def peak_rss_mb() -> float:
+    """Get the peak memory of this process, in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(conn: Connection) -> None:
+    """Run the tasks sent by the parent through ``conn`` until it sends None or goes away.
+
+    Answers each task with its error message (None on success) and the process's peak memory.
+    """
+    # Interrupts are handled by the parent, which lets running tasks finish before shutting the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        try:
+            handler = handlers[task.task_type]
+            if handler.is_coroutine:
+                asyncio.run(handler.func(task))
+            elif handler.cpu_bound:
+                handler.func(task)
+            else:
+                # The parent kills the process instead of asking the handler to stop
+                handler.func(task, threading.Event())
+            error = None
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        conn.send((error, peak_rss_mb()))
 
-def process_task(task: Task) -> bool:
-    """Process a single task."""
+
+@dataclass
+class ChildProcess:
+    """A handler process and the parent's end of its pipe."""
+
+    process: multiprocessing.Process
+    conn: Connection
+    tasks: int = 0
+
+
+class ProcessPool:
+    """Supervised pool of processes running handlers, fed and watched by the parent.
+
+    Each task is sent to an idle child over the child's own pipe, so a child whose task must stop is
+    killed and replaced without disturbing the others. Children are started on demand, and replaced
+    after ``max_tasks`` tasks or once their peak memory passes ``max_rss_mb``. With ``all_handlers``
+    every handler runs in the pool, otherwise only CPU-bound ones.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_tasks: int = MAX_TASKS_PER_CHILD,
+        max_rss_mb: float = MAX_CHILD_RSS_MB,
+        all_handlers: bool = False,
+    ):
+        self.size = size
+        self.max_tasks = max_tasks
+        self.max_rss_mb = max_rss_mb
+        self.all_handlers = all_handlers
+        self.started = 0  # Children started over the pool's lifetime
+        self._idle: list[ChildProcess] = []
+        self._children: set[int] = set()  # Pids of the live children, idle or busy
+        # Notified whenever a child is returned idle or a slot frees up because one exited
+        self._available = threading.Condition()
+
+    def run(self, task: Task, stop: threading.Event) -> None:
+        """Run a task's handler in a child, returning early (and killing the child) once ``stop`` is set.
+
+        If every child is busy, waits for one to be free (or for ``stop``, returning without running it).
+        Raises RuntimeError with the handler's error if it failed or its process died.
+        """
+        child = self._acquire(stop)
+        if child is None:
+            return
+        try:
+            child.conn.send(task)
+            while not child.conn.poll(STOP_POLL_INTERVAL):
+                if stop.is_set():
+                    self._kill(child)
+                    child = None
+                    return
+            try:
+                error, rss_mb = child.conn.recv()
+            except EOFError:
+                self._kill(child)
+                child = None
+                raise RuntimeError("Handler process exited unexpectedly") from None
+
+            child.tasks += 1
+            if child.tasks >= self.max_tasks or rss_mb > self.max_rss_mb:
+                logger.info(f"Recycling handler process {child.process.pid} ({child.tasks} tasks, {rss_mb:.0f} MB)")
+                self._retire(child)
+                child = None
+            if error is not None:
+                raise RuntimeError(error)
+        finally:
+            if child is not None:
+                with self._available:
+                    self._idle.append(child)
+                    self._available.notify()
+
+    def shutdown(self) -> None:
+        """Stop the idle children; call once no task is running."""
+        with self._available:
+            children, self._idle = self._idle, []
+        for child in children:
+            child.conn.send(None)
+        for child in children:
+            child.process.join(CHILD_SHUTDOWN_TIMEOUT)
+            self._kill(child)
+
+    def _acquire(self, stop: threading.Event) -> ChildProcess | None:
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if len(self._children) < self.size:
+                    return self._start()
+                if stop.is_set():
+                    return None
+                self._available.wait(STOP_POLL_INTERVAL)
+
+    def _start(self) -> ChildProcess:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=run_child, args=(child_conn,), name="handler", daemon=True)
+        process.start()
+        child_conn.close()
+        self._children.add(process.pid)
+        self.started += 1
+        return ChildProcess(process, parent_conn)
+
+    def _retire(self, child: ChildProcess) -> None:
+        child.conn.send(None)
+        child.process.join(CHILD_SHUTDOWN_TIMEOUT)
+        self._kill(child)
+
+    def _kill(self, child: ChildProcess) -> None:
+        if child.process.is_alive():
+            child.process.kill()
+            child.process.join()
+        child.conn.close()
+        with self._available:
+            self._children.discard(child.process.pid)
+            self._available.notify()
+
+
+_process_pool: ProcessPool | None = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPool:
+    """Get the pool handlers run in, by default one for CPU-bound handlers with a process per core."""
+    global _process_pool  # noqa: PLW0603
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPool(os.cpu_count())
+        return _process_pool
+
+
+def configure_process_pool(pool: ProcessPool) -> None:
+    """Replace the pool handlers run in, e.g. to run every handler in processes."""
+    global _process_pool  # noqa: PLW0603
+    with _process_pool_lock:
+        previous, _process_pool = _process_pool, pool
+    if previous is not None:
+        previous.shutdown()
+
+
+def shutdown_process_pool() -> None:
+    """Stop the handler processes, if any were started."""
+    global _process_pool  # noqa: PLW0603
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def runs_in_pool(handler: TaskHandler) -> bool:
+    """Whether a handler runs in the process pool: if it is CPU-bound or in process mode."""
+    return handler.cpu_bound or process_pool().all_handlers
+
+
+def run_handler(handler: TaskHandler, task: Task, stop: threading.Event) -> None:
+    """Run a task's handler on this thread or, if it is CPU-bound or in process mode, in the process pool."""
+    if runs_in_pool(handler):
+        process_pool().run(task, stop)
+    elif handler.is_coroutine:
+        asyncio.run(run_coroutine_handler(handler, task, stop))
+    else:
+        handler.func(task, stop)
+
+
+async def run_coroutine_handler(handler: TaskHandler, task: Task, stop: threading.Event) -> None:
+    """Run a coroutine handler on this thread's own event loop, cancelling it once ``stop`` is set."""
+    work = asyncio.ensure_future(handler.func(task))
+    while not work.done():
+        if stop.is_set():
+            work.cancel()
+            break
+        await asyncio.wait({work}, timeout=STOP_POLL_INTERVAL)
+    with contextlib.suppress(asyncio.CancelledError):
+        await work
+
+
+async def run_handler_async(handler: TaskHandler, task: Task, stop: asyncio.Event) -> None:
+    """Run a task's handler until it returns or ``stop`` is set.
+
+    Coroutine handlers run on the event loop itself and are cancelled to stop them; the others are
+    handed to a thread, which runs them as ``run_handler`` does.
+    """
+    thread_stop = threading.Event()
+    if handler.is_coroutine and not runs_in_pool(handler):
+        work = asyncio.ensure_future(handler.func(task))
+    else:
+        work = asyncio.ensure_future(asyncio.to_thread(run_handler, handler, task, thread_stop))
+    stopped = asyncio.ensure_future(stop.wait())
+    try:
+        await asyncio.wait({work, stopped}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopped.cancel()
+        if not work.done():
+            # A thread can't be cancelled, but the handler it runs returns soon after being told to stop
+            thread_stop.set()
+            work.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await work
+
+
+def process_task(task: Task, default_timeout: float = DEFAULT_TASK_TIMEOUT) -> bool:
+    """Process a single task with the handler of its type.
+
+    The task fails if it runs past its ``timeout_seconds`` (or ``default_timeout``).
+    """
     task_id = task.id
     task_title = task.title
+    timeout = task.timeout_seconds or default_timeout
+    handler = handlers.get(task.task_type)
 
     logger.info(f"Starting to process task {task_id}: {task_title}")
+    # Set when the handler must stop: the task was cancelled, taken over by another worker, or timed out
+    stop = lease_keeper.add(task_id)
+    timed_out = threading.Event()
+
+    def interrupt() -> None:
+        timed_out.set()
+        stop.set()
+
+    deadline = threading.Timer(timeout, interrupt)
+    deadline.daemon = True
 
     try:
-        # Set status to WIP
-        if not update_task_status(task_id, TaskStatus.WIP):
-            logger.error(f"Failed to set task {task_id} to WIP status")
+        if handler is None:
+            raise LookupError(f"No handler for task type '{task.task_type}'")
+
+        # The task was already moved to WIP by the claim endpoint; the deadline starts once a slot of its type is free
+        with handler.slots:
+            started = time.monotonic()
+            deadline.start()
+            # A prefetched task may have been cancelled or lost while it waited for a slot
+            if not stop.is_set():
+                logger.info(f"Task {task_id} is now WIP, running its {task.task_type} handler...")
+                run_handler(handler, task, stop)
+
+        if stop.is_set():
+            if timed_out.is_set():
+                metrics.increment("deadline_exceeded")
+                logger.error(f"Task {task_id} ran past its {timeout} second deadline, stopping it")
+                status_batcher.update(task_id, TaskStatus.FAILED, f"Timed out after {timeout} seconds")
+            elif lease_keeper.is_cancelled(task_id):
+                metrics.increment("cancelled")
+                logger.warning(f"Task {task_id} was cancelled, stopping it")
+            else:
+                metrics.increment("lost")
+                logger.warning(f"Lease for task {task_id} was lost, abandoning it")
             return False
+        metrics.observe_duration(time.monotonic() - started)
+
+        # Set status to DONE
+        if not status_batcher.update(task_id, TaskStatus.DONE):
+            metrics.increment("failed")
+            logger.error(f"Failed to set task {task_id} to DONE status")
+            return False
+
+        metrics.increment("completed")
+        logger.info(f"Successfully completed task {task_id}: {task_title}")
+        return True
+
+    except Exception as e:
+        metrics.increment("failed")
+        logger.error(f"Error processing task {task_id}: {e}")
+        # Set status to FAILED
+        status_batcher.update(task_id, TaskStatus.FAILED, str(e))
+        return False
+    finally:
+        deadline.cancel()
+        lease_keeper.discard(task_id)
+
+
+async def process_task_async(
+    client: AsyncAPIClient, leases: AsyncLeaseKeeper, task: Task, default_timeout: float = DEFAULT_TASK_TIMEOUT
+) -> bool:
+    """Process a single task with the handler of its type, like ``process_task`` but on the event loop."""
+    task_id = task.id
+    task_title = task.title
+    timeout = task.timeout_seconds or default_timeout
+    handler = handlers.get(task.task_type)
+
+    logger.info(f"Starting to process task {task_id}: {task_title}")
+    # Set when the handler must stop: the task was cancelled, taken over by another worker, or timed out
+    stop = leases.add(task_id)
+    timed_out = asyncio.Event()
+
+    def interrupt() -> None:
+        timed_out.set()
+        stop.set()
+
+    deadline = None
 
-        # Simulate work (await 10 seconds)
-        logger.info(f"Task {task_id} is now WIP, working for 10 seconds...")
-        time.sleep(10)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for task type '{task.task_type}'")
+
+        # The task was already moved to WIP by the claim endpoint; the deadline starts once a slot of its type is free
+        async with handler.async_slots:
+            started = time.monotonic()
+            deadline = asyncio.get_running_loop().call_later(timeout, interrupt)
+            # A prefetched task may have been cancelled or lost while it waited for a slot
+            if not stop.is_set():
+                logger.info(f"Task {task_id} is now WIP, running its {task.task_type} handler...")
+                await run_handler_async(handler, task, stop)
+
+        if stop.is_set():
+            if timed_out.is_set():
+                metrics.increment("deadline_exceeded")
+                logger.error(f"Task {task_id} ran past its {timeout} second deadline, stopping it")
+                await update_task_status_async(client, task_id, TaskStatus.FAILED, f"Timed out after {timeout} seconds")
+            elif leases.is_cancelled(task_id):
+                metrics.increment("cancelled")
+                logger.warning(f"Task {task_id} was cancelled, stopping it")
+            else:
+                metrics.increment("lost")
+                logger.warning(f"Lease for task {task_id} was lost, abandoning it")
+            return False
+        metrics.observe_duration(time.monotonic() - started)
 
         # Set status to DONE
-        if not update_task_status(task_id, TaskStatus.DONE):
+        if not await update_task_status_async(client, task_id, TaskStatus.DONE):
+            metrics.increment("failed")
             logger.error(f"Failed to set task {task_id} to DONE status")
             return False
 
+        metrics.increment("completed")
         logger.info(f"Successfully completed task {task_id}: {task_title}")
         return True
 
     except Exception as e:
+        metrics.increment("failed")
         logger.error(f"Error processing task {task_id}: {e}")
         # Set status to FAILED
-        update_task_status(task_id, TaskStatus.FAILED, str(e))
+        await update_task_status_async(client, task_id, TaskStatus.FAILED, str(e))
         return False
+    finally:
+        if deadline is not None:
+            deadline.cancel()
+        leases.discard(task_id)
+
+
+def get_pending_tasks(queues: list[str] | None = None) -> list[Task]:
+    """Get pending tasks of ``queues`` (by default any) from API."""
+    try:
+        with breaker.guard():
+            tasks = api.get_pending_tasks(queues=queues)
+        logger.info(f"Found {len(tasks)} pending tasks")
+        return tasks
+    except APIError as e:
+        logger.error(f"Failed to get pending tasks: {e.status_code}")
+        return []
+    except requests.RequestException as e:
+        logger.error(f"Error getting pending tasks: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error parsing task data: {e}")
+        return []
+
 
+def claim_tasks(batch: int = CLAIM_BATCH_SIZE, wait: float = 0, queues: list[str] | None = None) -> list[Task]:
+    """Atomically claim pending tasks of ``queues`` (by default any) for this worker via API.
 
-def get_pending_tasks() -> list[Task]:
-    """Get pending tasks from API."""
+    With ``wait`` the API long-polls, holding the request open until work arrives or the wait expires.
+    """
     try:
-        response = requests.get(f"{API_BASE_URL}/tasks/worker/pending")
-        if response.status_code == 200:
-            tasks_data = response.json()
-            # Parse the response into Task objects
-            tasks = [Task.model_validate(task_data) for task_data in tasks_data]
-            logger.info(f"Found {len(tasks)} pending tasks")
-            return tasks
-        logger.error(f"Failed to get pending tasks: {response.status_code}")
+        claim = TaskClaim(worker_id=WORKER_ID, batch=batch, lease_seconds=LEASE_SECONDS, queues=queues)
+        with breaker.guard(wait):
+            tasks = api.claim_tasks(claim, wait=wait)
+        logger.info(f"Claimed {len(tasks)} tasks")
+        return tasks
+    except APIError as e:
+        logger.error(f"Failed to claim tasks: {e.status_code}")
         return []
     except requests.RequestException as e:
+        logger.error(f"Error claiming tasks: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error parsing task data: {e}")
+        return []
+
+
+async def get_pending_tasks_async(client: AsyncAPIClient, queues: list[str] | None = None) -> list[Task]:
+    """Get pending tasks of ``queues`` (by default any) from API, on the event loop."""
+    try:
+        with breaker.guard():
+            tasks = await client.get_pending_tasks(queues=queues)
+        logger.info(f"Found {len(tasks)} pending tasks")
+        return tasks
+    except APIError as e:
+        logger.error(f"Failed to get pending tasks: {e.status_code}")
+        return []
+    except (httpx.HTTPError, CircuitOpenError) as e:
         logger.error(f"Error getting pending tasks: {e}")
         return []
     except Exception as e:
@@ -105,6 +1234,266 @@ def get_pending_tasks() -> list[Task]:
         return []
 
 
+async def claim_tasks_async(
+    client: AsyncAPIClient, batch: int = CLAIM_BATCH_SIZE, wait: float = 0, queues: list[str] | None = None
+) -> list[Task]:
+    """Atomically claim pending tasks of ``queues`` (by default any) for this worker via API, on the event loop."""
+    try:
+        claim = TaskClaim(worker_id=WORKER_ID, batch=batch, lease_seconds=LEASE_SECONDS, queues=queues)
+        with breaker.guard(wait):
+            tasks = await client.claim_tasks(claim, wait=wait)
+        logger.info(f"Claimed {len(tasks)} tasks")
+        return tasks
+    except APIError as e:
+        logger.error(f"Failed to claim tasks: {e.status_code}")
+        return []
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        logger.error(f"Error claiming tasks: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error parsing task data: {e}")
+        return []
+
+
+class IdleTracker:
+    """Poll bookkeeping shared by the worker runtimes: idle back-off and auto-shutdown.
+
+    Claims follow each other straight away: while the queue is empty the API holds each one open, so the
+    worker always has a claim waiting for new work. The wait of each claim is jittered so that a fleet of
+    idle workers spreads its polls out instead of hitting the API in lockstep. Only claims that come back
+    empty before their wait is up (the API failed or the circuit breaker is open) are followed by a delay,
+    which grows exponentially with full jitter; a claim the API held open for its whole wait resets it.
+    """
+
+    def __init__(self, auto_shutdown: bool, queues: list[str] | None = None):
+        self.auto_shutdown = auto_shutdown
+        self.queues = queues
+        self.has_completed_task = False
+        self.consecutive_no_tasks_count = 0
+        self.failed_polls = 0  # Claims in a row that came back empty before their wait was up
+        self.poll_started = 0.0
+        self.poll_wait = float(POLL_INTERVAL)
+
+    def poll_starting(self) -> float:
+        """Record the start of a claim request. Returns how long the API may hold it open."""
+        logger.info("Polling for pending tasks...")
+        self.poll_started = time.monotonic()
+        self.poll_wait = POLL_INTERVAL * random.uniform(1 - POLL_JITTER, 1)
+        return self.poll_wait
+
+    def claimed(self, tasks: list[Task]) -> None:
+        """Record the result of a non-empty claim."""
+        logger.info(f"Processing {len(tasks)} pending tasks")
+        self.consecutive_no_tasks_count = 0
+        self.failed_polls = 0
+
+    def finished(self, task: Task, success: bool) -> None:
+        """Record the outcome of a processed task."""
+        if success:
+            logger.info(f"Task {task.id} completed successfully")
+            self.has_completed_task = True
+        else:
+            logger.error(f"Task {task.id} failed")
+
+    def idle(self, busy: bool) -> bool:
+        """Handle an empty claim. Returns whether the worker should shut down.
+
+        ``busy`` tells whether tasks are still running, in which case the worker never shuts down.
+        """
+        if self.shutdown_due(busy):
+            if confirm_auto_shutdown(self.queues):
+                return True
+            self.consecutive_no_tasks_count = 0
+
+        delay = self.poll_delay()
+        if delay > 0:
+            logger.info(f"Waiting {delay:.1f} seconds before next poll...")
+            time.sleep(delay)
+        return False
+
+    async def idle_async(self, client: AsyncAPIClient, busy: bool) -> bool:
+        """Handle an empty claim like ``idle``, on the event loop."""
+        if self.shutdown_due(busy):
+            if await confirm_auto_shutdown_async(client, self.queues):
+                return True
+            self.consecutive_no_tasks_count = 0
+
+        delay = self.poll_delay()
+        if delay > 0:
+            logger.info(f"Waiting {delay:.1f} seconds before next poll...")
+            await asyncio.sleep(delay)
+        return False
+
+    def shutdown_due(self, busy: bool) -> bool:
+        """Count an empty claim. Returns whether auto-shutdown should be confirmed."""
+        if busy:
+            return False
+        self.consecutive_no_tasks_count += 1
+        logger.info(f"No pending tasks found (consecutive count: {self.consecutive_no_tasks_count})")
+        return self.auto_shutdown and self.has_completed_task and self.consecutive_no_tasks_count >= 1
+
+    def poll_delay(self) -> float:
+        """Get how long to wait before the next claim after an empty one.
+
+        A claim the API held open for its whole wait found the queue empty, and the next one long-polls
+        straight away. One that came back early failed (e.g. the API is unreachable), and is backed off.
+        """
+        if time.monotonic() - self.poll_started >= self.poll_wait:
+            self.failed_polls = 0
+            return 0.0
+        self.failed_polls += 1
+        # Bounded so that the back-off of a worker failing for days doesn't overflow; the cap applies long before
+        attempt = min(self.failed_polls - 1, 32)
+        # While the circuit breaker is open, claims are paused until it lets a probe through
+        return max(backoff_delay(attempt, IDLE_BACKOFF_BASE, IDLE_BACKOFF_CAP), breaker.retry_in())
+
+
+def confirm_auto_shutdown(queues: list[str] | None = None) -> bool:
+    """Wait for the auto-shutdown delay and check whether the subscribed queues are still empty."""
+    logger.info(f"Auto-shutdown condition met. Waiting {AUTO_SHUTDOWN_DELAY} seconds before shutdown...")
+    time.sleep(AUTO_SHUTDOWN_DELAY)
+
+    # Check one more time for pending tasks (read-only, nothing is claimed)
+    final_check = get_pending_tasks(queues)
+    if not final_check:
+        logger.info("No pending tasks after final check. Auto-shutting down.")
+        return True
+    logger.info(f"Found {len(final_check)} pending tasks after final check. Continuing...")
+    return False
+
+
+async def confirm_auto_shutdown_async(client: AsyncAPIClient, queues: list[str] | None = None) -> bool:
+    """Wait for the auto-shutdown delay and check whether the subscribed queues are still empty, on the event loop."""
+    logger.info(f"Auto-shutdown condition met. Waiting {AUTO_SHUTDOWN_DELAY} seconds before shutdown...")
+    await asyncio.sleep(AUTO_SHUTDOWN_DELAY)
+
+    # Check one more time for pending tasks (read-only, nothing is claimed)
+    final_check = await get_pending_tasks_async(client, queues)
+    if not final_check:
+        logger.info("No pending tasks after final check. Auto-shutting down.")
+        return True
+    logger.info(f"Found {len(final_check)} pending tasks after final check. Continuing...")
+    return False
+
+
+def run_threaded(
+    concurrency: int,
+    auto_shutdown: bool,
+    queues: list[str] | None = None,
+    task_timeout: float = DEFAULT_TASK_TIMEOUT,
+    prefetch: int = 0,
+) -> None:
+    """Claim tasks of ``queues`` and process up to ``concurrency`` of them at once on a thread pool.
+
+    Up to ``prefetch`` more claimed tasks wait in the pool's queue, so a thread that frees up starts the next
+    task straight away while this loop claims the next ones. Their leases are renewed from the moment they
+    are claimed.
+    """
+    tracker = IdleTracker(auto_shutdown, queues)
+    capacity = concurrency + prefetch
+    in_flight: dict[Future, Task] = {}
+
+    def collect(done) -> None:
+        for future in done:
+            tracker.finished(in_flight.pop(future), future.result())
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="task") as executor:
+        while True:
+            collect([future for future in in_flight if future.done()])
+
+            # Every slot is busy and the prefetch buffer full, so wait for a task to finish before claiming more
+            if len(in_flight) >= capacity:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+                continue
+
+            # Claim as many tasks as there are free slots and buffer space, long-polling while the queue is empty
+            poll_wait = tracker.poll_starting()
+            batch = min(capacity - len(in_flight), MAX_CLAIM_BATCH)
+            tasks = claim_tasks(batch=batch, wait=poll_wait, queues=queues)
+            if tasks:
+                tracker.claimed(tasks)
+                for task in tasks:
+                    lease_keeper.add(task.id)
+                    in_flight[executor.submit(process_task, task, task_timeout)] = task
+                # More work may be waiting, so poll again straight away
+                continue
+
+            if tracker.idle(busy=bool(in_flight)):
+                break
+
+
+async def run_async(
+    concurrency: int,
+    auto_shutdown: bool,
+    queues: list[str] | None = None,
+    task_timeout: float = DEFAULT_TASK_TIMEOUT,
+    prefetch: int = 0,
+) -> None:
+    """Claim tasks of ``queues`` and process up to ``concurrency`` of them at once on an asyncio event loop.
+
+    Claims, heartbeats, status updates and coroutine handlers share the loop and a pooled async client;
+    only blocking handlers are handed to threads (or to the process pool). Up to ``prefetch`` more claimed
+    tasks wait for a slot, as in ``run_threaded``.
+    """
+    tracker = IdleTracker(auto_shutdown, queues)
+    # Claimed tasks, running or waiting for a slot
+    buffer = asyncio.BoundedSemaphore(concurrency + prefetch)
+    slots = asyncio.BoundedSemaphore(concurrency)
+    in_flight: set[asyncio.Task] = set()
+    # Blocking handlers get a thread per slot, instead of the default executor's few
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="task")
+    )
+
+    # One pooled connection per concurrently running task, plus one for claims and heartbeats
+    async with AsyncAPIClient(
+        API_BASE_URL, timeout=(REQUEST_TIMEOUT, REQUEST_TIMEOUT), pool_size=concurrency + 1
+    ) as client:
+        leases = AsyncLeaseKeeper(client)
+        heartbeats = asyncio.create_task(leases.run())
+
+        async def run(task: Task) -> None:
+            try:
+                async with slots:
+                    tracker.finished(task, await process_task_async(client, leases, task, task_timeout))
+            finally:
+                in_flight.discard(asyncio.current_task())
+                buffer.release()
+
+        try:
+            while True:
+                # Wait for room in the buffer, then take all the room there is (up to a full claim)
+                await buffer.acquire()
+                free = 1
+                while free < MAX_CLAIM_BATCH and not buffer.locked():
+                    await buffer.acquire()
+                    free += 1
+
+                # Claim as many tasks as there is room for, long-polling while the queue is empty
+                poll_wait = tracker.poll_starting()
+                tasks = await claim_tasks_async(client, batch=free, wait=poll_wait, queues=queues)
+                for _ in range(free - len(tasks)):
+                    buffer.release()
+                if tasks:
+                    tracker.claimed(tasks)
+                    for task in tasks:
+                        leases.add(task.id)
+                        in_flight.add(asyncio.create_task(run(task)))
+                    # More work may be waiting, so poll again straight away
+                    continue
+
+                if await tracker.idle_async(client, busy=bool(in_flight)):
+                    break
+        finally:
+            # Let in-flight tasks finish and report their status before exiting
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            heartbeats.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await heartbeats
+
+
 def main():
     """Main entry point."""
     args = parse_arguments()
@@ -112,73 +1501,59 @@ def main():
     logger.info(f"Starting worker service with ID: {WORKER_ID}")
     logger.info(f"API Base URL: {API_BASE_URL}")
     logger.info(f"Poll interval: {POLL_INTERVAL} seconds")
+    # In process mode every handler runs in a child process, one task per child at a time; the parent
+    # claims, renews leases and reports statuses for all of them
+    concurrency = args.processes if args.executor == "process" else args.concurrency
+    logger.info(f"Concurrency: {concurrency} ({args.executor} executor), prefetching {args.prefetch} tasks")
+    logger.info(f"Queues: {', '.join(args.queues) if args.queues else 'all'}")
+    logger.info(f"Default task timeout: {args.task_timeout} seconds")
 
     if args.auto_shutdown:
         logger.info(
             "Auto-shutdown mode enabled - will shutdown after completing tasks and waiting 5 seconds with no pending tasks"
         )
 
+    if args.status_journal:
+        logger.info(f"Status journal: {args.status_journal}")
+
     # Database is managed by Alembic migrations
     logger.info("Database schema managed by Alembic migrations")
 
-    # Auto-shutdown tracking variables
-    has_completed_task = False
-    consecutive_no_tasks_count = 0
+    if args.executor != "asyncio":
+        # One pooled connection per concurrently running task, plus one for claims and heartbeats
+        api.resize_pool(concurrency + 1)
+        # Keep leases of claimed tasks alive while they are being processed
+        lease_keeper.start()
+        # Report the outcomes of tasks finishing together in one request
+        status_batcher.start()
+    if args.executor == "process":
+        configure_process_pool(
+            ProcessPool(args.processes, args.max_tasks_per_child, args.max_child_rss, all_handlers=True)
+        )
+
+    # Keep status updates the API can't be reached for until they are delivered, sending any left from a previous run
+    status_journal.path = args.status_journal
+    status_journal.start()
 
     # Main loop
     try:
-        while True:
-            logger.info("Polling for pending tasks...")
-
-            # Get pending tasks
-            pending_tasks = get_pending_tasks()
-
-            if pending_tasks:
-                logger.info(f"Processing {len(pending_tasks)} pending tasks")
-                consecutive_no_tasks_count = 0
-
-                # Process tasks one by one (linearly)
-                for task in pending_tasks:
-                    logger.info(f"Processing task {task.id}: {task.title}")
-                    success = process_task(task)
-
-                    if success:
-                        logger.info(f"Task {task.id} completed successfully")
-                        has_completed_task = True
-                    else:
-                        logger.error(f"Task {task.id} failed")
-
-                    # Small delay between tasks to avoid overwhelming the system
-                    time.sleep(1)
-            else:
-                consecutive_no_tasks_count += 1
-                logger.info(f"No pending tasks found (consecutive count: {consecutive_no_tasks_count})")
-
-                # Check if we should auto-shutdown
-                if args.auto_shutdown and has_completed_task and consecutive_no_tasks_count >= 1:
-                    # Wait for the auto-shutdown delay
-                    logger.info(
-                        f"Auto-shutdown condition met. Waiting {AUTO_SHUTDOWN_DELAY} seconds before shutdown..."
-                    )
-                    time.sleep(AUTO_SHUTDOWN_DELAY)
-
-                    # Check one more time for pending tasks
-                    final_check = get_pending_tasks()
-                    if not final_check:
-                        logger.info("No pending tasks after final check. Auto-shutting down.")
-                        break
-                    logger.info(f"Found {len(final_check)} pending tasks after final check. Continuing...")
-                    consecutive_no_tasks_count = 0
-
-            # Wait before next poll
-            logger.info(f"Waiting {POLL_INTERVAL} seconds before next poll...")
-            time.sleep(POLL_INTERVAL)
+        if args.executor == "asyncio":
+            asyncio.run(run_async(concurrency, args.auto_shutdown, args.queues, args.task_timeout, args.prefetch))
+        else:
+            run_threaded(concurrency, args.auto_shutdown, args.queues, args.task_timeout, args.prefetch)
 
     except KeyboardInterrupt:
         logger.info("Worker service stopped by user")
     except Exception as e:
         logger.error(f"Worker service error: {e}")
         raise
+    finally:
+        status_batcher.stop()
+        lease_keeper.stop()
+        status_journal.stop()
+        shutdown_process_pool()
+        logger.info(f"Task metrics: {metrics.snapshot()}")
+        api.close()
 
 
 if __name__ == "__main__":
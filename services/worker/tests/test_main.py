@@ -2,26 +2,57 @@
 
 import pytest
 import responses
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import patch, AsyncMock, MagicMock, call
 import argparse
+import asyncio
 import requests
+import threading
+import time
 
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from main import (
+    claim_tasks,
     get_pending_tasks,
     process_task,
     update_task_status,
     parse_arguments,
     main,
+    process_task_async,
+    run_async,
+    run_threaded,
     WORKER_ID,
     API_BASE_URL,
     AUTO_SHUTDOWN_DELAY,
+    IDLE_BACKOFF_CAP,
+    LEASE_SECONDS,
+    POLL_INTERVAL,
+    POLL_JITTER,
+    AsyncLeaseKeeper,
+    CircuitBreaker,
+    CircuitOpenError,
+    IdleTracker,
+    LeaseKeeper,
+    ProcessPool,
+    StatusBatcher,
+    StatusJournal,
+    TaskHandler,
+    WorkerMetrics,
+    run_handler,
+    send_heartbeat,
+    update_task_statuses,
 )
 from common.models import TaskStatus
-from common.schemas import Task
+from common.schemas import Task, TaskHeartbeatResult, TaskStatusBatchResult, TaskStatusUpdate
+
+
+@pytest.fixture(autouse=True)
+def closed_breaker():
+    """Give each test a closed circuit breaker, so failures of other tests don't open it."""
+    with patch("main.breaker", CircuitBreaker()) as breaker:
+        yield breaker
 
 
 class TestParseArguments:
@@ -39,6 +70,51 @@ class TestParseArguments:
             args = parse_arguments()
             assert args.auto_shutdown is True
 
+    def test_parse_arguments_concurrency_defaults(self):
+        """Test that the worker runs one task at a time on a thread pool by default."""
+        with patch("sys.argv", ["worker"]):
+            args = parse_arguments()
+            assert args.concurrency == 1
+            assert args.executor == "thread"
+            assert args.prefetch == 0
+
+    def test_parse_arguments_with_concurrency(self):
+        """Test parsing concurrency and executor flags."""
+        with patch("sys.argv", ["worker", "--concurrency", "8", "--executor", "asyncio", "--prefetch", "4"]):
+            args = parse_arguments()
+            assert args.concurrency == 8
+            assert args.executor == "asyncio"
+            assert args.prefetch == 4
+
+    def test_parse_arguments_with_queues(self):
+        """Test parsing the comma-separated queues the worker subscribes to."""
+        with patch("sys.argv", ["worker"]):
+            assert parse_arguments().queues is None
+        with patch("sys.argv", ["worker", "--queues", "emails, reports"]):
+            assert parse_arguments().queues == ["emails", "reports"]
+
+    def test_parse_arguments_task_timeout(self):
+        """Test parsing the default task timeout."""
+        with patch("sys.argv", ["worker", "--task-timeout", "30"]):
+            assert parse_arguments().task_timeout == 30
+        with patch("sys.argv", ["worker", "--task-timeout", "0"]), pytest.raises(SystemExit):
+            parse_arguments()
+
+    def test_parse_arguments_process_mode(self):
+        """Test parsing the process mode options."""
+        argv = ["worker", "--mode", "process", "--processes", "4", "--max-tasks-per-child", "50", "--max-child-rss", "256"]
+        with patch("sys.argv", argv):
+            args = parse_arguments()
+            assert args.executor == "process"
+            assert args.processes == 4
+            assert args.max_tasks_per_child == 50
+            assert args.max_child_rss == 256
+
+    def test_parse_arguments_invalid_concurrency(self):
+        """Test that a concurrency below one is rejected."""
+        with patch("sys.argv", ["worker", "--concurrency", "0"]), pytest.raises(SystemExit):
+            parse_arguments()
+
 
 class TestUpdateTaskStatus:
     """Test update_task_status function."""
@@ -53,7 +129,7 @@ class TestUpdateTaskStatus:
         responses.add(
             responses.PUT,
             f"{API_BASE_URL}/tasks/{task_id}/status",
-            json={"status": status, "worker_id": WORKER_ID},
+            json={"id": task_id, "title": "Test Task", "user_id": 1, "status": status, "worker_id": WORKER_ID, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
             status=200
         )
         
@@ -70,7 +146,7 @@ class TestUpdateTaskStatus:
         responses.add(
             responses.PUT,
             f"{API_BASE_URL}/tasks/{task_id}/status",
-            json={"status": status, "worker_id": WORKER_ID, "error_message": error_message},
+            json={"id": task_id, "title": "Test Task", "user_id": 1, "status": status, "worker_id": WORKER_ID, "error_message": error_message, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
             status=200
         )
         
@@ -109,6 +185,149 @@ class TestUpdateTaskStatus:
         assert result is False
 
 
+class TestStatusBatching:
+    """Test coalescing of status updates."""
+
+    @responses.activate
+    def test_update_task_statuses(self):
+        """Test sending many status updates in one request."""
+        responses.add(
+            responses.PUT,
+            f"{API_BASE_URL}/tasks/status:batch",
+            json={"updated": [1], "conflicts": [2], "not_found": []},
+            status=200,
+            match=[
+                responses.matchers.json_params_matcher(
+                    {
+                        "updates": {
+                            "1": {"status": "done", "worker_id": WORKER_ID, "error_message": None},
+                            "2": {"status": "done", "worker_id": WORKER_ID, "error_message": None},
+                        }
+                    }
+                )
+            ],
+        )
+
+        update = TaskStatusUpdate(status=TaskStatus.DONE, worker_id=WORKER_ID)
+        result = update_task_statuses({1: update, 2: update})
+        assert result.updated == [1]
+        assert result.conflicts == [2]
+
+    @responses.activate
+    def test_update_task_statuses_api_error(self):
+        """Test batch failures are reported as no result."""
+        responses.add(responses.PUT, f"{API_BASE_URL}/tasks/status:batch", status=500)
+
+        assert update_task_statuses({1: TaskStatusUpdate(status=TaskStatus.DONE)}) is None
+
+    def test_batcher_coalesces_concurrent_updates(self):
+        """Test updates made within the window are sent together, each caller getting its own outcome."""
+        batcher = StatusBatcher(window=0.5)
+        results = {}
+
+        def finish(task_id):
+            results[task_id] = batcher.update(task_id, TaskStatus.DONE)
+
+        with patch(
+            "main.update_task_statuses", return_value=TaskStatusBatchResult(updated=[1, 2], conflicts=[3])
+        ) as mock_update_task_statuses:
+            batcher.start()
+            threads = [threading.Thread(target=finish, args=(task_id,)) for task_id in (1, 2, 3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+            batcher.stop()
+
+        mock_update_task_statuses.assert_called_once()
+        assert sorted(mock_update_task_statuses.call_args.args[0]) == [1, 2, 3]
+        assert results == {1: True, 2: True, 3: False}
+
+    def test_batcher_sends_lone_update_directly(self):
+        """Test a single update uses the single-task endpoint."""
+        batcher = StatusBatcher(window=0.01)
+
+        with patch("main.update_task_status", return_value=True) as mock_update_task_status:
+            batcher.start()
+            assert batcher.update(1, TaskStatus.FAILED, "Boom") is True
+            batcher.stop()
+
+        mock_update_task_status.assert_called_once_with(1, TaskStatus.FAILED, "Boom")
+
+
+class TestStatusJournal:
+    """Test the durable journal of status updates the API could not be reached for."""
+
+    @pytest.fixture
+    def journal(self, tmp_path):
+        """Start a journal that only delivers updates when told to, and doesn't sleep between retries."""
+        journal = StatusJournal(str(tmp_path / "status.journal"), interval=60)
+        journal.start()
+        with patch("main.status_journal", journal), patch("common.client.time.sleep"):
+            yield journal
+        journal.stop()
+
+    @responses.activate
+    def test_unreachable_update_is_journaled(self, journal):
+        """Test updates that can't be sent are journaled once per task and status, and rejected ones are not."""
+        responses.add(responses.PUT, f"{API_BASE_URL}/tasks/1/status", body=requests.ConnectionError("refused"))
+        responses.add(responses.PUT, f"{API_BASE_URL}/tasks/2/status", json={"detail": "Task is no longer owned by this worker"}, status=409)
+
+        assert update_task_status(1, TaskStatus.DONE) is True
+        assert update_task_status(1, TaskStatus.DONE) is True
+        assert update_task_status(2, TaskStatus.DONE) is False
+
+        assert [(task_id, update.status) for task_id, update in journal.pending()] == [(1, TaskStatus.DONE)]
+        with open(journal.path) as f:
+            assert len(f.readlines()) == 1
+
+    @responses.activate
+    def test_replay_delivers_in_order(self, journal):
+        """Test journaled updates are delivered in journal order, and the journal is emptied afterwards."""
+        journal.record({2: TaskStatusUpdate(status=TaskStatus.DONE, worker_id=WORKER_ID)})
+        journal.record({1: TaskStatusUpdate(status=TaskStatus.FAILED, worker_id=WORKER_ID, error_message="Boom")})
+        responses.add(responses.PUT, f"{API_BASE_URL}/tasks/2/status", json={"detail": "Task not found"}, status=404)
+        responses.add(responses.PUT, f"{API_BASE_URL}/tasks/1/status", json={"id": 1, "title": "Test Task", "user_id": 1, "status": "pending", "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+
+        assert journal.replay() == 0
+
+        assert [call.request.url for call in responses.calls] == [f"{API_BASE_URL}/tasks/2/status", f"{API_BASE_URL}/tasks/1/status"]
+        assert os.path.getsize(journal.path) == 0
+
+    @responses.activate
+    def test_undelivered_updates_survive_restart(self, tmp_path):
+        """Test updates still undelivered at shutdown are loaded again on the next start, past a torn last entry."""
+        path = str(tmp_path / "status.journal")
+        responses.add(responses.PUT, f"{API_BASE_URL}/tasks/1/status", status=503)
+
+        journal = StatusJournal(path, interval=60)
+        journal.start()
+        with pytest.raises(RuntimeError, match="used by another worker"):
+            StatusJournal(path).start()
+        journal.record({1: TaskStatusUpdate(status=TaskStatus.DONE, worker_id=WORKER_ID)})
+        journal.record({2: TaskStatusUpdate(status=TaskStatus.DONE, worker_id=WORKER_ID)})
+        with patch("common.client.time.sleep"):
+            journal.stop()
+        # The API was unavailable, so delivery stopped at the first update
+        assert {call.request.url for call in responses.calls} == {f"{API_BASE_URL}/tasks/1/status"}
+        with open(path, "a") as f:
+            f.write('{"task_id": 3, "sta')
+
+        restarted = StatusJournal(path, interval=60)
+        restarted.start()
+        assert [task_id for task_id, _ in restarted.pending()] == [1, 2]
+        restarted.record({4: TaskStatusUpdate(status=TaskStatus.DONE, worker_id=WORKER_ID)})
+        with patch("common.client.time.sleep"):
+            restarted.stop()
+
+        # The entry after the torn one was written on a line of its own
+        restarted = StatusJournal(path, interval=60)
+        restarted.start()
+        assert [task_id for task_id, _ in restarted.pending()] == [1, 2, 4]
+        with patch("common.client.time.sleep"):
+            restarted.stop()
+
+
 class TestGetPendingTasks:
     """Test get_pending_tasks function."""
 
@@ -173,6 +392,285 @@ class TestGetPendingTasks:
         assert result == []
 
 
+class TestClaimTasks:
+    """Test claim_tasks function."""
+
+    @responses.activate
+    def test_claim_tasks_success(self):
+        """Test claiming a batch of tasks in a single request."""
+        mock_tasks_data = [
+            {"id": 1, "title": "Task 1", "status": "wip", "description": None, "user_id": 1, "worker_id": WORKER_ID, "started_at": "2024-01-01T00:00:00", "completed_at": None, "error_message": None, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
+        ]
+
+        responses.add(
+            responses.POST,
+            f"{API_BASE_URL}/tasks/worker/claim",
+            json=mock_tasks_data,
+            status=200,
+            match=[responses.matchers.json_params_matcher({"worker_id": WORKER_ID, "batch": 2, "lease_seconds": LEASE_SECONDS, "queues": None})],
+        )
+
+        result = claim_tasks(2)
+
+        assert len(result) == 1
+        assert result[0].status == TaskStatus.WIP
+        assert result[0].worker_id == WORKER_ID
+
+    @responses.activate
+    def test_claim_tasks_api_error(self):
+        """Test handling API errors when claiming tasks."""
+        responses.add(
+            responses.POST,
+            f"{API_BASE_URL}/tasks/worker/claim",
+            status=500
+        )
+
+        result = claim_tasks()
+        assert result == []
+
+    @responses.activate
+    def test_claim_tasks_long_poll(self):
+        """Test that the wait is forwarded to the API for server-side long-polling."""
+        responses.add(
+            responses.POST,
+            f"{API_BASE_URL}/tasks/worker/claim",
+            json=[],
+            status=200,
+            match=[responses.matchers.query_param_matcher({"wait": "5"})],
+        )
+
+        assert claim_tasks(wait=5) == []
+
+    @responses.activate
+    def test_claim_tasks_from_queues(self):
+        """Test that the subscribed queues are sent with the claim."""
+        responses.add(
+            responses.POST,
+            f"{API_BASE_URL}/tasks/worker/claim",
+            json=[],
+            status=200,
+            match=[responses.matchers.json_params_matcher({"worker_id": WORKER_ID, "batch": 1, "lease_seconds": LEASE_SECONDS, "queues": ["emails"]})],
+        )
+
+        assert claim_tasks(1, queues=["emails"]) == []
+
+
+def test_worker_metrics_histogram():
+    """Test durations are counted in the first bucket they fit, with an overflow bucket."""
+    worker_metrics = WorkerMetrics(buckets=(1, 10))
+    for seconds in (0.5, 1, 5, 60):
+        worker_metrics.observe_duration(seconds)
+    worker_metrics.increment("completed")
+
+    assert worker_metrics.snapshot() == {"completed": 1, "durations": {"le_1": 2, "le_10": 1, "inf": 1}}
+
+
+@patch("main.time.sleep")
+def test_failed_claims_back_off_until_one_succeeds(mock_sleep):
+    """Test empty claims long-poll again straight away, and only failed ones back off exponentially with jitter."""
+    tracker = IdleTracker(auto_shutdown=False)
+
+    def poll(tasks=(), failed=False):
+        wait = tracker.poll_starting()
+        assert POLL_INTERVAL * (1 - POLL_JITTER) <= wait <= POLL_INTERVAL
+        # The API held an empty claim open for its whole wait, but answered a failed one straight away
+        if not failed:
+            tracker.poll_started -= wait
+        if tasks:
+            tracker.claimed(list(tasks))
+        else:
+            tracker.idle(busy=False)
+
+    for _ in range(3):
+        poll()
+    mock_sleep.assert_not_called()
+
+    with patch("common.client.random.uniform", side_effect=lambda _low, high: high):
+        for _ in range(8):
+            poll(failed=True)
+        assert [args.args[0] for args in mock_sleep.call_args_list] == [1, 2, 4, 8, 16, 32, IDLE_BACKOFF_CAP, IDLE_BACKOFF_CAP]
+
+        for reset in (lambda: poll(tasks=[MagicMock()]), poll):
+            poll(failed=True)
+            reset()
+            mock_sleep.reset_mock()
+            poll(failed=True)
+            mock_sleep.assert_called_once_with(1)
+
+
+class TestCircuitBreaker:
+    """Test the circuit breaker around API calls."""
+
+    @staticmethod
+    def fail(breaker):
+        """Make a guarded call that finds the API unreachable."""
+        with pytest.raises(requests.ConnectionError), breaker.guard():
+            raise requests.ConnectionError("refused")
+
+    def test_opens_after_consecutive_failures_and_probes(self):
+        """Test the circuit opens after consecutive failures, then lets a single probe through that closes it."""
+        breaker = CircuitBreaker(failure_threshold=2, open_seconds=0.05)
+        with patch("main.metrics", WorkerMetrics()) as mock_metrics:
+            self.fail(breaker)
+            with breaker.guard():
+                pass
+            self.fail(breaker)
+            assert breaker.state == CircuitBreaker.CLOSED
+            self.fail(breaker)
+            assert breaker.state == CircuitBreaker.OPEN
+
+            with pytest.raises(CircuitOpenError), breaker.guard():
+                pass
+            assert 0 < breaker.retry_in() <= 0.05
+
+            time.sleep(0.06)
+            with breaker.guard():
+                # Only the probe is let through while it is in flight
+                assert breaker.state == CircuitBreaker.HALF_OPEN
+                with pytest.raises(CircuitOpenError), breaker.guard():
+                    pass
+            assert breaker.state == CircuitBreaker.CLOSED
+
+            snapshot = mock_metrics.snapshot()
+            assert snapshot["circuit_opened"] == 1
+            assert snapshot["circuit_rejected"] == 2
+            assert snapshot["circuit_state"] == "closed"
+
+    def test_failed_probe_reopens_for_longer(self):
+        """Test a failed probe opens the circuit again, with a longer cool-down."""
+        breaker = CircuitBreaker(failure_threshold=1, open_seconds=0.05, max_open_seconds=10)
+        with patch("main.random.uniform", return_value=1):
+            self.fail(breaker)
+            time.sleep(0.06)
+            self.fail(breaker)
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert 0.05 < breaker.retry_in() <= 0.1
+
+    def test_slow_calls_count_as_failures(self):
+        """Test calls slower than the threshold open the circuit, not counting the time a long poll is held open."""
+        breaker = CircuitBreaker(failure_threshold=1, slow_call_seconds=0.01)
+        with breaker.guard(wait=1):
+            time.sleep(0.02)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+        with breaker.guard():
+            time.sleep(0.02)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    @responses.activate
+    def test_claims_pause_while_open(self, closed_breaker):
+        """Test no claims are sent while the circuit is open, and the worker waits until it may probe."""
+        closed_breaker.failure_threshold = 1
+        self.fail(closed_breaker)
+
+        assert claim_tasks(1) == []
+        assert len(responses.calls) == 0
+
+        tracker = IdleTracker(auto_shutdown=False)
+        tracker.poll_starting()
+        with patch("main.time.sleep") as mock_sleep, patch("common.client.random.uniform", return_value=0):
+            tracker.idle(busy=False)
+        assert mock_sleep.call_args.args[0] == pytest.approx(closed_breaker.retry_in(), abs=0.5)
+
+
+class TestLeases:
+    """Test lease heartbeat functionality."""
+
+    @responses.activate
+    def test_send_heartbeat_success(self):
+        """Test renewing leases reports tasks the worker no longer owns."""
+        responses.add(
+            responses.POST,
+            f"{API_BASE_URL}/tasks/worker/heartbeat",
+            json={"extended": [1], "lost": [2]},
+            status=200,
+            match=[
+                responses.matchers.json_params_matcher(
+                    {"worker_id": WORKER_ID, "task_ids": [1, 2], "lease_seconds": LEASE_SECONDS}
+                )
+            ],
+        )
+
+        result = send_heartbeat([1, 2])
+        assert result.extended == [1]
+        assert result.lost == [2]
+
+    @responses.activate
+    def test_send_heartbeat_connection_error(self):
+        """Test heartbeat failures are tolerated."""
+        responses.add(
+            responses.POST,
+            f"{API_BASE_URL}/tasks/worker/heartbeat",
+            body=requests.exceptions.ConnectionError("Connection failed")
+        )
+
+        assert send_heartbeat([1]) is None
+
+    def test_lease_keeper_renews_in_flight_tasks(self):
+        """Test the lease keeper heartbeats only tasks that are still in flight."""
+        keeper = LeaseKeeper(interval=0.01)
+        keeper.add(1)
+        keeper.add(2)
+        keeper.discard(2)
+
+        with patch("main.send_heartbeat") as mock_send_heartbeat:
+            keeper.start()
+            time.sleep(0.1)
+            keeper.stop()
+
+        assert mock_send_heartbeat.called
+        mock_send_heartbeat.assert_called_with([1])
+
+    def test_lease_keeper_signals_lost_tasks(self):
+        """Test the lease keeper flags tasks the API reports as lost."""
+        keeper = LeaseKeeper(interval=0.01)
+        lost = keeper.add(1)
+        kept = keeper.add(2)
+
+        with patch("main.send_heartbeat", return_value=TaskHeartbeatResult(extended=[2], lost=[1])):
+            keeper.start()
+            assert lost.wait(1)
+            keeper.stop()
+
+        assert not kept.is_set()
+
+    def test_lease_keeper_signals_cancelled_tasks(self):
+        """Test the lease keeper stops tasks the API reports as cancelled, telling them from lost ones."""
+        keeper = LeaseKeeper(interval=0.01)
+        cancelled = keeper.add(1)
+        lost = keeper.add(2)
+
+        result = TaskHeartbeatResult(extended=[], lost=[1, 2], cancelled=[1])
+        with patch("main.send_heartbeat", return_value=result):
+            keeper.start()
+            assert cancelled.wait(1)
+            assert lost.wait(1)
+            keeper.stop()
+
+        assert keeper.is_cancelled(1)
+        assert not keeper.is_cancelled(2)
+
+    def test_async_lease_keeper_signals_cancelled_tasks(self):
+        """Test the event loop's lease keeper heartbeats in-flight tasks and stops cancelled ones."""
+        client = MagicMock()
+        client.heartbeat = AsyncMock(return_value=TaskHeartbeatResult(extended=[2], lost=[1], cancelled=[1]))
+
+        async def run():
+            keeper = AsyncLeaseKeeper(client, interval=0.01)
+            cancelled = keeper.add(1)
+            kept = keeper.add(2)
+            heartbeats = asyncio.create_task(keeper.run())
+            await asyncio.wait_for(cancelled.wait(), 1)
+            heartbeats.cancel()
+            return keeper, kept
+
+        keeper, kept = asyncio.run(run())
+        assert keeper.is_cancelled(1)
+        assert not kept.is_set()
+        assert client.heartbeat.await_args.args[0].task_ids == [1, 2]
+
+
 class TestProcessTask:
     """Test process_task function."""
 
@@ -182,10 +680,10 @@ class TestProcessTask:
         task = Task(
             id=1, 
             title="Test Task", 
-            status=TaskStatus.PENDING,
+            status=TaskStatus.WIP,
             description=None,
             user_id=1,
-            worker_id=None,
+            worker_id=WORKER_ID,
             started_at=None,
             completed_at=None,
             error_message=None,
@@ -193,54 +691,54 @@ class TestProcessTask:
             updated_at="2024-01-01T00:00:00"
         )
         
-        # Mock successful status updates
+        # Mock successful DONE status update (the task was claimed as WIP already)
         responses.add(
             responses.PUT,
             f"{API_BASE_URL}/tasks/1/status",
-            json={"status": "wip"},
-            status=200
-        )
-        responses.add(
-            responses.PUT,
-            f"{API_BASE_URL}/tasks/1/status",
-            json={"status": "done"},
+            json={"id": 1, "title": "Test Task", "user_id": 1, "status": "done", "worker_id": WORKER_ID, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
             status=200
         )
         
-        with patch("main.time.sleep") as mock_sleep:
+        with patch("main.lease_keeper") as mock_lease_keeper:
+            mock_lease_keeper.add.return_value.wait.return_value = False
+            mock_lease_keeper.add.return_value.is_set.return_value = False
             result = process_task(task)
             
-            # Should sleep for 10 seconds (simulating work)
-            mock_sleep.assert_called_with(10)
+            # Should work for 10 seconds unless the lease is lost
+            mock_lease_keeper.add.return_value.wait.assert_called_with(10)
+            mock_lease_keeper.discard.assert_called_with(1)
             assert result is True
+        assert len(responses.calls) == 1
 
     @responses.activate
-    def test_process_task_wip_status_failure(self):
-        """Test task processing when WIP status update fails."""
-        task = Task(
-            id=1, 
-            title="Test Task", 
-            status=TaskStatus.PENDING,
-            description=None,
-            user_id=1,
-            worker_id=None,
-            started_at=None,
-            completed_at=None,
-            error_message=None,
-            created_at="2024-01-01T00:00:00",
-            updated_at="2024-01-01T00:00:00"
-        )
-        
-        # Mock failed WIP status update
+    def test_process_task_timeout(self):
+        """Test a task running past its deadline is stopped, failed with a timeout error and counted."""
+        task = Task(id=1, title="Hung Task", status=TaskStatus.WIP, user_id=1, worker_id=WORKER_ID, timeout_seconds=None, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")
         responses.add(
             responses.PUT,
             f"{API_BASE_URL}/tasks/1/status",
-            status=500
+            json={"id": 1, "title": "Hung Task", "user_id": 1, "status": "pending", "worker_id": None, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
+            status=200,
+            match=[responses.matchers.json_params_matcher({"status": "failed", "worker_id": WORKER_ID, "error_message": "Timed out after 0.01 seconds"})],
         )
-        
-        with patch("main.time.sleep"):
-            result = process_task(task)
-            assert result is False
+
+        with patch("main.metrics", WorkerMetrics()) as mock_metrics:
+            assert process_task(task, default_timeout=0.01) is False
+            assert mock_metrics.snapshot()["deadline_exceeded"] == 1
+        assert len(responses.calls) == 1
+
+    def test_process_task_cancelled_while_prefetched(self):
+        """Test a prefetched task cancelled before it got a slot is not started."""
+        task = Task(id=1, title="Test Task", status=TaskStatus.WIP, user_id=1, worker_id=WORKER_ID, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")
+        handler = MagicMock()
+
+        with patch.dict("main.handlers", {"default": TaskHandler(handler)}), patch("main.lease_keeper") as mock_lease_keeper:
+            mock_lease_keeper.add.return_value.is_set.return_value = True
+            mock_lease_keeper.is_cancelled.return_value = True
+            assert process_task(task) is False
+
+        handler.assert_not_called()
+        mock_lease_keeper.discard.assert_called_with(1)
 
     @responses.activate
     def test_process_task_done_status_failure(self):
@@ -248,10 +746,10 @@ class TestProcessTask:
         task = Task(
             id=1, 
             title="Test Task", 
-            status=TaskStatus.PENDING,
+            status=TaskStatus.WIP,
             description=None,
             user_id=1,
-            worker_id=None,
+            worker_id=WORKER_ID,
             started_at=None,
             completed_at=None,
             error_message=None,
@@ -259,21 +757,17 @@ class TestProcessTask:
             updated_at="2024-01-01T00:00:00"
         )
         
-        # Mock successful WIP status update but failed DONE status update
-        responses.add(
-            responses.PUT,
-            f"{API_BASE_URL}/tasks/1/status",
-            json={"status": "wip"},
-            status=200
-        )
+        # Mock failed DONE status update
         responses.add(
             responses.PUT,
             f"{API_BASE_URL}/tasks/1/status",
-            json={"status": "done"},
+            json={"id": 1, "title": "Test Task", "user_id": 1, "status": "done", "worker_id": WORKER_ID, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
             status=500
         )
         
-        with patch("main.time.sleep"):
+        with patch("main.lease_keeper") as mock_lease_keeper:
+            mock_lease_keeper.add.return_value.wait.return_value = False
+            mock_lease_keeper.add.return_value.is_set.return_value = False
             result = process_task(task)
             assert result is False
 
@@ -294,43 +788,252 @@ class TestProcessTask:
             updated_at="2024-01-01T00:00:00"
         )
         
-        # Mock successful WIP status update
+        # Mock failed status update for exception case
         responses.add(
             responses.PUT,
             f"{API_BASE_URL}/tasks/1/status",
-            json={"status": "wip"},
+            json={"id": 1, "title": "Test Task", "user_id": 1, "status": "failed", "worker_id": WORKER_ID, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
             status=200
         )
         
-        # Mock failed status update for exception case
+        with patch("main.lease_keeper") as mock_lease_keeper:
+            mock_lease_keeper.add.return_value.wait.side_effect = Exception("Test error")
+            result = process_task(task)
+            assert result is False
+
+    @responses.activate
+    def test_process_task_lease_lost(self):
+        """Test that a task taken over by another worker is abandoned without reporting a status."""
+        task = Task(
+            id=1,
+            title="Test Task",
+            status=TaskStatus.WIP,
+            user_id=1,
+            worker_id=WORKER_ID,
+            created_at="2024-01-01T00:00:00",
+            updated_at="2024-01-01T00:00:00"
+        )
+
+        with patch("main.lease_keeper") as mock_lease_keeper:
+            mock_lease_keeper.add.return_value.wait.return_value = True
+            mock_lease_keeper.add.return_value.is_set.return_value = True
+            mock_lease_keeper.is_cancelled.return_value = False
+            result = process_task(task)
+
+        assert result is False
+        assert len(responses.calls) == 0
+
+
+class TestHandlers:
+    """Test the task handler registry."""
+
+    @staticmethod
+    def make_task(task_type):
+        return Task(id=1, title="Typed Task", status=TaskStatus.WIP, user_id=1, worker_id=WORKER_ID, task_type=task_type, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")
+
+    @responses.activate
+    def test_process_task_runs_handler_of_its_type(self):
+        """Test tasks are run by the handler registered for their type."""
+        responses.add(responses.PUT, f"{API_BASE_URL}/tasks/1/status", json={"id": 1, "title": "Typed Task", "user_id": 1, "status": "done", "worker_id": WORKER_ID, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"})
+        handler = MagicMock()
+
+        with patch.dict("main.handlers", {"webhook": TaskHandler(handler, concurrency=2)}):
+            assert process_task(self.make_task("webhook")) is True
+
+        assert handler.call_args.args[0].id == 1
+
+    @responses.activate
+    def test_process_task_unknown_type_fails(self):
+        """Test tasks of a type without a handler are failed."""
         responses.add(
             responses.PUT,
             f"{API_BASE_URL}/tasks/1/status",
-            json={"status": "failed"},
-            status=200
+            json={"id": 1, "title": "Typed Task", "user_id": 1, "status": "failed", "worker_id": WORKER_ID, "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00"},
+            match=[responses.matchers.json_params_matcher({"status": "failed", "worker_id": WORKER_ID, "error_message": "No handler for task type 'unknown'"})],
         )
-        
-        with patch("main.time.sleep", side_effect=Exception("Test error")):
-            result = process_task(task)
-            assert result is False
+
+        assert process_task(self.make_task("unknown")) is False
+        assert len(responses.calls) == 1
+
+    def test_cpu_bound_handler_runs_in_process_pool(self):
+        """Test CPU-bound handlers are run in the process pool, and I/O-bound ones only in process mode."""
+        io_handler = MagicMock()
+        with patch("main.process_pool") as mock_process_pool:
+            mock_process_pool.return_value.all_handlers = False
+            run_handler(TaskHandler(str, cpu_bound=True), self.make_task("digest"), threading.Event())
+            assert mock_process_pool.return_value.run.call_count == 1
+
+            run_handler(TaskHandler(io_handler), self.make_task("webhook"), threading.Event())
+            assert io_handler.call_count == 1
+
+            mock_process_pool.return_value.all_handlers = True
+            run_handler(TaskHandler(io_handler), self.make_task("webhook"), threading.Event())
+            assert mock_process_pool.return_value.run.call_count == 2
+
+    def test_coroutine_handler_on_thread_stops(self):
+        """Test coroutine handlers run by the thread runtime are cancelled once told to stop."""
+        cancelled = threading.Event()
+
+        async def hang(task):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        stop = threading.Event()
+        threading.Timer(0.05, stop.set).start()
+        with patch("main.process_pool") as mock_process_pool:
+            mock_process_pool.return_value.all_handlers = False
+            run_handler(TaskHandler(hang), self.make_task("webhook"), stop)
+
+        assert cancelled.is_set()
+
+    def test_coroutine_handler_cancelled_on_timeout(self):
+        """Test the asyncio runtime cancels a coroutine handler past its deadline and fails its task."""
+        cancelled = asyncio.Event()
+
+        async def hang(task):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        client = MagicMock()
+        client.update_task_status = AsyncMock()
+
+        async def run():
+            leases = AsyncLeaseKeeper(client)
+            return await process_task_async(client, leases, self.make_task("webhook"), default_timeout=0.01)
+
+        with patch.dict("main.handlers", {"webhook": TaskHandler(hang)}), patch("main.metrics", WorkerMetrics()) as mock_metrics:
+            assert asyncio.run(run()) is False
+            assert mock_metrics.snapshot()["deadline_exceeded"] == 1
+
+        assert cancelled.is_set()
+        task_id, status_update = client.update_task_status.await_args.args
+        assert task_id == 1
+        assert status_update.status == TaskStatus.FAILED
+        assert status_update.error_message == "Timed out after 0.01 seconds"
+
+    def test_handler_concurrency_limit(self):
+        """Test a handler's concurrency bounds how many of its tasks run at once."""
+        handler = TaskHandler(MagicMock(), concurrency=1)
+        assert handler.slots.acquire(blocking=False)
+        assert not handler.slots.acquire(blocking=False)
+
+
+def sleep_handler(task):
+    """CPU-bound test handler sleeping for the number of seconds in the task's description."""
+    time.sleep(float(task.description))
+
+
+def failing_handler(task):
+    """CPU-bound test handler that always fails."""
+    raise ValueError("handler failed")
+
+
+class TestProcessPool:
+    """Test the supervised pool of handler processes."""
+
+    @pytest.fixture(autouse=True)
+    def registered_handlers(self):
+        test_handlers = {"sleep": TaskHandler(sleep_handler, cpu_bound=True), "fail": TaskHandler(failing_handler, cpu_bound=True)}
+        with patch.dict("main.handlers", test_handlers):
+            yield
+
+    @staticmethod
+    def make_task(task_type, seconds=0):
+        return Task(id=1, title="Pooled Task", description=str(seconds), status=TaskStatus.WIP, user_id=1, task_type=task_type, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")
+
+    def test_children_are_reused_and_recycled(self):
+        """Test children run several tasks and are replaced after max_tasks."""
+        pool = ProcessPool(1, max_tasks=2)
+        try:
+            for _ in range(3):
+                pool.run(self.make_task("sleep"), threading.Event())
+        finally:
+            pool.shutdown()
+        assert pool.started == 2
+
+    def test_stopped_task_kills_its_child(self):
+        """Test a task told to stop frees its slot at once, killing its child."""
+        pool = ProcessPool(1)
+        stop = threading.Event()
+        threading.Timer(0.2, stop.set).start()
+        started = time.monotonic()
+        try:
+            pool.run(self.make_task("sleep", seconds=30), stop)
+            assert time.monotonic() - started < 5
+            pool.run(self.make_task("sleep"), threading.Event())
+        finally:
+            pool.shutdown()
+        assert pool.started == 2
+
+    def test_waiting_task_gets_the_slot_of_a_killed_child(self):
+        """Test a task waiting for a busy child stops waiting once told to, and runs once the busy child is killed."""
+        pool = ProcessPool(1)
+        stops = [threading.Event() for _ in range(3)]
+        runs = [threading.Thread(target=pool.run, args=(self.make_task("sleep", seconds=30), stop)) for stop in stops]
+        try:
+            runs[0].start()
+            time.sleep(0.2)
+            runs[1].start()
+            stops[1].set()
+            runs[1].join(5)
+            assert not runs[1].is_alive()
+            assert pool.started == 1
+
+            runs[2].start()
+            time.sleep(0.2)
+            stops[0].set()
+            runs[0].join(5)
+            # The waiting task took the slot of the killed child
+            deadline = time.monotonic() + 5
+            while pool.started < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert pool.started == 2
+            stops[2].set()
+            runs[2].join(5)
+            assert not runs[2].is_alive()
+        finally:
+            for stop in stops:
+                stop.set()
+            pool.shutdown()
+
+    def test_handler_error_is_raised(self):
+        """Test a handler's error is raised in the parent, keeping the child."""
+        pool = ProcessPool(1)
+        try:
+            with pytest.raises(RuntimeError, match="handler failed"):
+                pool.run(self.make_task("fail"), threading.Event())
+            pool.run(self.make_task("sleep"), threading.Event())
+        finally:
+            pool.shutdown()
+        assert pool.started == 1
 
 
 class TestMainFunction:
     """Test main function."""
 
-    @patch("main.get_pending_tasks")
+    @patch("main.claim_tasks")
     @patch("main.process_task")
     @patch("main.time.sleep")
     @patch("main.parse_arguments")
-    def test_main_function_basic_flow(self, mock_parse_args, mock_sleep, mock_process_task, mock_get_pending_tasks):
+    def test_main_function_basic_flow(self, mock_parse_args, mock_sleep, mock_process_task, mock_claim_tasks):
         """Test basic main function flow with tasks."""
         # Mock arguments
         mock_args = MagicMock()
         mock_args.auto_shutdown = False
+        mock_args.concurrency = 1
+        mock_args.executor = "thread"
+        mock_args.prefetch = 0
+        mock_args.status_journal = None
         mock_parse_args.return_value = mock_args
         
         # Mock getting pending tasks
-        mock_get_pending_tasks.side_effect = [
+        mock_claim_tasks.side_effect = [
             [
                 Task(id=1, title="Task 1", status=TaskStatus.PENDING, description=None, user_id=1, worker_id=None, started_at=None, completed_at=None, error_message=None, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00"),
                 Task(id=2, title="Task 2", status=TaskStatus.PENDING, description=None, user_id=1, worker_id=None, started_at=None, completed_at=None, error_message=None, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00"),
@@ -348,23 +1051,28 @@ class TestMainFunction:
         main()
         
         # Verify that tasks were processed
-        assert mock_get_pending_tasks.called
+        assert mock_claim_tasks.called
         assert mock_process_task.call_count == 2
-        # Verify sleep calls: 1 second between tasks + poll interval
-        assert mock_sleep.call_count >= 3
+        # The server long-polls, and a non-empty batch is followed by an immediate re-poll
+        assert POLL_INTERVAL * (1 - POLL_JITTER) <= mock_claim_tasks.call_args.kwargs["wait"] <= POLL_INTERVAL
+        mock_sleep.assert_not_called()
 
-    @patch("main.get_pending_tasks")
+    @patch("main.claim_tasks")
     @patch("main.time.sleep")
     @patch("main.parse_arguments")
-    def test_main_function_no_pending_tasks(self, mock_parse_args, mock_sleep, mock_get_pending_tasks):
+    def test_main_function_no_pending_tasks(self, mock_parse_args, mock_sleep, mock_claim_tasks):
         """Test main function when no pending tasks exist."""
         # Mock arguments
         mock_args = MagicMock()
         mock_args.auto_shutdown = False
+        mock_args.concurrency = 1
+        mock_args.executor = "thread"
+        mock_args.prefetch = 0
+        mock_args.status_journal = None
         mock_parse_args.return_value = mock_args
         
         # Mock no pending tasks
-        mock_get_pending_tasks.side_effect = [[], KeyboardInterrupt()]
+        mock_claim_tasks.side_effect = [[], KeyboardInterrupt()]
         
         # Mock sleep to avoid long waits
         mock_sleep.return_value = None
@@ -373,26 +1081,31 @@ class TestMainFunction:
         main()
         
         # Verify that no tasks were processed
-        assert mock_get_pending_tasks.called
+        assert mock_claim_tasks.called
         assert mock_sleep.called
 
     @patch("main.get_pending_tasks")
+    @patch("main.claim_tasks")
     @patch("main.process_task")
     @patch("main.time.sleep")
     @patch("main.parse_arguments")
-    def test_main_function_auto_shutdown_enabled(self, mock_parse_args, mock_sleep, mock_process_task, mock_get_pending_tasks):
+    def test_main_function_auto_shutdown_enabled(self, mock_parse_args, mock_sleep, mock_process_task, mock_claim_tasks, mock_get_pending_tasks):
         """Test main function with auto-shutdown enabled."""
         # Mock arguments
         mock_args = MagicMock()
         mock_args.auto_shutdown = True
+        mock_args.concurrency = 1
+        mock_args.executor = "thread"
+        mock_args.prefetch = 0
+        mock_args.status_journal = None
         mock_parse_args.return_value = mock_args
         
         # First call returns tasks, second call returns empty (triggering auto-shutdown)
-        mock_get_pending_tasks.side_effect = [
+        mock_claim_tasks.side_effect = [
             [Task(id=1, title="Task 1", status=TaskStatus.PENDING, description=None, user_id=1, worker_id=None, started_at=None, completed_at=None, error_message=None, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")],  # First call
             [],  # Second call - no tasks
-            []   # Final check - still no tasks
         ]
+        mock_get_pending_tasks.return_value = []  # Final check - still no tasks
         
         # Mock successful task processing
         mock_process_task.return_value = True
@@ -404,29 +1117,37 @@ class TestMainFunction:
         main()
         
         # Verify auto-shutdown behavior
-        assert mock_get_pending_tasks.call_count >= 2
+        assert mock_claim_tasks.call_count >= 2
+        assert mock_get_pending_tasks.called
         assert mock_process_task.called
         # Should have slept for auto-shutdown delay
         mock_sleep.assert_any_call(AUTO_SHUTDOWN_DELAY)
 
     @patch("main.get_pending_tasks")
+    @patch("main.claim_tasks")
     @patch("main.process_task")
     @patch("main.time.sleep")
     @patch("main.parse_arguments")
-    def test_main_function_auto_shutdown_with_new_tasks(self, mock_parse_args, mock_sleep, mock_process_task, mock_get_pending_tasks):
+    def test_main_function_auto_shutdown_with_new_tasks(self, mock_parse_args, mock_sleep, mock_process_task, mock_claim_tasks, mock_get_pending_tasks):
         """Test auto-shutdown when new tasks appear during delay."""
         # Mock arguments
         mock_args = MagicMock()
         mock_args.auto_shutdown = True
+        mock_args.concurrency = 1
+        mock_args.executor = "thread"
+        mock_args.prefetch = 0
+        mock_args.status_journal = None
         mock_parse_args.return_value = mock_args
         
         # First call returns tasks, second call returns empty, final check returns new tasks
-        mock_get_pending_tasks.side_effect = [
+        mock_claim_tasks.side_effect = [
             [Task(id=1, title="Task 1", status=TaskStatus.PENDING, description=None, user_id=1, worker_id=None, started_at=None, completed_at=None, error_message=None, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")],  # First call
             [],  # Second call - no tasks
-            [Task(id=2, title="Task 2", status=TaskStatus.PENDING, description=None, user_id=1, worker_id=None, started_at=None, completed_at=None, error_message=None, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")],   # Final check - new tasks
             KeyboardInterrupt(),
         ]
+        mock_get_pending_tasks.return_value = [
+            Task(id=2, title="Task 2", status=TaskStatus.PENDING, description=None, user_id=1, worker_id=None, started_at=None, completed_at=None, error_message=None, created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")
+        ]  # Final check - new tasks
         
         # Mock successful task processing
         mock_process_task.return_value = True
@@ -438,21 +1159,26 @@ class TestMainFunction:
         main()
         
         # Verify auto-shutdown was cancelled due to new tasks
-        assert mock_get_pending_tasks.call_count >= 3
+        assert mock_claim_tasks.call_count >= 3
+        assert mock_get_pending_tasks.called
         assert mock_process_task.call_count >= 1
 
-    @patch("main.get_pending_tasks")
+    @patch("main.claim_tasks")
     @patch("main.time.sleep")
     @patch("main.parse_arguments")
-    def test_main_function_keyboard_interrupt(self, mock_parse_args, mock_sleep, mock_get_pending_tasks):
+    def test_main_function_keyboard_interrupt(self, mock_parse_args, mock_sleep, mock_claim_tasks):
         """Test main function handling keyboard interrupt."""
         # Mock arguments
         mock_args = MagicMock()
         mock_args.auto_shutdown = False
+        mock_args.concurrency = 1
+        mock_args.executor = "thread"
+        mock_args.prefetch = 0
+        mock_args.status_journal = None
         mock_parse_args.return_value = mock_args
         
         # Mock getting pending tasks to raise KeyboardInterrupt
-        mock_get_pending_tasks.side_effect = KeyboardInterrupt()
+        mock_claim_tasks.side_effect = KeyboardInterrupt()
         
         # Mock sleep to avoid long waits
         mock_sleep.return_value = None
@@ -461,20 +1187,24 @@ class TestMainFunction:
         main()  # Should handle KeyboardInterrupt gracefully
         
         # Verify it was called
-        assert mock_get_pending_tasks.called
+        assert mock_claim_tasks.called
 
-    @patch("main.get_pending_tasks")
+    @patch("main.claim_tasks")
     @patch("main.time.sleep")
     @patch("main.parse_arguments")
-    def test_main_function_general_exception(self, mock_parse_args, mock_sleep, mock_get_pending_tasks):
+    def test_main_function_general_exception(self, mock_parse_args, mock_sleep, mock_claim_tasks):
         """Test main function handling general exceptions."""
         # Mock arguments
         mock_args = MagicMock()
         mock_args.auto_shutdown = False
+        mock_args.concurrency = 1
+        mock_args.executor = "thread"
+        mock_args.prefetch = 0
+        mock_args.status_journal = None
         mock_parse_args.return_value = mock_args
         
         # Mock getting pending tasks to raise an exception
-        mock_get_pending_tasks.side_effect = Exception("Test error")
+        mock_claim_tasks.side_effect = Exception("Test error")
         
         # Mock sleep to avoid long waits
         mock_sleep.return_value = None
@@ -484,5 +1214,121 @@ class TestMainFunction:
             main()
         
         # Verify it was called
-        assert mock_get_pending_tasks.called
+        assert mock_claim_tasks.called
+
+
+class TestConcurrentRuntimes:
+    """Test the concurrent thread pool and asyncio runtimes."""
+
+    @staticmethod
+    def make_task(task_id):
+        """Build a claimed task."""
+        return Task(
+            id=task_id,
+            title=f"Task {task_id}",
+            status=TaskStatus.WIP,
+            user_id=1,
+            worker_id=WORKER_ID,
+            created_at="2024-01-01T00:00:00",
+            updated_at="2024-01-01T00:00:00"
+        )
+
+    @patch("main.get_pending_tasks", return_value=[])
+    @patch("main.claim_tasks")
+    @patch("main.process_task")
+    @patch("main.time.sleep")
+    def test_runs_tasks_concurrently(self, mock_sleep, mock_process_task, mock_claim_tasks, mock_get_pending_tasks):
+        """Test that claimed tasks run at the same time, up to the concurrency limit."""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def process(task, timeout):
+            # Only passes if all three tasks are running at once
+            barrier.wait()
+            return True
+
+        mock_process_task.side_effect = process
+        tasks = [self.make_task(1), self.make_task(2), self.make_task(3)]
+        # Later claims find the queue empty, possibly while tasks are still finishing
+        mock_claim_tasks.side_effect = lambda batch, wait, queues: tasks if mock_claim_tasks.call_count == 1 else []
+
+        run_threaded(concurrency=3, auto_shutdown=True)
+
+        assert mock_process_task.call_count == 3
+        # The first claim asks for as many tasks as there are free slots
+        assert mock_claim_tasks.call_args_list[0].kwargs["batch"] == 3
+        mock_sleep.assert_any_call(AUTO_SHUTDOWN_DELAY)
+
+    @patch("main.get_pending_tasks_async", return_value=[])
+    @patch("main.claim_tasks_async")
+    @patch("main.process_task_async")
+    def test_async_runtime_runs_tasks_concurrently(self, mock_process_task, mock_claim_tasks, mock_get_pending_tasks):
+        """Test that the asyncio runtime runs claimed tasks at the same time on its event loop."""
+        running = []
+        all_running = asyncio.Event()
+
+        async def process(client, leases, task, timeout):
+            # Only passes if all three tasks are running at once
+            running.append(task.id)
+            if len(running) == 3:
+                all_running.set()
+            await asyncio.wait_for(all_running.wait(), 5)
+            return True
+
+        async def fake_sleep(delay):
+            await real_sleep(0)
+
+        mock_process_task.side_effect = process
+        tasks = [self.make_task(1), self.make_task(2), self.make_task(3)]
+        mock_claim_tasks.side_effect = lambda client, batch, wait, queues: tasks if mock_claim_tasks.call_count == 1 else []
+
+        real_sleep = asyncio.sleep
+        with patch("main.asyncio.sleep", side_effect=fake_sleep) as mock_sleep:
+            asyncio.run(run_async(concurrency=3, auto_shutdown=True))
+
+        assert mock_process_task.call_count == 3
+        # The first claim asks for as many tasks as there are free slots
+        assert mock_claim_tasks.call_args_list[0].kwargs["batch"] == 3
+        mock_sleep.assert_any_await(AUTO_SHUTDOWN_DELAY)
+
+    @patch("main.get_pending_tasks", return_value=[])
+    @patch("main.claim_tasks")
+    @patch("main.process_task")
+    @patch("main.time.sleep")
+    def test_claims_only_free_slots(self, mock_sleep, mock_process_task, mock_claim_tasks, mock_get_pending_tasks):
+        """Test that the thread runtime keeps claiming as slots free up."""
+        release = threading.Event()
+        mock_process_task.side_effect = lambda task, timeout: release.wait(5)
+
+        def claim(batch, wait, queues):
+            if mock_claim_tasks.call_count == 1:
+                return [self.make_task(1)]
+            if mock_claim_tasks.call_count == 2:
+                # One task is still running, so only one of the two slots is free
+                assert batch == 1
+                release.set()
+                return [self.make_task(2)]
+            return []
+
+        mock_claim_tasks.side_effect = claim
+
+        run_threaded(concurrency=2, auto_shutdown=True)
+
+        assert mock_process_task.call_count == 2
+
+    @patch("main.get_pending_tasks", return_value=[])
+    @patch("main.claim_tasks")
+    @patch("main.process_task")
+    @patch("main.lease_keeper")
+    @patch("main.time.sleep")
+    def test_prefetches_tasks_for_busy_slots(self, mock_sleep, mock_lease_keeper, mock_process_task, mock_claim_tasks, mock_get_pending_tasks):
+        """Test that the thread runtime claims tasks to wait for a slot, keeping their leases from the claim on."""
+        tasks = [self.make_task(1), self.make_task(2), self.make_task(3)]
+        mock_process_task.return_value = True
+        mock_claim_tasks.side_effect = lambda batch, wait, queues: tasks[:batch] if mock_claim_tasks.call_count == 1 else []
+
+        run_threaded(concurrency=1, auto_shutdown=True, prefetch=2)
 
+        # One task for the slot and two waiting for it
+        assert mock_claim_tasks.call_args_list[0].kwargs["batch"] == 3
+        assert mock_process_task.call_count == 3
+        mock_lease_keeper.add.assert_has_calls([call(1), call(2), call(3)])